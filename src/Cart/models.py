@@ -6,8 +6,9 @@ from django.conf import settings
 
 # Create your models here.
 class CartItem(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Unconstrained so cart items can live in a user shard (see Shop/sharding.py)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_constraint=False)
     quantity = models.PositiveIntegerField()
 
     class Meta:
@@ -1,4 +1,5 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory
 from Users.models import User
 from Product.models import Product
 from .models import CartItem
@@ -9,6 +10,14 @@ from django.contrib.auth import get_user_model
 from Order.models import Order, OrderItem
 from Product.models import Product
 from Users.models import Address
+from Shop.idempotency import IdempotencyMiddleware
+from Shop import metrics
+from django.conf import settings
+import multiprocessing
+import os
+import tempfile
+import time
+from unittest import mock
 
 User = get_user_model()
 
@@ -109,3 +118,261 @@ class CheckoutTestCase(APITestCase):
 
         # Assert that the cart is now empty
         self.assertEqual(CartItem.objects.filter(user=self.user).count(), 0)
+
+    def test_checkout_response_total(self):
+        """
+        Test that the checkout response carries the order items and total.
+        """
+        other_product = Product.objects.create(title='Product 2', price=5.50)
+        CartItem.objects.create(user=self.user, product=other_product, quantity=3)
+
+        url = reverse('cart-checkout')
+        response = self.client.post(url, data={'address_id': self.address.id})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(str(response.data['total_price']), '36.50')
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertEqual(
+            {item['product_title'] for item in response.data['items']},
+            {'Product 1', 'Product 2'}
+        )
+
+    def test_checkout_query_budget(self):
+        """
+        Test that checkout runs a fixed number of queries regardless of cart size.
+        """
+        for index in range(5):
+            product = Product.objects.create(title=f'Extra {index}', price=1.00)
+            CartItem.objects.create(user=self.user, product=product, quantity=1)
+
+        url = reverse('cart-checkout')
+        # savepoint, cart with products, address, order insert, items insert,
+        # daily and product rollups (insert missing rows, increment), cart delete, release
+        with self.assertNumQueries(11):
+            response = self.client.post(url, data={'address_id': self.address.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_checkout_empty_cart(self):
+        """
+        Test that checking out an empty cart is rejected without creating an order.
+        """
+        CartItem.objects.filter(user=self.user).delete()
+        url = reverse('cart-checkout')
+        response = self.client.post(url, data={'address_id': self.address.id})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 0)
+
+
+class CheckoutIdempotencyTestCase(APITestCase):
+    """
+    Test case for Idempotency-Key handling on checkout.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.product = Product.objects.create(title='Product 1', price=10.00)
+        self.address = Address.objects.create(user=self.user, address_line='123 Main St', city='Anytown', state='CA',
+                                              zip_code='12345', country='USA')
+        CartItem.objects.create(user=self.user, product=self.product, quantity=2)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('cart-checkout')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_retry_replays_stored_response(self):
+        """
+        Test that a retried checkout replays the first response without creating another order.
+        """
+        first = self.client.post(self.url, data={'address_id': self.address.id}, HTTP_IDEMPOTENCY_KEY='abc')
+        with self.assertNumQueries(0):
+            second = self.client.post(self.url, data={'address_id': self.address.id}, HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_with_different_payload(self):
+        """
+        Test that reusing a key with a different body is rejected.
+        """
+        self.client.post(self.url, data={'address_id': self.address.id}, HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post(self.url, data={'address_id': 0}, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, 422)
+
+    def test_throttled_checkout_can_be_retried_with_the_same_key(self):
+        """
+        Test that a throttled response is not replayed, so the retry after Retry-After goes through.
+        """
+        now = time.time()
+        with self.settings(THROTTLE_BUCKETS={'checkout': {'capacity': 1, 'rate': '1/m'}}):
+            with mock.patch('Shop.throttling.time.time', return_value=now):
+                self.client.post(self.url, data={'address_id': self.address.id}, HTTP_IDEMPOTENCY_KEY='first')
+                CartItem.objects.create(user=self.user, product=self.product, quantity=1)
+                throttled = self.client.post(self.url, data={'address_id': self.address.id},
+                                             HTTP_IDEMPOTENCY_KEY='retry')
+            self.assertEqual(throttled.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+            with mock.patch('Shop.throttling.time.time', return_value=now + int(throttled['Retry-After']) + 1):
+                response = self.client.post(self.url, data={'address_id': self.address.id},
+                                            HTTP_IDEMPOTENCY_KEY='retry')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_replay_keeps_response_headers(self):
+        """
+        Test that a replayed response carries the headers of the first one, e.g. the job Location.
+        """
+        first = self.client.post(self.url, data={'address_id': self.address.id}, HTTP_IDEMPOTENCY_KEY='abc',
+                                 HTTP_PREFER='respond-async')
+        second = self.client.post(self.url, data={'address_id': self.address.id}, HTTP_IDEMPOTENCY_KEY='abc',
+                                  HTTP_PREFER='respond-async')
+
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+    def test_concurrent_duplicate_is_rejected(self):
+        """
+        Test that a duplicate arriving while the first request is in flight does not execute.
+        """
+        middleware = IdempotencyMiddleware(lambda request: None)
+        request = RequestFactory().post(self.url, HTTP_IDEMPOTENCY_KEY='abc')
+        cache.add(f'{middleware.get_cache_key(request, "abc")}:lock', 1)
+
+        response = self.client.post(self.url, data={'address_id': self.address.id}, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 1)
+
+
+class MetricsTestCase(APITestCase):
+    """
+    Test case for the Prometheus metrics, recorded by the requests and checkouts and read from /metrics.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = self.settings(METRICS_DIR=directory.name, METRICS_TOKEN=None, QUERY_STATS_SAMPLE_RATE=1.0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.address = Address.objects.create(user=self.user, address_line='123 Main St', city='Anytown', state='CA',
+                                              zip_code='12345', country='USA')
+        CartItem.objects.create(user=self.user, product=Product.objects.create(title='Product 1', price=10.00),
+                                quantity=2)
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode().splitlines()
+
+    def test_requests_and_checkouts_are_exposed(self):
+        self.client.post(reverse('cart-checkout'), data={'address_id': self.address.id})
+        self.client.post(reverse('cart-checkout'), data={'address_id': self.address.id})
+
+        lines = self.scrape()
+        self.assertIn('# TYPE shop_http_request_duration_seconds histogram', lines)
+        self.assertIn('shop_http_request_duration_seconds_bucket{view="cartitem-checkout",method="POST",le="+Inf"} 2',
+                      lines)
+        self.assertIn('shop_http_request_duration_seconds_count{view="cartitem-checkout",method="POST"} 2', lines)
+        self.assertIn('shop_http_responses_total{view="cartitem-checkout",status="201"} 1', lines)
+        self.assertIn('shop_http_responses_total{view="cartitem-checkout",status="400"} 1', lines)
+        self.assertIn('shop_checkouts_total{mode="sync",outcome="placed"} 1', lines)
+        self.assertIn('shop_checkouts_total{mode="sync",outcome="rejected"} 1', lines)
+        # Only the scrape itself is in flight
+        self.assertIn('shop_http_requests_in_progress 1', lines)
+        self.assertIn('shop_db_sampled_requests_total{view="cartitem-checkout"} 2', lines)
+        self.assertTrue(any(line.startswith('shop_db_queries_total{view="cartitem-checkout"} ') for line in lines))
+
+    def test_values_of_all_processes_are_merged(self):
+        metrics.cache_requests.labels('test', 'hit').inc()
+        context = multiprocessing.get_context('fork')
+        child = context.Process(target=record_in_child)
+        child.start()
+        child.join()
+
+        lines = metrics.registry.render().splitlines()
+        self.assertIn('shop_cache_requests_total{cache="test",result="hit"} 3', lines)
+        # The gauge of the exited child is dropped, its counters are kept
+        self.assertNotIn('shop_http_requests_in_progress 5', lines)
+        self.assertEqual(len([name for name in os.listdir(settings.METRICS_DIR) if name.endswith('.db')]), 2)
+
+    def test_files_of_exited_processes_are_merged(self):
+        metrics.cache_requests.labels('test', 'hit').inc()
+        context = multiprocessing.get_context('fork')
+        for _ in range(2):
+            child = context.Process(target=record_in_child)
+            child.start()
+            child.join()
+            self.assertEqual(metrics.registry.compact(), 1)
+
+        self.assertEqual(sorted(name for name in os.listdir(settings.METRICS_DIR) if name.endswith('.db')),
+                         sorted([f'{os.getpid()}.db', metrics.AGGREGATE_FILE]))
+        lines = metrics.registry.render().splitlines()
+        self.assertIn('shop_cache_requests_total{cache="test",result="hit"} 5', lines)
+        self.assertNotIn('shop_http_requests_in_progress 10', lines)
+        self.assertEqual(metrics.registry.compact(), 0)
+
+    def test_exited_processes_are_merged_when_a_process_starts(self):
+        context = multiprocessing.get_context('fork')
+        first = context.Process(target=record_in_child)
+        first.start()
+        first.join()
+        # The first child's file is merged when the second one opens its own
+        second = context.Process(target=record_in_child)
+        second.start()
+        second.join()
+
+        self.assertEqual(sorted(name for name in os.listdir(settings.METRICS_DIR) if name.endswith('.db')),
+                         sorted([f'{second.pid}.db', metrics.AGGREGATE_FILE]))
+        self.assertIn('shop_cache_requests_total{cache="test",result="hit"} 4', metrics.registry.render().splitlines())
+
+    def test_reused_pid_resets_gauges(self):
+        metrics.cache_requests.labels('test', 'hit').inc()
+        metrics.requests_in_progress.inc(3)
+        # A new process with the same PID reopens the file
+        metrics.registry.file.close()
+        metrics.registry.owner = None
+        metrics.registry.values()
+
+        lines = metrics.registry.render().splitlines()
+        self.assertIn('shop_cache_requests_total{cache="test",result="hit"} 1', lines)
+        self.assertIn('shop_http_requests_in_progress 0', lines)
+
+    def test_token_is_required_when_configured(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_recording_overhead(self):
+        """
+        Test that recording a request's metrics stays far below a millisecond.
+        """
+        histogram = metrics.request_latency.labels('benchmark', 'GET')
+        counter = metrics.responses.labels('benchmark', 200)
+        started = time.perf_counter()
+        for _ in range(10000):
+            metrics.requests_in_progress.inc()
+            metrics.requests_in_progress.dec()
+            histogram.observe(0.02)
+            counter.inc()
+        self.assertLess((time.perf_counter() - started) / 10000, 0.0002)
+
+
+def record_in_child():
+    metrics.cache_requests.labels('test', 'hit').inc(2)
+    metrics.requests_in_progress.inc(5)
+    os._exit(0)
@@ -1,14 +1,22 @@
 from django.shortcuts import render
+from django.conf import settings
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.reverse import reverse
 from .models import CartItem
 from .serializers import CartItemSerializer
-from Order.models import Order, OrderItem
+from Order.models import CheckoutJob
 from Order.serializers import OrderSerializer
+from Order.services import lock_cart, place_order
+from Shop.metrics import checkouts
+from Shop.transactions import retry_write_transaction
+from Shop.throttling import UserTokenBucketThrottle
 from Users.models import Address
 
+CHECKOUT_OUTCOMES = {status.HTTP_201_CREATED: 'placed', status.HTTP_202_ACCEPTED: 'queued'}
+
 
 class CartItemViewSet(viewsets.ModelViewSet):
     """
@@ -16,11 +24,14 @@ class CartItemViewSet(viewsets.ModelViewSet):
     """
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
+    # Set per action; actions without a scope are not throttled
+    throttle_scope = None
 
     def get_queryset(self):
         # Only return the cart items for the authenticated user
         return CartItem.objects.filter(user=self.request.user)
 
+    @retry_write_transaction(user_shard=True)
     def perform_create(self, serializer):
         # Set the user to the currently authenticated user
         serializer.save(user=self.request.user)
@@ -50,41 +61,94 @@ class CartItemViewSet(viewsets.ModelViewSet):
         total = sum(item.quantity * item.product.price for item in cart_items)
         return Response({"total_price": total}, status=status.HTTP_200_OK)
 
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], throttle_classes=[UserTokenBucketThrottle], throttle_scope='checkout')
     def checkout(self, request):
         """
         Checkout the cart items and create an order.
+
+        The cart is read together with its products in a single query and the
+        order, its items and the cart removal are written in one transaction.
+        The response is built from the in-memory rows, so no extra reads are
+        needed to serialize the new order.
+
+        Clients sending ``Prefer: respond-async`` get a ``202`` with a job URL
+        instead; the order is then placed by ``manage.py run_workers``.
+
+        Each attempt is counted in ``shop_checkouts_total`` by outcome.
         """
-        cart_items = self.get_queryset()
-        if not cart_items.exists():
-            return Response({"error": "Your cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
+        mode = 'async' if self.prefers_async(request) else 'sync'
+        try:
+            response = self.enqueue_checkout(request) if mode == 'async' else self.place_checkout_order(request)
+        except Exception:
+            checkouts.labels(mode, 'failed').inc()
+            raise
+        checkouts.labels(mode, CHECKOUT_OUTCOMES.get(response.status_code, 'rejected')).inc()
+        return response
+
+    def place_checkout_order(self, request):
+        """
+        Place the order for the cart right away.
+        """
+        order, error = self.create_order(request)
+        if error:
+            return error
+
+        # Serialize the order from the rows already in memory
+        serializer = OrderSerializer(order)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @retry_write_transaction
+    def create_order(self, request):
+        """
+        Turn the cart into an order in one transaction, retried while the database is locked.
+
+        :return: A tuple of the order and an error response, one of which is None.
+        """
+        cart_items = lock_cart(request.user)
+        if not cart_items:
+            return None, Response({"error": "Your cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
 
+        address, error = self.get_checkout_address(request)
+        if error:
+            return None, error
+
+        return place_order(request.user, address, cart_items), None
+
+    def get_checkout_address(self, request):
+        """
+        Resolve the address given for checkout.
+
+        :return: A tuple of the address and an error response, one of which is None.
+        """
         address_id = request.data.get('address_id')
         if not address_id:
-            return Response({"error": "Address is required."}, status=status.HTTP_400_BAD_REQUEST)
+            return None, Response({"error": "Address is required."}, status=status.HTTP_400_BAD_REQUEST)
 
         address = Address.objects.filter(id=address_id, user=request.user).first()
         if not address:
-            return Response({"error": "Invalid address."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Create the order
-        order = Order.objects.create(user=request.user, address=address, status='pending')
-
-        # Create order items
-        order_items = [
-            OrderItem(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price=item.product.price
-            )
-            for item in cart_items
-        ]
-        OrderItem.objects.bulk_create(order_items)
-
-        # Clear the cart
-        cart_items.delete()
-
-        # Serialize the order and return the response
-        serializer = OrderSerializer(order)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return None, Response({"error": "Invalid address."}, status=status.HTTP_400_BAD_REQUEST)
+        return address, None
+
+    @staticmethod
+    def prefers_async(request):
+        """
+        Whether the client asked for an asynchronous checkout and the server allows it.
+        """
+        return (getattr(settings, 'CHECKOUT_ASYNC_ENABLED', False)
+                and 'respond-async' in request.headers.get('Prefer', ''))
+
+    def enqueue_checkout(self, request):
+        """
+        Validate the cart and queue a checkout job for the workers.
+        """
+        if not self.get_queryset().exists():
+            return Response({"error": "Your cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
+
+        address, error = self.get_checkout_address(request)
+        if error:
+            return error
+
+        job = CheckoutJob.objects.create(user=request.user, address=address)
+        job_url = reverse('checkout-job-detail', kwargs={'pk': job.pk}, request=request)
+        return Response({"job": job.pk, "status": job.status, "url": job_url},
+                        status=status.HTTP_202_ACCEPTED, headers={'Location': job_url})
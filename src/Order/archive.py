@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from Shop.sharding import user_data_aliases
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+"""
+This module moves old, finished orders from the hot order tables into the archive tables.
+"""
+
+
+def archivable_orders(older_than_days=None):
+    """
+    Return the orders old enough, and in a final enough status, to be archived.
+
+    :param older_than_days: Minimum order age; defaults to ``ORDER_ARCHIVE_AFTER_DAYS``.
+    """
+    if older_than_days is None:
+        older_than_days = settings.ORDER_ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Order.objects.filter(status__in=settings.ORDER_ARCHIVE_STATUSES, order_date__lt=cutoff)
+
+
+def archive_orders(older_than_days=None, batch_size=500):
+    """
+    Archive every qualifying order of every user database, one transaction per batch.
+
+    :param older_than_days: Minimum order age; defaults to ``ORDER_ARCHIVE_AFTER_DAYS``.
+    :param batch_size: Orders moved per transaction.
+    :return: The number of orders archived.
+    """
+    archived = 0
+    for alias in user_data_aliases():
+        candidates = archivable_orders(older_than_days).using(alias)
+        last_id = 0
+        while True:
+            order_ids = list(
+                candidates.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+            archived += archive_order_batch(candidates.filter(id__in=order_ids))
+            last_id = order_ids[-1]
+    return archived
+
+
+def archive_order_batch(orders):
+    """
+    Copy the given orders and their items into the archive and remove them from the hot tables.
+
+    Runs in one transaction on the orders' database and one on the archive's; the
+    orders are re-read under lock, so any that stopped qualifying in the meantime
+    are left in place.
+
+    :param orders: A queryset of orders to archive.
+    :return: The number of orders archived.
+    """
+    using = orders.db
+    with transaction.atomic(), transaction.atomic(using=using):
+        orders = list(orders.select_for_update())
+        if not orders:
+            return 0
+        ids = [order.id for order in orders]
+        items = list(OrderItem.objects.using(using).filter(order_id__in=ids))
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(id=order.id, user_id=order.user_id, order_date=order.order_date,
+                          address_id=order.address_id, status=order.status, total_amount=order.total_amount,
+                          item_count=order.item_count)
+            for order in orders
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(id=item.id, order_id=item.order_id, product_id=item.product_id,
+                              product_title=item.product_title, quantity=item.quantity, price=item.price)
+            for item in items
+        ])
+
+        OrderItem.objects.using(using).filter(order_id__in=ids).delete()
+        Order.objects.using(using).filter(id__in=ids).delete()
+    return len(orders)
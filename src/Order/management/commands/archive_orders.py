@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Order.archive import archive_orders, archivable_orders
+from Shop.sharding import user_data_aliases
+
+
+class Command(BaseCommand):
+    help = 'Move old orders in a final status from the order tables into the archive tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+                            help='Only archive orders placed more than this many days ago.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Orders moved per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many orders would be archived.')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = sum(archivable_orders(options['older_than_days']).using(alias).count()
+                        for alias in user_data_aliases())
+            self.stdout.write(f'{count} orders would be archived.')
+            return
+
+        archived = archive_orders(options['older_than_days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} orders.'))
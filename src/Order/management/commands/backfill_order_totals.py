@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Sum
+
+from Order.models import Order, OrderItem
+from Product.models import Product
+from Shop.sharding import user_data_aliases
+
+
+class Command(BaseCommand):
+    help = ('Backfill persisted order totals and order item title snapshots for the existing orders '
+            'of every user database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Orders updated per transaction.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        titled = sum(self.backfill_titles(alias, batch_size) for alias in user_data_aliases())
+        self.stdout.write(f'Snapshotted titles for {titled} order items.')
+
+        totalled = sum(self.backfill_totals(alias, batch_size) for alias in user_data_aliases())
+        self.stdout.write(self.style.SUCCESS(f'Backfilled totals for {totalled} orders.'))
+
+    def backfill_titles(self, alias, batch_size):
+        """
+        Copy the current product title onto the items of one database that have no snapshot yet.
+
+        Titles are looked up separately, as the items may be in another database than the catalog.
+        """
+        updated = 0
+        last_id = 0
+        while True:
+            items = list(
+                OrderItem.objects.using(alias).filter(id__gt=last_id, product_title='', product__isnull=False)
+                .only('id', 'product_id', 'product_title')
+                .order_by('id')[:batch_size]
+            )
+            if not items:
+                return updated
+            titles = dict(Product.objects.filter(id__in={item.product_id for item in items})
+                          .values_list('id', 'title'))
+            titled = [item for item in items if item.product_id in titles]
+            for item in titled:
+                item.product_title = titles[item.product_id]
+            with transaction.atomic(using=alias):
+                OrderItem.objects.using(alias).bulk_update(titled, ['product_title'])
+            updated += len(titled)
+            last_id = items[-1].id
+
+    def backfill_totals(self, alias, batch_size):
+        """
+        Recompute the persisted total and item count of every order of one database from its items.
+        """
+        updated = 0
+        last_id = 0
+        while True:
+            order_ids = list(
+                Order.objects.using(alias).filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                return updated
+            totals = {
+                row['order']: row
+                for row in OrderItem.objects.using(alias).filter(order_id__in=order_ids)
+                .values('order')
+                .annotate(total=Sum(F('price') * F('quantity')), count=Sum('quantity'))
+            }
+            orders = [
+                Order(id=order_id,
+                      total_amount=totals.get(order_id, {}).get('total') or 0,
+                      item_count=totals.get(order_id, {}).get('count') or 0)
+                for order_id in order_ids
+            ]
+            with transaction.atomic(using=alias):
+                Order.objects.using(alias).bulk_update(orders, ['total_amount', 'item_count'])
+            updated += len(orders)
+            last_id = order_ids[-1]
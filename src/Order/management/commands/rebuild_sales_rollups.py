@@ -0,0 +1,143 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils.dateparse import parse_date
+
+from Order.models import (Order, OrderItem, ArchivedOrder, ArchivedOrderItem, DailySales, DailyProductSales,
+                          DailyCategorySales)
+from Order.rollups import accumulate
+from Product.models import Category, Product
+from Shop.sharding import user_data_aliases
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollups from the order history, archived orders included.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild days on or after this ISO date.')
+        parser.add_argument('--chunk-size', type=int, default=50000,
+                            help='Rows aggregated per scan of the order tables.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be an ISO date (YYYY-MM-DD).')
+        chunk_size = options['chunk_size']
+
+        days = self.aggregate_days(since, chunk_size)
+        products, leaf_categories = self.aggregate_items(since, chunk_size)
+        categories = self.expand_categories(leaf_categories)
+
+        with transaction.atomic():
+            for model in (DailySales, DailyProductSales, DailyCategorySales):
+                stale = model.objects.all() if since is None else model.objects.filter(date__gte=since)
+                stale.delete()
+            DailySales.objects.bulk_create(
+                [DailySales(date=day, revenue=revenue, order_count=count, units=units)
+                 for day, (revenue, count, units) in days.items()],
+                batch_size=1000,
+            )
+            DailyProductSales.objects.bulk_create(
+                [DailyProductSales(date=day, product_id=product_id, product_title=title, revenue=revenue, units=units)
+                 for (day, product_id), (title, revenue, units) in products.items()],
+                batch_size=1000,
+            )
+            DailyCategorySales.objects.bulk_create(
+                [DailyCategorySales(date=day, category_id=category_id, category_name=name, revenue=revenue,
+                                    units=units)
+                 for (day, category_id), (name, revenue, units) in categories.items()],
+                batch_size=1000,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(days)} daily, {len(products)} product and {len(categories)} category rollups.'
+        ))
+
+    def aggregate_days(self, since, chunk_size):
+        """
+        Sum the persisted order totals per day, one id range of orders at a time, in every user database and
+        the archive.
+        """
+        days = {}
+        for orders in [Order.objects.using(alias) for alias in user_data_aliases()] + [ArchivedOrder.objects.all()]:
+            if since is not None:
+                orders = orders.filter(order_date__date__gte=since)
+            for lower, upper in self.id_ranges(orders, chunk_size):
+                rows = (orders.filter(id__gt=lower, id__lte=upper)
+                        .annotate(day=TruncDate('order_date'))
+                        .values('day')
+                        .annotate(revenue=Sum('total_amount'), count=Count('id'), units=Sum('item_count'))
+                        .order_by())
+                for row in rows:
+                    revenue, count, units = days.get(row['day'], (0, 0, 0))
+                    days[row['day']] = (revenue + row['revenue'], count + row['count'], units + row['units'])
+        return days
+
+    def aggregate_items(self, since, chunk_size):
+        """
+        Sum the order items per day and product, one id range of items at a time, in every user database and the
+        archive.
+
+        Each chunk is grouped by the database and merged into the running totals, so
+        only one row per day and product is held in memory. Product categories are
+        looked up separately, as the items may be in another database than the catalog.
+
+        :return: Product totals keyed by ``(day, product_id)`` and leaf category totals
+            keyed by ``(day, category_id)``.
+        """
+        products = {}
+        categories = {}
+        product_categories = {}
+        sources = [OrderItem.objects.using(alias) for alias in user_data_aliases()] + [ArchivedOrderItem.objects.all()]
+        for items in sources:
+            items = items.filter(product__isnull=False)
+            if since is not None:
+                items = items.filter(order__order_date__date__gte=since)
+            for lower, upper in self.id_ranges(items, chunk_size):
+                rows = list(items.filter(id__gt=lower, id__lte=upper)
+                            .annotate(day=TruncDate('order__order_date'))
+                            .values('day', 'product_id')
+                            .annotate(title=Max('product_title'), revenue=Sum(F('price') * F('quantity')),
+                                      units=Sum('quantity'))
+                            .order_by())
+                missing = {row['product_id'] for row in rows} - product_categories.keys()
+                product_categories.update(Product.objects.filter(id__in=missing).values_list('id', 'category_id'))
+                for row in rows:
+                    accumulate(products, (row['day'], row['product_id']), row['title'], row['revenue'],
+                               row['units'])
+                    category_id = product_categories.get(row['product_id'])
+                    if category_id:
+                        accumulate(categories, (row['day'], category_id), None, row['revenue'], row['units'])
+        return products, categories
+
+    def expand_categories(self, leaf_categories):
+        """
+        Roll leaf category totals up into every ancestor, so each category covers its subtree.
+        """
+        tree = {category_id: (parent_id, name)
+                for category_id, parent_id, name in Category.objects.values_list('id', 'parent_id', 'name')}
+        totals = {}
+        for (day, category_id), (_, revenue, units) in leaf_categories.items():
+            while category_id in tree:
+                parent_id, name = tree[category_id]
+                accumulate(totals, (day, category_id), name, revenue, units)
+                category_id = parent_id
+        return totals
+
+    @staticmethod
+    def id_ranges(queryset, chunk_size):
+        """
+        Yield ``(lower, upper]`` primary key bounds covering ``queryset`` in chunks of ``chunk_size`` rows.
+        """
+        lower = 0
+        while True:
+            remaining = queryset.filter(id__gt=lower)
+            boundary = list(remaining.order_by('id').values_list('id', flat=True)[chunk_size - 1:chunk_size])
+            upper = boundary[0] if boundary else remaining.aggregate(last=Max('id'))['last']
+            if upper is None:
+                return
+            yield lower, upper
+            lower = upper
@@ -0,0 +1,84 @@
+import multiprocessing
+import signal
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from Order.services import claim_checkout_jobs, run_checkout_job
+
+
+def work(batch_size, poll_interval, once=False):
+    """
+    Claim and run checkout jobs until stopped, or until the queue is empty when ``once`` is set.
+
+    :return: The number of jobs processed.
+    """
+    processed = 0
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    if multiprocessing.parent_process() is not None:
+        signal.signal(signal.SIGTERM, stop)
+
+    while not stopping:
+        jobs = claim_checkout_jobs(batch_size)
+        for job in jobs:
+            run_checkout_job(job)
+        processed += len(jobs)
+        if not jobs:
+            if once:
+                break
+            time.sleep(poll_interval)
+    return processed
+
+
+def work_in_child(batch_size, poll_interval, once):
+    django.setup()
+    # Never share the parent's database connections with a child process
+    connections.close_all()
+    work(batch_size, poll_interval, once)
+
+
+class Command(BaseCommand):
+    help = 'Process queued asynchronous checkouts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.CHECKOUT_WORKER_PROCESSES,
+                            help='Number of worker processes. With 1 the jobs run in this process.')
+        parser.add_argument('--batch-size', type=int, default=settings.CHECKOUT_WORKER_BATCH_SIZE,
+                            help='Jobs claimed by a worker per poll.')
+        parser.add_argument('--poll-interval', type=float, default=settings.CHECKOUT_WORKER_POLL_INTERVAL,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is drained instead of polling forever.')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        worker_args = (options['batch_size'], options['poll_interval'], options['once'])
+
+        if processes == 1:
+            processed = work(*worker_args)
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} checkout jobs.'))
+            return
+
+        connections.close_all()
+        workers = [multiprocessing.Process(target=work_in_child, args=worker_args, daemon=True)
+                   for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Started {processes} checkout workers.')
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+        self.stdout.write(self.style.SUCCESS('Checkout workers stopped.'))
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-19 10:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Order', '0004_order_totals_and_item_snapshots'),
+        ('Users', '0002_alter_address_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'order_date'], name='order_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status', 'order_date'], name='order_user_status_date_idx'),
+        ),
+    ]
@@ -1,32 +1,300 @@
 from django.db import models
-from django.db.models import Sum, F
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from Users.models import Address
-from Product.models import Product
+from Product.models import Product, Category
 from django.conf import settings
 from decimal import Decimal, ROUND_HALF_UP
 
 
 # Create your models here.
 class Order(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    PENDING = 'pending'
+    PAID = 'paid'
+    SHIPPED = 'shipped'
+    DELIVERED = 'delivered'
+    CANCELLED = 'cancelled'
+    REFUNDED = 'refunded'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PAID, 'Paid'),
+        (SHIPPED, 'Shipped'),
+        (DELIVERED, 'Delivered'),
+        (CANCELLED, 'Cancelled'),
+        (REFUNDED, 'Refunded'),
+    ]
+    # Allowed status changes; statuses without an entry are terminal
+    TRANSITIONS = {
+        PENDING: {PAID, CANCELLED},
+        PAID: {SHIPPED, CANCELLED, REFUNDED},
+        SHIPPED: {DELIVERED},
+        DELIVERED: {REFUNDED},
+    }
+
+    # Unconstrained so orders can live in a user shard (see Shop/sharding.py)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False)
     order_date = models.DateTimeField(auto_now_add=True)
     address = models.ForeignKey(Address, on_delete=models.CASCADE, null=True)
-    status = models.CharField(max_length=50)
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES, default=PENDING)
+    # Written once at checkout so order reads do not aggregate over the items
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Back the newest-first order history and its status/date filters
+            models.Index(fields=['user', 'order_date'], name='order_user_date_idx'),
+            models.Index(fields=['user', 'status', 'order_date'], name='order_user_status_date_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.user.email}"
 
+    @classmethod
+    def can_transition(cls, from_status, to_status):
+        return to_status in cls.TRANSITIONS.get(from_status, ())
+
+    @classmethod
+    def refresh_totals(cls, order_ids, using):
+        """
+        Recompute the persisted total and item count of the given orders from their items, in one query.
+
+        :param order_ids: Ids of the orders whose items changed.
+        :param using: The database holding the orders and their items.
+        """
+        if not order_ids:
+            return
+        items = (OrderItem.objects.using(using).filter(order=OuterRef('pk')).order_by().values('order')
+                 .annotate(total=Sum(F('price') * F('quantity')), count=Sum('quantity')))
+        cls.objects.using(using).filter(pk__in=order_ids).update(
+            total_amount=Coalesce(Subquery(items.values('total')), Value(Decimal('0.00')),
+                                  output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+            item_count=Coalesce(Subquery(items.values('count')), Value(0)),
+        )
+
     @property
     def total_price(self):
-        total = self.items.aggregate(total=Sum(F("price") * F("quantity")))["total"]
+        prefetched_items = getattr(self, '_prefetched_objects_cache', {}).get('items')
+        if prefetched_items is not None:
+            total = sum(item.price * item.quantity for item in prefetched_items)
+        else:
+            total = self.items.aggregate(total=Sum(F("price") * F("quantity")))["total"]
         return Decimal(total or 0.0).quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
 
 
+class OrderItemQuerySet(models.QuerySet):
+    """
+    Order items, whose ``update()`` and ``delete()`` keep the totals of the affected orders in step.
+    """
+    # Fields the order totals are computed from
+    TOTAL_FIELDS = {'order', 'order_id', 'price', 'quantity'}
+
+    def update(self, **kwargs):
+        if not self.TOTAL_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        order_ids = self.affected_order_ids()
+        rows = super().update(**kwargs)
+        new_order = kwargs.get('order_id', kwargs.get('order'))
+        if new_order is not None:
+            order_ids.add(getattr(new_order, 'pk', new_order))
+        Order.refresh_totals(order_ids, self.db)
+        return rows
+
+    def delete(self):
+        order_ids = self.affected_order_ids()
+        deleted = super().delete()
+        Order.refresh_totals(order_ids, self.db)
+        return deleted
+
+    def affected_order_ids(self):
+        return set(self.order_by().values_list('order_id', flat=True).distinct())
+
+
 class OrderItem(models.Model):
+    """
+    An item of an order.
+
+    The order's persisted ``total_amount`` and ``item_count`` are recomputed
+    whenever its items are saved, updated or deleted through the ORM. Only
+    ``bulk_create`` (checkout, generated data) and raw SQL bypass this; their
+    callers set the totals themselves, and ``manage.py backfill_order_totals``
+    repairs them.
+    """
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, db_constraint=False)
+    # Snapshot of the product title, so order history survives catalog changes
+    product_title = models.CharField(max_length=255, blank=True)
     quantity = models.PositiveIntegerField()
+    # Unit price at the time of the order
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = OrderItemQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.quantity} of {self.product_title} in order {self.order_id}"
+
+    def save(self, *args, **kwargs):
+        """
+        Snapshot the product title and recompute the order totals.
+        """
+        if not self.product_title and self.product_id:
+            self.product_title = self.product.title
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or OrderItemQuerySet.TOTAL_FIELDS & set(update_fields):
+            Order.refresh_totals([self.order_id], self._state.db)
+
+    def delete(self, *args, **kwargs):
+        deleted = super().delete(*args, **kwargs)
+        Order.refresh_totals([self.order_id], self._state.db)
+        return deleted
+
+
+class ArchivedOrder(models.Model):
+    """
+    An order moved out of the hot order tables by ``manage.py archive_orders``.
+
+    Keeps the original order id, so references to the order stay valid.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    order_date = models.DateTimeField()
+    # Unconstrained, as the address may be in a user shard
+    address = models.ForeignKey(Address, on_delete=models.DO_NOTHING, null=True, related_name='+', db_constraint=False)
+    status = models.CharField(max_length=50, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    item_count = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'order_date'], name='archivedorder_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id} by {self.user.email}"
+
+
+class ArchivedOrderItem(models.Model):
+    """
+    An item of an archived order, keeping its original id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='+')
+    product_title = models.CharField(max_length=255, blank=True)
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.quantity} of {self.product_title} in archived order {self.order_id}"
+
+
+class OrderStatusTransition(models.Model):
+    """
+    Append-only audit record of an order status change.
+    """
+    # Unconstrained so the audit trail is kept when the order is moved to the archive
+    order = models.ForeignKey(Order, on_delete=models.DO_NOTHING, db_constraint=False,
+                              related_name='status_transitions')
+    from_status = models.CharField(max_length=50)
+    to_status = models.CharField(max_length=50)
+    changed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='+')
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status} -> {self.to_status}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Order status transitions are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Order status transitions are append-only.")
+
+
+class CheckoutJob(models.Model):
+    """
+    A queued checkout, processed by ``manage.py run_workers``.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='checkout_jobs')
+    # Unconstrained, as the address and order may be in a user shard
+    address = models.ForeignKey(Address, on_delete=models.DO_NOTHING, db_constraint=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    order = models.ForeignKey(Order, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False)
+    error = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='checkoutjob_status_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"Checkout job {self.id} ({self.status}) for {self.user.email}"
+
+
+class DailySales(models.Model):
+    """
+    Sales totals for one day, maintained at checkout and by ``manage.py rebuild_sales_rollups``.
+    """
+    date = models.DateField(unique=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Sales on {self.date}: {self.revenue}"
+
+
+class DailyProductSales(models.Model):
+    """
+    Sales of one product on one day.
+
+    The product is referenced without a database constraint and its title is copied,
+    so rollups can be read without the catalog and outlive deleted products.
+    """
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    product_title = models.CharField(max_length=255, blank=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    units = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'product')
+
+    def __str__(self):
+        return f"{self.product_title} on {self.date}: {self.revenue}"
+
+
+class DailyCategorySales(models.Model):
+    """
+    Sales of a category subtree on one day; a category includes the sales of all its descendants.
+    """
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    category_name = models.CharField(max_length=100, blank=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    units = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'category')
+
     def __str__(self):
-        return f"{self.quantity} of {self.product.title} in order {self.order.id}"
+        return f"{self.category_name} on {self.date}: {self.revenue}"
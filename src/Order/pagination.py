@@ -0,0 +1,97 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+
+"""
+This module contains the pagination classes for the Order API.
+"""
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Newest-first keyset pagination over the order history, and across the live and archived order tables.
+
+    Each table is read with an ``(order_date, id)`` range comparison backed by the
+    ``(user, order_date)`` indexes, so the cost of a page does not grow with the
+    number of orders a user has placed, even when many orders share a timestamp.
+    With several tables, their pages are merged, so archived history costs the
+    same per page as live history. The async views read the tables through
+    :meth:`apaginate_querysets`. Only forward links are provided.
+    """
+    ordering = ('-order_date', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request, view)
+
+    def paginate_querysets(self, querysets, request, view=None):
+        rows = []
+        for queryset in self.page_querysets(querysets, request):
+            rows.extend(queryset)
+        return self.merge_page(rows)
+
+    async def apaginate_querysets(self, querysets, request):
+        """
+        Like :meth:`paginate_querysets`, reading each queryset by async iteration.
+        """
+        rows = []
+        for queryset in self.page_querysets(querysets, request):
+            rows.extend([order async for order in queryset])
+        return self.merge_page(rows)
+
+    def page_querysets(self, querysets, request):
+        """
+        Narrow each queryset to the orders that may be on the requested page.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        pages = []
+        for queryset in querysets:
+            if cursor is not None:
+                order_date, order_id = self.parse_position(cursor.position)
+                queryset = queryset.filter(Q(order_date__lt=order_date) | Q(order_date=order_date, id__lt=order_id))
+            pages.append(queryset.order_by('-order_date', '-id')[:self.page_size + 1])
+        return pages
+
+    def merge_page(self, rows):
+        rows.sort(key=lambda order: (order.order_date, order.id), reverse=True)
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def parse_position(self, position):
+        try:
+            order_date, order_id = position.split('|')
+            order_date = parse_datetime(order_date)
+            if order_date is None:
+                raise ValueError(position)
+            return order_date, int(order_id)
+        except (AttributeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        position = f'{last.order_date.isoformat()}|{last.id}'
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        return None
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        }
@@ -0,0 +1,101 @@
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+from django.utils import timezone
+
+from Product.models import Category
+from .models import DailySales, DailyProductSales, DailyCategorySales
+
+"""
+This module maintains the daily sales rollup tables read by the analytics endpoints.
+"""
+
+
+def record_order_sales(order, order_items):
+    """
+    Add a newly placed order to the daily rollups.
+
+    Each rollup table is updated with one insert of any missing rows and one
+    ``UPDATE`` that increments all affected rows, so the cost does not depend on
+    the number of items. Must be called in the transaction that writes the order.
+
+    :param order: The order that was just created.
+    :param order_items: Its items, with their products loaded.
+    """
+    day = timezone.localdate(order.order_date)
+
+    DailySales.objects.bulk_create([DailySales(date=day)], ignore_conflicts=True)
+    DailySales.objects.filter(date=day).update(
+        revenue=F('revenue') + Value(order.total_amount, output_field=DecimalField()),
+        order_count=F('order_count') + 1,
+        units=F('units') + order.item_count,
+    )
+
+    products = {}
+    categories = {}
+    for item in order_items:
+        if item.product is None:
+            continue
+        revenue = item.price * item.quantity
+        accumulate(products, item.product_id, item.product_title, revenue, item.quantity)
+        if item.product.category_id:
+            accumulate(categories, item.product.category_id, None, revenue, item.quantity)
+
+    increment_rollups(DailyProductSales, day, 'product_id', 'product_title', products)
+
+    if categories:
+        subtree_totals = {}
+        for category_id, ancestors in category_ancestors(categories).items():
+            _, revenue, units = categories[category_id]
+            for ancestor in ancestors:
+                accumulate(subtree_totals, ancestor.id, ancestor.name, revenue, units)
+        increment_rollups(DailyCategorySales, day, 'category_id', 'category_name', subtree_totals)
+
+
+def accumulate(totals, key, label, revenue, units):
+    """
+    Add revenue and units to ``totals[key]``, a ``[label, revenue, units]`` list.
+    """
+    entry = totals.setdefault(key, [label, 0, 0])
+    entry[1] += revenue
+    entry[2] += units
+
+
+def increment_rollups(model, day, key_field, label_field, totals):
+    """
+    Increment the rollup rows of ``model`` for ``day`` by ``totals``, creating missing rows.
+
+    :param totals: A mapping of key to ``[label, revenue, units]``.
+    """
+    if not totals:
+        return
+    model.objects.bulk_create(
+        [model(date=day, **{key_field: key, label_field: label}) for key, (label, _, _) in totals.items()],
+        ignore_conflicts=True,
+    )
+    model.objects.filter(date=day, **{f'{key_field}__in': list(totals)}).update(
+        revenue=F('revenue') + Case(
+            *[When(**{key_field: key}, then=Value(revenue)) for key, (_, revenue, _) in totals.items()],
+            output_field=DecimalField(),
+        ),
+        units=F('units') + Case(
+            *[When(**{key_field: key}, then=Value(units)) for key, (_, _, units) in totals.items()],
+            output_field=IntegerField(),
+        ),
+    )
+
+
+def category_ancestors(category_ids):
+    """
+    Map each category id to the categories whose subtree contains it, itself included.
+
+    :param category_ids: Ids of the categories to resolve.
+    :return: A dict of category id to a list of categories.
+    """
+    nodes = Category.objects.filter(id__in=list(category_ids))
+    ancestors = list(Category.objects.get_queryset_ancestors(nodes, include_self=True))
+    by_id = {category.id: category for category in ancestors}
+    return {
+        category_id: [ancestor for ancestor in ancestors
+                      if by_id[category_id].is_descendant_of(ancestor, include_self=True)]
+        for category_id in category_ids
+        if category_id in by_id
+    }
@@ -1,12 +1,11 @@
+from decimal import Decimal, ROUND_HALF_UP
+
 from rest_framework import serializers
-from .models import Order, OrderItem
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem, CheckoutJob, DailySales
 from Users.serializers import AddressSerializer
-from Product.models import Product
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_title = serializers.CharField(source='product.title', read_only=True)
-
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'product_title', 'quantity', 'price']
@@ -16,8 +15,86 @@ class OrderItemSerializer(serializers.ModelSerializer):
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     address = AddressSerializer()
+    total_price = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
-        fields = ['id', 'user', 'order_date', 'status', 'address', 'total_price', 'items']
-        read_only_fields = ['user', 'order_date', 'total_price']
+        fields = ['id', 'user', 'order_date', 'status', 'address', 'total_price', 'item_count', 'items']
+        read_only_fields = ['user', 'order_date', 'total_price', 'item_count']
+
+    def get_total_price(self, obj):
+        # Read the total persisted at checkout rather than aggregating the items
+        return Decimal(obj.total_amount).quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
+
+
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ['id', 'product', 'product_title', 'quantity', 'price']
+        read_only_fields = fields
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    """
+    Serializer for archived orders, with the same shape as :class:`OrderSerializer`.
+    """
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    archived = serializers.SerializerMethodField()
+
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+        fields = OrderSerializer.Meta.fields + ['archived']
+
+    def get_archived(self, obj):
+        return True
+
+
+class CheckoutJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CheckoutJob
+        fields = ['id', 'status', 'order', 'error', 'created_at', 'finished_at']
+        read_only_fields = fields
+
+
+class StatusTransitionSerializer(serializers.Serializer):
+    order = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+class BulkStatusTransitionSerializer(serializers.Serializer):
+    """
+    Serializer for a bulk order status change.
+
+    Attributes:
+        transitions: The orders to change, each with its requested status.
+    """
+    transitions = StatusTransitionSerializer(many=True, allow_empty=False, max_length=10000)
+
+    def validate_transitions(self, transitions):
+        """
+        Reject requests that list the same order more than once.
+        """
+        order_ids = [transition['order'] for transition in transitions]
+        if len(order_ids) != len(set(order_ids)):
+            raise serializers.ValidationError("Each order may only appear once.")
+        return transitions
+
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ['date', 'revenue', 'order_count', 'units']
+
+
+class ProductSalesSerializer(serializers.Serializer):
+    product = serializers.IntegerField(source='product_id')
+    product_title = serializers.CharField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
+
+
+class CategorySalesSerializer(serializers.Serializer):
+    category = serializers.IntegerField(source='category_id')
+    category_name = serializers.CharField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
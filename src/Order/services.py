@@ -0,0 +1,272 @@
+import logging
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction, OperationalError
+from django.db.models import F
+from django.utils import timezone
+
+from Cart.models import CartItem
+from .models import Order, OrderItem, OrderStatusTransition, CheckoutJob
+from .rollups import record_order_sales
+from Shop.metrics import checkouts
+from Shop.sharding import for_user, sharding_enabled, user_atomic, user_data_aliases
+
+"""
+This module contains the checkout pipeline shared by the cart API and the checkout workers.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutError(Exception):
+    """
+    Raised when a cart cannot be turned into an order.
+    """
+
+
+def lock_cart(user):
+    """
+    Read the user's cart together with its products in a single query.
+
+    With user shards the cart and the catalog are in different databases, so
+    the products are read in a second query instead.
+
+    Must be called inside a transaction; the rows are locked where the database supports it.
+
+    :param user: The owner of the cart.
+    :return: A list of cart items with their products loaded.
+    """
+    cart = CartItem.objects.filter(user=user)
+    cart = cart.prefetch_related('product') if sharding_enabled() else cart.select_related('product')
+    return list(cart.select_for_update())
+
+
+def place_order(user, address, cart_items):
+    """
+    Write the order, its totals and its item snapshots for the given cart items and clear them from the cart.
+
+    Must be called inside a transaction, which also covers the daily sales rollup
+    updates. The returned order has its items cached, so it can be serialized
+    without further queries.
+
+    :param user: The user placing the order.
+    :param address: The shipping address, owned by the user.
+    :param cart_items: Cart items as returned by :func:`lock_cart`.
+    :return: The created order.
+    """
+    order = Order.objects.create(
+        user=user,
+        address=address,
+        status=Order.PENDING,
+        total_amount=sum(item.quantity * item.product.price for item in cart_items),
+        item_count=sum(item.quantity for item in cart_items),
+    )
+
+    order_items = [
+        OrderItem(
+            order=order,
+            product=item.product,
+            product_title=item.product.title,
+            quantity=item.quantity,
+            price=item.product.price
+        )
+        for item in cart_items
+    ]
+    OrderItem.objects.bulk_create(order_items)
+    record_order_sales(order, order_items)
+
+    # Clear the cart, limited to the rows that were actually ordered
+    CartItem.objects.filter(id__in=[item.id for item in cart_items]).delete()
+
+    order._prefetched_objects_cache = {'items': order_items}
+    return order
+
+
+class TransitionError(Exception):
+    """
+    Raised when a bulk status transition cannot be applied.
+
+    :ivar errors: A mapping of order id to the reason its transition was rejected.
+    """
+
+    def __init__(self, errors):
+        super().__init__("Invalid order status transitions.")
+        self.errors = errors
+
+
+class ConcurrentTransitionError(Exception):
+    """
+    Raised when orders changed status while a bulk transition was being applied.
+    """
+
+
+def transition_orders(targets, changed_by=None):
+    """
+    Move orders to new statuses, all or nothing.
+
+    Current statuses are read in one query and the requested changes are grouped
+    by ``(from, to)``, so each group is validated against :attr:`Order.TRANSITIONS`
+    once and applied with a single ``UPDATE``. Every change is recorded in
+    :class:`OrderStatusTransition`.
+
+    With user shards, the orders are looked up in every shard, under one
+    transaction per database.
+
+    :param targets: A mapping of order id to the requested status.
+    :param changed_by: The user applying the change.
+    :return: A dict mapping ``(from, to)`` to the list of order ids moved.
+    :raise TransitionError: If an order does not exist or a transition is not allowed.
+    :raise ConcurrentTransitionError: If an order changed status in the meantime.
+    """
+    with ExitStack() as stack:
+        aliases = user_data_aliases()
+        for alias in aliases:
+            stack.enter_context(transaction.atomic(using=alias))
+        current, order_aliases = {}, {}
+        for alias in aliases:
+            for order_id, order_status in (Order.objects.using(alias).select_for_update()
+                                           .filter(id__in=list(targets)).values_list('id', 'status')):
+                current[order_id] = order_status
+                order_aliases[order_id] = alias
+
+        groups = {}
+        for order_id, to_status in targets.items():
+            groups.setdefault((current.get(order_id), to_status), []).append(order_id)
+
+        errors = {}
+        for (from_status, to_status), order_ids in groups.items():
+            if from_status is None:
+                reason = "Order does not exist."
+            elif not Order.can_transition(from_status, to_status):
+                reason = f"Cannot change status from '{from_status}' to '{to_status}'."
+            else:
+                continue
+            errors.update({order_id: reason for order_id in order_ids})
+        if errors:
+            raise TransitionError(errors)
+
+        for (from_status, to_status), order_ids in groups.items():
+            updated = sum(
+                Order.objects.using(alias)
+                .filter(id__in=[order_id for order_id in order_ids if order_aliases[order_id] == alias],
+                        status=from_status)
+                .update(status=to_status)
+                for alias in aliases
+            )
+            if updated != len(order_ids):
+                raise ConcurrentTransitionError("Some orders changed status during the update.")
+
+        OrderStatusTransition.objects.bulk_create([
+            OrderStatusTransition(order_id=order_id, from_status=from_status, to_status=to_status,
+                                  changed_by=changed_by)
+            for (from_status, to_status), order_ids in groups.items()
+            for order_id in order_ids
+        ])
+    return groups
+
+
+def requeue_stale_checkout_jobs():
+    """
+    Put back in the queue the jobs left running by a worker that stopped, e.g. killed, before recording an outcome.
+
+    A job is considered abandoned once it has been running for
+    ``CHECKOUT_JOB_LEASE_SECONDS``, which must be well above the time a checkout
+    takes. Jobs that already had ``CHECKOUT_JOB_MAX_ATTEMPTS`` attempts are
+    failed instead.
+
+    :return: A ``(requeued, failed)`` tuple of job counts.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, 'CHECKOUT_JOB_LEASE_SECONDS', 300))
+    stale = CheckoutJob.objects.filter(status=CheckoutJob.RUNNING, started_at__lt=now - lease)
+    failed = stale.filter(attempts__gte=getattr(settings, 'CHECKOUT_JOB_MAX_ATTEMPTS', 5)).update(
+        status=CheckoutJob.FAILED, error="The worker stopped before finishing the job.", finished_at=now)
+    requeued = stale.update(status=CheckoutJob.QUEUED, started_at=None)
+    if requeued or failed:
+        logger.warning("Requeued %s and failed %s abandoned checkout jobs", requeued, failed)
+        checkouts.labels('worker', 'retried').inc(requeued)
+        checkouts.labels('worker', 'failed').inc(failed)
+    return requeued, failed
+
+
+def claim_checkout_jobs(limit):
+    """
+    Atomically move up to ``limit`` queued jobs to running and return them.
+
+    Abandoned jobs are requeued first, see :func:`requeue_stale_checkout_jobs`.
+    Uses ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it. On
+    SQLite, each job is claimed with a conditional ``UPDATE`` so that only one
+    worker can win it.
+
+    :param limit: Maximum number of jobs to claim.
+    :return: A list of claimed jobs.
+    """
+    requeue_stale_checkout_jobs()
+    now = timezone.now()
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            claimed = list(
+                CheckoutJob.objects.select_for_update(skip_locked=True)
+                .filter(status=CheckoutJob.QUEUED)
+                .order_by('id')
+                .values_list('id', flat=True)[:limit]
+            )
+            CheckoutJob.objects.filter(id__in=claimed).update(
+                status=CheckoutJob.RUNNING, started_at=now, attempts=F('attempts') + 1)
+    else:
+        candidates = CheckoutJob.objects.filter(status=CheckoutJob.QUEUED).order_by('id').values_list('id', flat=True)
+        claimed = [
+            job_id for job_id in list(candidates[:limit])
+            if CheckoutJob.objects.filter(id=job_id, status=CheckoutJob.QUEUED).update(
+                status=CheckoutJob.RUNNING, started_at=now, attempts=F('attempts') + 1)
+        ]
+    # Addresses are loaded per job, from the shard of each job's user
+    return list(CheckoutJob.objects.filter(id__in=claimed).select_related('user').order_by('id'))
+
+
+def run_checkout_job(job):
+    """
+    Run a claimed checkout job, recording its outcome on the job row.
+
+    The order and the job's success are committed in the same transaction.
+    Transient database errors, such as SQLite reporting "database is locked",
+    put the job back in the queue until ``CHECKOUT_JOB_MAX_ATTEMPTS`` is reached.
+
+    :param job: A job returned by :func:`claim_checkout_jobs`.
+    """
+    try:
+        with for_user(job.user_id), user_atomic():
+            cart_items = lock_cart(job.user)
+            if not cart_items:
+                raise CheckoutError("Your cart is empty.")
+            job.order = place_order(job.user, job.address, cart_items)
+            job.status = CheckoutJob.SUCCEEDED
+            job.finished_at = timezone.now()
+            job.save(update_fields=['order', 'status', 'finished_at'])
+        checkouts.labels('worker', 'placed').inc()
+    except OperationalError as exc:
+        job.refresh_from_db(fields=['attempts'])
+        if job.attempts < getattr(settings, 'CHECKOUT_JOB_MAX_ATTEMPTS', 5):
+            logger.warning("Checkout job %s will be retried: %s", job.id, exc)
+            job.status = CheckoutJob.QUEUED
+            job.started_at = None
+            job.save(update_fields=['status', 'started_at'])
+            checkouts.labels('worker', 'retried').inc()
+            return
+        logger.error("Checkout job %s failed after %s attempts: %s", job.id, job.attempts, exc)
+        fail_checkout_job(job, exc)
+    except CheckoutError as exc:
+        fail_checkout_job(job, exc)
+    except Exception as exc:
+        logger.exception("Checkout job %s failed", job.id)
+        fail_checkout_job(job, exc)
+
+
+def fail_checkout_job(job, exc):
+    checkouts.labels('worker', 'failed').inc()
+    job.status = CheckoutJob.FAILED
+    job.error = str(exc)[:255]
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
@@ -1,12 +1,30 @@
-from django.test import TestCase
+import os
+import sqlite3
+import tempfile
+from contextlib import ExitStack
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import OperationalError, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from Users.models import User, Address
-from Product.models import Product
-from .models import Order, OrderItem
+from Product.models import Product, Category
+from .models import Order, OrderItem, ArchivedOrder, OrderStatusTransition, CheckoutJob, DailySales, DailyProductSales, DailyCategorySales
+from .services import claim_checkout_jobs, requeue_stale_checkout_jobs, transition_orders
+from Cart.models import CartItem
 from decimal import Decimal
+from io import StringIO
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.management import call_command
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import AccessToken
+from Shop.sharding import SHARD_ID_SPACE, for_user, get_user_shard, jump_hash
+from Shop.transactions import is_lock_error, retry_write_transaction
 
 User = get_user_model()
 
@@ -68,6 +86,28 @@ class OrderModelsTest(TestCase):
         self.assertEqual(self.order_item.quantity, 2)
         self.assertEqual(self.order_item.price, 99.99)
 
+    def test_order_totals_follow_item_changes(self):
+        def totals():
+            order = Order.objects.get(pk=self.order.pk)
+            return order.total_amount, order.item_count
+
+        self.assertEqual(totals(), (Decimal('199.98'), 2))
+        other = OrderItem.objects.create(order=self.order, product=self.product, quantity=1, price=Decimal('5.00'))
+        self.assertEqual(totals(), (Decimal('204.98'), 3))
+
+        self.order_item.quantity = 3
+        self.order_item.save()
+        self.assertEqual(totals(), (Decimal('304.97'), 4))
+
+        OrderItem.objects.filter(pk=other.pk).update(price=Decimal('6.00'))
+        self.assertEqual(totals(), (Decimal('305.97'), 4))
+
+        other.delete()
+        self.assertEqual(totals(), (Decimal('299.97'), 3))
+
+        OrderItem.objects.filter(order=self.order).delete()
+        self.assertEqual(totals(), (Decimal('0.00'), 0))
+
     def test_order_item_str_method(self):
         # Check the __str__ method of OrderItem
         expected_str = f"2 of {self.product.title} in order {self.order.id}"
@@ -125,3 +165,724 @@ class OrderDetailTestCase(APITestCase):
         url = reverse('order-detail', kwargs={'pk': self.order.id})
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AsyncCheckoutTestCase(APITestCase):
+    """
+    Test case for checkouts queued with "Prefer: respond-async" and processed by run_workers.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.product = Product.objects.create(title='Product 1', price=10.00)
+        self.address = Address.objects.create(user=self.user, address_line='123 Main St', city='Anytown', state='CA',
+                                              zip_code='12345', country='USA')
+        CartItem.objects.create(user=self.user, product=self.product, quantity=2)
+        self.client.force_authenticate(user=self.user)
+
+    def checkout(self):
+        return self.client.post(reverse('cart-checkout'), data={'address_id': self.address.id},
+                                HTTP_PREFER='respond-async')
+
+    def test_checkout_is_queued(self):
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response['Location'], response.data['url'])
+        self.assertEqual(CheckoutJob.objects.get().status, CheckoutJob.QUEUED)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 1)
+
+    def test_worker_places_order(self):
+        job_url = self.checkout().data['url']
+        call_command('run_workers', processes=1, once=True, stdout=StringIO())
+
+        job = CheckoutJob.objects.get()
+        self.assertEqual(job.status, CheckoutJob.SUCCEEDED)
+        self.assertEqual(job.order.total_price, Decimal('20.00'))
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+
+        response = self.client.get(job_url)
+        self.assertEqual(response.data['order'], job.order.id)
+        response = self.client.get(reverse('order-detail', kwargs={'pk': job.order.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_worker_fails_job_for_emptied_cart(self):
+        self.checkout()
+        CartItem.objects.filter(user=self.user).delete()
+        call_command('run_workers', processes=1, once=True, stdout=StringIO())
+
+        job = CheckoutJob.objects.get()
+        self.assertEqual(job.status, CheckoutJob.FAILED)
+        self.assertEqual(job.error, 'Your cart is empty.')
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_job_is_claimed_once(self):
+        self.checkout()
+        self.assertEqual(len(claim_checkout_jobs(10)), 1)
+        self.assertEqual(claim_checkout_jobs(10), [])
+
+    def test_abandoned_jobs_are_requeued_after_their_lease(self):
+        self.checkout()
+        claim_checkout_jobs(10)  # Claimed by a worker that is then killed
+        self.assertEqual(claim_checkout_jobs(10), [])
+
+        CheckoutJob.objects.update(started_at=timezone.now() - timedelta(seconds=301))
+        with self.assertLogs('Order.services', 'WARNING') as logs:
+            call_command('run_workers', processes=1, once=True, stdout=StringIO())
+        self.assertIn('Requeued 1 and failed 0 abandoned checkout jobs', logs.output[0])
+
+        job = CheckoutJob.objects.get()
+        self.assertEqual(job.status, CheckoutJob.SUCCEEDED)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_abandoned_jobs_fail_after_max_attempts(self):
+        self.checkout()
+        claim_checkout_jobs(10)
+        CheckoutJob.objects.update(started_at=timezone.now() - timedelta(seconds=301), attempts=5)
+        recent = CheckoutJob.objects.create(user=self.user, address=self.address, status=CheckoutJob.RUNNING,
+                                            started_at=timezone.now(), attempts=5)
+
+        with self.assertLogs('Order.services', 'WARNING') as logs:
+            self.assertEqual(requeue_stale_checkout_jobs(), (0, 1))
+        self.assertIn('Requeued 0 and failed 1 abandoned checkout jobs', logs.output[0])
+        job = CheckoutJob.objects.exclude(id=recent.id).get()
+        self.assertEqual(job.status, CheckoutJob.FAILED)
+        self.assertEqual(job.error, 'The worker stopped before finishing the job.')
+        self.assertEqual(CheckoutJob.objects.get(id=recent.id).status, CheckoutJob.RUNNING)
+
+    def test_job_not_visible_to_other_users(self):
+        job_url = self.checkout().data['url']
+        other_user = User.objects.create_user(username='otheruser', email='other@example.com', password='testpass')
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(job_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class OrderQueryBudgetTestCase(APITestCase):
+    """
+    Test case for the number of queries run by the order list and detail views.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.address = Address.objects.create(user=self.user, address_line='123 Main St', city='Anytown', state='CA',
+                                              zip_code='12345', country='USA')
+        products = [Product.objects.create(title=f'Product {index}', price=2.50) for index in range(3)]
+        for _ in range(4):
+            order = Order.objects.create(user=self.user, address=self.address, status='pending')
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=2, price=product.price)
+        self.empty_order = Order.objects.create(user=self.user, address=self.address, status='pending')
+        self.client.force_authenticate(user=self.user)
+
+    def test_order_list_query_budget(self):
+        # orders with address and annotated total, items with products
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_order_detail_query_budget(self):
+        order = Order.objects.exclude(pk=self.empty_order.pk).first()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('order-detail', kwargs={'pk': order.pk}))
+        self.assertEqual(response.data['total_price'], Decimal('15.00'))
+        self.assertEqual(len(response.data['items']), 3)
+
+    def test_order_without_items_has_zero_total(self):
+        response = self.client.get(reverse('order-detail', kwargs={'pk': self.empty_order.pk}))
+        self.assertEqual(response.data['total_price'], Decimal('0.00'))
+
+
+class OrderSnapshotTestCase(APITestCase):
+    """
+    Test case for the totals and item snapshots persisted on orders.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.product = Product.objects.create(title='Product 1', price=10.00)
+        self.address = Address.objects.create(user=self.user, address_line='123 Main St', city='Anytown', state='CA',
+                                              zip_code='12345', country='USA')
+        CartItem.objects.create(user=self.user, product=self.product, quantity=3)
+        self.client.force_authenticate(user=self.user)
+
+    def test_checkout_persists_totals_and_titles(self):
+        self.client.post(reverse('cart-checkout'), data={'address_id': self.address.id})
+
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, Decimal('30.00'))
+        self.assertEqual(order.item_count, 3)
+        self.assertEqual(order.items.get().product_title, 'Product 1')
+
+    def test_order_history_survives_product_deletion(self):
+        self.client.post(reverse('cart-checkout'), data={'address_id': self.address.id})
+        order = Order.objects.get()
+        self.product.delete()
+
+        response = self.client.get(reverse('order-detail', kwargs={'pk': order.pk}))
+        self.assertEqual(response.data['total_price'], Decimal('30.00'))
+        self.assertIsNone(response.data['items'][0]['product'])
+        self.assertEqual(response.data['items'][0]['product_title'], 'Product 1')
+
+    def test_backfill_order_totals(self):
+        order = Order.objects.create(user=self.user, address=self.address, status='pending')
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=Decimal('10.00'))
+        OrderItem.objects.filter(order=order).update(product_title='')
+        Order.objects.filter(pk=order.pk).update(total_amount=0, item_count=0)
+
+        call_command('backfill_order_totals', batch_size=1, stdout=StringIO())
+
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('20.00'))
+        self.assertEqual(order.item_count, 2)
+        self.assertEqual(order.items.get().product_title, 'Product 1')
+
+
+class OrderHistoryTestCase(APITestCase):
+    """
+    Test case for the paginated and filtered order history.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.orders = []
+        for day in range(1, 6):
+            order = Order.objects.create(user=self.user, status='shipped' if day % 2 else 'pending')
+            Order.objects.filter(pk=order.pk).update(order_date=datetime(2024, 1, day, 12, tzinfo=dt_timezone.utc))
+            self.orders.append(order)
+        self.client.force_authenticate(user=self.user)
+
+    def test_newest_first_pages(self):
+        url = reverse('order-list')
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual([order['id'] for order in response.data['results']],
+                         [self.orders[4].id, self.orders[3].id])
+
+        seen = [order['id'] for order in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(order['id'] for order in response.data['results'])
+        self.assertEqual(seen, [order.id for order in reversed(self.orders)])
+
+    def test_orders_sharing_a_timestamp_are_paged_by_keyset(self):
+        Order.objects.update(order_date=datetime(2024, 1, 1, 12, tzinfo=dt_timezone.utc))
+        url = reverse('order-list')
+        response = self.client.get(url, {'page_size': 2})
+        seen = [order['id'] for order in response.data['results']]
+        while response.data['next']:
+            with CaptureQueriesContext(connections['default']) as queries:
+                response = self.client.get(response.data['next'])
+            self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+            seen.extend(order['id'] for order in response.data['results'])
+        self.assertEqual(seen, sorted((order.id for order in self.orders), reverse=True))
+
+        # The merged archive history reads the same cursors
+        next_link = self.client.get(url, {'page_size': 2}).data['next']
+        self.assertEqual(self.client.get(next_link + '&include_archived=1').data['results'][0]['id'],
+                         self.orders[2].id)
+
+    def test_status_filter(self):
+        response = self.client.get(reverse('order-list'), {'status': 'pending'})
+        self.assertEqual({order['id'] for order in response.data['results']},
+                         {self.orders[1].id, self.orders[3].id})
+
+    def test_date_range_filter(self):
+        response = self.client.get(reverse('order-list'), {'date_from': '2024-01-02', 'date_to': '2024-01-03'})
+        self.assertEqual([order['id'] for order in response.data['results']],
+                         [self.orders[2].id, self.orders[1].id])
+
+    def test_invalid_date_filter(self):
+        response = self.client.get(reverse('order-list'), {'date_from': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('date_from', response.data)
+
+
+class SalesRollupTestCase(APITestCase):
+    """
+    Test case for the daily sales rollups and the staff analytics endpoints.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.staff = User.objects.create_user(username='staff', email='staff@example.com', password='testpass',
+                                              is_staff=True)
+        self.address = Address.objects.create(user=self.user, address_line='123 Main St', city='Anytown', state='CA',
+                                              zip_code='12345', country='USA')
+        self.electronics = Category.objects.create(name='Electronics')
+        self.phones = Category.objects.create(name='Phones', parent=self.electronics)
+        self.laptops = Category.objects.create(name='Laptops', parent=self.electronics)
+        self.phone = Product.objects.create(title='Phone', price=100, category=self.phones)
+        self.laptop = Product.objects.create(title='Laptop', price=500, category=self.laptops)
+
+    def place_order(self, *lines):
+        for product, quantity in lines:
+            CartItem.objects.create(user=self.user, product=product, quantity=quantity)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('cart-checkout'), data={'address_id': self.address.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def rollup_snapshot(self):
+        return (
+            list(DailySales.objects.values_list('date', 'revenue', 'order_count', 'units')),
+            sorted(DailyProductSales.objects.values_list('date', 'product_id', 'product_title', 'revenue', 'units')),
+            sorted(DailyCategorySales.objects.values_list('date', 'category_id', 'category_name', 'revenue', 'units')),
+        )
+
+    def test_checkout_updates_rollups(self):
+        self.place_order((self.phone, 2), (self.laptop, 1))
+        self.place_order((self.phone, 1))
+
+        day = DailySales.objects.get()
+        self.assertEqual((day.revenue, day.order_count, day.units), (Decimal('800.00'), 2, 4))
+        self.assertEqual(DailyProductSales.objects.get(product=self.phone).revenue, Decimal('300.00'))
+        categories = dict(DailyCategorySales.objects.values_list('category_name', 'revenue'))
+        self.assertEqual(categories, {'Electronics': Decimal('800.00'), 'Phones': Decimal('300.00'),
+                                      'Laptops': Decimal('500.00')})
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.place_order((self.phone, 2), (self.laptop, 1))
+        self.place_order((self.phone, 1))
+        incremental = self.rollup_snapshot()
+
+        call_command('rebuild_sales_rollups', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.rollup_snapshot(), incremental)
+
+    def test_rebuild_keeps_archived_orders(self):
+        self.place_order((self.phone, 2), (self.laptop, 1))
+        self.place_order((self.phone, 1))
+        incremental = self.rollup_snapshot()
+        Order.objects.update(status=Order.DELIVERED)
+        call_command('archive_orders', older_than_days=0, stdout=StringIO())
+        self.assertEqual((Order.objects.count(), ArchivedOrder.objects.count()), (0, 2))
+
+        call_command('rebuild_sales_rollups', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.rollup_snapshot(), incremental)
+
+    def test_analytics_endpoints(self):
+        self.place_order((self.phone, 2), (self.laptop, 1))
+        self.client.force_authenticate(user=self.staff)
+
+        response = self.client.get(reverse('sales-revenue'))
+        self.assertEqual(response.data[0]['order_count'], 1)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('sales-top-products'), {'limit': 1})
+        self.assertEqual([row['product_title'] for row in response.data], ['Laptop'])
+
+        response = self.client.get(reverse('sales-categories'))
+        self.assertEqual(response.data[0]['category_name'], 'Electronics')
+        self.assertEqual(response.data[0]['revenue'], '700.00')
+
+    def test_analytics_requires_staff(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('sales-revenue'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BulkStatusTransitionTestCase(APITestCase):
+    """
+    Test case for the staff bulk order status transition endpoint.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.staff = User.objects.create_user(username='staff', email='staff@example.com', password='testpass',
+                                              is_staff=True)
+        self.pending = [Order.objects.create(user=self.user) for _ in range(3)]
+        self.paid = [Order.objects.create(user=self.user, status=Order.PAID) for _ in range(2)]
+        self.url = reverse('order-status-transitions')
+        self.client.force_authenticate(user=self.staff)
+
+    def test_transitions_are_applied_per_group(self):
+        transitions = ([{'order': order.id, 'status': Order.PAID} for order in self.pending]
+                       + [{'order': order.id, 'status': Order.SHIPPED} for order in self.paid])
+        # savepoint, read statuses, one update per (from, to) group, audit insert, release
+        with self.assertNumQueries(6):
+            response = self.client.post(self.url, {'transitions': transitions}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 5)
+        self.assertEqual(Order.objects.filter(status=Order.PAID).count(), 3)
+        self.assertEqual(Order.objects.filter(status=Order.SHIPPED).count(), 2)
+        audit = OrderStatusTransition.objects.get(order=self.paid[0])
+        self.assertEqual((audit.from_status, audit.to_status, audit.changed_by), (Order.PAID, Order.SHIPPED, self.staff))
+
+    def test_invalid_transition_rejects_whole_request(self):
+        transitions = [{'order': self.pending[0].id, 'status': Order.PAID},
+                       {'order': self.pending[1].id, 'status': Order.DELIVERED},
+                       {'order': 0, 'status': Order.PAID}]
+        response = self.client.post(self.url, {'transitions': transitions}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data['orders']), {self.pending[1].id, 0})
+        self.assertFalse(Order.objects.filter(status=Order.PAID, id=self.pending[0].id).exists())
+        self.assertFalse(OrderStatusTransition.objects.exists())
+
+    def test_duplicate_orders_rejected(self):
+        transitions = [{'order': self.pending[0].id, 'status': Order.PAID},
+                       {'order': self.pending[0].id, 'status': Order.CANCELLED}]
+        response = self.client.post(self.url, {'transitions': transitions}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, {'transitions': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_audit_records_are_append_only(self):
+        self.client.post(self.url, {'transitions': [{'order': self.pending[0].id, 'status': Order.PAID}]},
+                         format='json')
+        audit = OrderStatusTransition.objects.get()
+        with self.assertRaises(ValueError):
+            audit.save()
+        with self.assertRaises(ValueError):
+            audit.delete()
+
+
+class OrderArchiveTestCase(APITestCase):
+    """
+    Test case for archiving old orders and reading them back through the order views.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.product = Product.objects.create(title='Product 1', price=10.00)
+        self.old_delivered = self.create_order(Order.DELIVERED, datetime(2020, 1, 1, tzinfo=dt_timezone.utc))
+        self.old_paid = self.create_order(Order.PAID, datetime(2020, 1, 2, tzinfo=dt_timezone.utc))
+        self.recent = self.create_order(Order.DELIVERED, timezone.now())
+        OrderStatusTransition.objects.create(order=self.old_delivered, from_status=Order.SHIPPED,
+                                             to_status=Order.DELIVERED)
+        self.client.force_authenticate(user=self.user)
+
+    def create_order(self, order_status, order_date):
+        order = Order.objects.create(user=self.user, status=order_status)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=self.product.price)
+        Order.objects.filter(pk=order.pk).update(order_date=order_date)
+        return order
+
+    def test_archive_moves_only_old_final_orders(self):
+        call_command('archive_orders', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(list(ArchivedOrder.objects.values_list('id', flat=True)), [self.old_delivered.id])
+        self.assertEqual(ArchivedOrder.objects.get().items.get().product_title, 'Product 1')
+        self.assertFalse(Order.objects.filter(pk=self.old_delivered.pk).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id=self.old_delivered.pk).exists())
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertTrue(OrderStatusTransition.objects.filter(order_id=self.old_delivered.pk).exists())
+
+    def test_list_includes_archive_on_request(self):
+        call_command('archive_orders', stdout=StringIO())
+        url = reverse('order-list')
+
+        response = self.client.get(url)
+        self.assertEqual([order['id'] for order in response.data['results']], [self.recent.id, self.old_paid.id])
+
+        response = self.client.get(url, {'include_archived': 1, 'page_size': 2})
+        self.assertEqual([order['id'] for order in response.data['results']], [self.recent.id, self.old_paid.id])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([order['id'] for order in response.data['results']], [self.old_delivered.id])
+        self.assertTrue(response.data['results'][0]['archived'])
+        self.assertEqual(response.data['results'][0]['total_price'], Decimal('20.00'))
+        self.assertIsNone(response.data['next'])
+
+    def test_detail_falls_back_to_archive(self):
+        call_command('archive_orders', stdout=StringIO())
+        url = reverse('order-detail', kwargs={'pk': self.old_delivered.id})
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(url, {'include_archived': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items'][0]['quantity'], 2)
+
+
+class AsyncOrderViewsTestCase(APITestCase):
+    """
+    Test case for the async order history views, against the output of the regular views.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass')
+        self.product = Product.objects.create(title='Product 1', price=10.00)
+        self.address = Address.objects.create(user=self.user, address_line='123 Main St', city='Anytown',
+                                              state='CA', zip_code='12345', country='USA')
+        self.orders = []
+        for day in range(1, 6):
+            order = Order.objects.create(user=self.user, address=self.address,
+                                         status=Order.DELIVERED if day % 2 else Order.PENDING)
+            OrderItem.objects.create(order=order, product=self.product, quantity=day, price=self.product.price)
+            Order.objects.filter(pk=order.pk).update(order_date=datetime(2020, 1, day, 12, tzinfo=dt_timezone.utc))
+            self.orders.append(order)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_list_matches_regular_view(self):
+        # user state (cached afterwards), orders with their addresses, items
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('async-order-list'), {'status': Order.DELIVERED})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = self.client.get(reverse('order-list'), {'status': Order.DELIVERED}).json()
+        self.assertEqual(response.json()['results'], expected['results'])
+
+    def test_pages_and_archive(self):
+        call_command('archive_orders', stdout=StringIO())
+        url = reverse('async-order-list')
+        self.assertEqual([order['id'] for order in self.client.get(url).json()['results']],
+                         [self.orders[3].id, self.orders[1].id])
+
+        response = self.client.get(url, {'include_archived': 1, 'page_size': 2}).json()
+        seen = [order['id'] for order in response['results']]
+        while response['next']:
+            response = self.client.get(response['next']).json()
+            seen.extend(order['id'] for order in response['results'])
+        self.assertEqual(seen, [order.id for order in reversed(self.orders)])
+
+        response = self.client.get(reverse('async-order-detail', args=[self.orders[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('async-order-detail', args=[self.orders[0].id]), {'include_archived': 1})
+        self.assertTrue(response.json()['archived'])
+        self.assertEqual(response.json()['items'][0]['quantity'], 1)
+
+    def test_detail_matches_regular_view(self):
+        url_args = [self.orders[1].id]
+        response = self.client.get(reverse('async-order-detail', args=url_args))
+        self.assertEqual(response.json(), self.client.get(reverse('order-detail', args=url_args)).json())
+
+    def test_requires_authentication_and_ownership(self):
+        other_user = User.objects.create_user(username='other', email='other@example.com', password='testpass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(other_user)}')
+        response = self.client.get(reverse('async-order-detail', args=[self.orders[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('async-order-list')).json()['results'], [])
+
+        self.client.credentials()
+        response = self.client.get(reverse('async-order-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(reverse('async-order-list'), {'date_from': 'yesterday'},
+                                   HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(USER_SHARDING_ENABLED=True, USER_SHARDS=['shard0', 'shard1'])
+class UserShardingTestCase(APITestCase):
+    """
+    Test case for storing each user's addresses, cart and orders in the user's shard.
+    """
+    databases = {'default', 'shard0', 'shard1'}
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(title='Product 1', price=10.00)
+        self.users = {}
+        while len(self.users) < 2:
+            index = User.objects.count()
+            user = User.objects.create_user(username=f'user{index}', email=f'user{index}@example.com',
+                                            password='testpass')
+            self.users.setdefault(get_user_shard(user.id), user)
+        self.user = self.users['shard1']
+
+    def tearDown(self):
+        cache.clear()
+
+    def fill_cart(self, user):
+        # Related managers pass the user to the router; plain managers need for_user()
+        address = user.addresses.create(address_line='123 Main St', city='Anytown', state='CA', zip_code='12345',
+                                        country='USA')
+        user.cartitem_set.create(product=self.product, quantity=2)
+        return address
+
+    def test_jump_hash_moves_keys_only_to_new_bucket(self):
+        moved = 0
+        for key in range(2000):
+            before, after = jump_hash(key, 5), jump_hash(key, 6)
+            self.assertIn(after, (before, 5))
+            moved += before != after
+        self.assertTrue(200 < moved < 470)
+        self.assertEqual(jump_hash(12345, 5), jump_hash(12345, 5))
+
+    def test_checkout_writes_to_user_shard(self):
+        address = self.fill_cart(self.user)
+        self.assertEqual(address._state.db, 'shard1')
+        self.assertFalse(Address.objects.using('default').exists())
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('cart-checkout'), data={'address_id': address.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        order = Order.objects.using('shard1').get()
+        self.assertGreaterEqual(order.id, 2 * SHARD_ID_SPACE)
+        self.assertEqual(order.items.get().product_title, 'Product 1')
+        self.assertFalse(Order.objects.using('default').exists())
+        self.assertFalse(CartItem.objects.using('shard1').exists())
+        self.assertEqual(DailySales.objects.get().order_count, 1)
+
+        response = self.client.get(reverse('order-list'))
+        self.assertEqual([row['id'] for row in response.data['results']], [order.id])
+        response = self.client.get(reverse('order-detail', kwargs={'pk': order.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cart_insert_only_opens_a_transaction_on_user_shard(self):
+        self.client.force_authenticate(user=self.user)
+        with mock.patch('django.db.transaction.atomic', wraps=transaction.atomic) as atomic:
+            response = self.client.post(reverse('cartitem-list'), data={'product': self.product.id, 'quantity': 1})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([call.kwargs.get('using') for call in atomic.call_args_list], ['shard1'])
+        self.assertTrue(CartItem.objects.using('shard1').exists())
+
+    def test_worker_places_order_in_user_shard(self):
+        address = self.fill_cart(self.user)
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse('cart-checkout'), data={'address_id': address.id}, HTTP_PREFER='respond-async')
+        call_command('run_workers', processes=1, once=True, stdout=StringIO())
+
+        job = CheckoutJob.objects.get()
+        self.assertEqual(job.status, CheckoutJob.SUCCEEDED)
+        self.assertEqual(Order.objects.using('shard1').get().id, job.order_id)
+
+    def test_transitions_span_shards(self):
+        with ExitStack() as stack:
+            orders = []
+            for user in self.users.values():
+                stack.enter_context(for_user(user.id))
+                orders.append(Order.objects.create(user=user))
+        self.assertEqual({order._state.db for order in orders}, {'shard0', 'shard1'})
+
+        moved = transition_orders({order.id: Order.PAID for order in orders})
+        self.assertEqual(sorted(moved[(Order.PENDING, Order.PAID)]), sorted(order.id for order in orders))
+        for order in orders:
+            self.assertEqual(Order.objects.using(order._state.db).get(pk=order.pk).status, Order.PAID)
+        self.assertEqual(OrderStatusTransition.objects.count(), 2)
+
+    def test_item_saves_and_backfill_update_orders_in_user_shard(self):
+        order = Order.objects.using('shard1').create(user=self.user)
+        OrderItem.objects.using('shard1').create(order=order, product=self.product, product_title='Product 1',
+                                                 quantity=2, price=10)
+        self.assertEqual(Order.objects.using('shard1').get().item_count, 2)
+
+        OrderItem.objects.using('shard1').update(product_title='')
+        Order.objects.using('shard1').update(total_amount=0, item_count=0)
+        call_command('backfill_order_totals', batch_size=1, stdout=StringIO())
+
+        order = Order.objects.using('shard1').get()
+        self.assertEqual((order.total_amount, order.item_count), (Decimal('20.00'), 2))
+        self.assertEqual(order.items.get().product_title, 'Product 1')
+
+    def test_reshard_moves_rows_into_user_shard(self):
+        address = Address.objects.using('default').create(user=self.user, address_line='1 Old Rd', city='A',
+                                                          state='CA', zip_code='1', country='USA')
+        order = Order.objects.using('default').create(user=self.user, address=address, status=Order.PAID)
+        OrderItem.objects.using('default').create(order=order, product=self.product, quantity=1, price=10)
+        Order.objects.using('default').filter(pk=order.pk).update(
+            order_date=datetime(2020, 1, 1, tzinfo=dt_timezone.utc))
+
+        out = StringIO()
+        call_command('reshard_users', stdout=out)
+        self.assertIn('Moved 3 rows of 1 users.', out.getvalue())
+
+        self.assertFalse(Order.objects.using('default').exists())
+        self.assertFalse(OrderItem.objects.using('default').exists())
+        moved = Order.objects.using('shard1').get()
+        self.assertEqual((moved.id, moved.address_id), (order.id, address.id))
+        self.assertEqual(moved.order_date, datetime(2020, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(moved.items.get().quantity, 1)
+
+        out = StringIO()
+        call_command('reshard_users', stdout=out)
+        self.assertIn('Moved 0 rows of 0 users.', out.getvalue())
+
+
+class SQLiteBackendTestCase(TestCase):
+    """
+    Test case for the SQLite backend options, on a file database as in production.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+        connection = connections.create_connection('default')
+        connection.settings_dict = {**connection.settings_dict, 'NAME': self.path}
+        connections['sqlite-file'] = connection
+        self.addCleanup(connections.__delitem__, 'sqlite-file')
+        self.addCleanup(connection.close)
+        self.connection = connection
+
+    def test_new_connections_run_the_init_command(self):
+        with self.connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0],
+                             self.connection.settings_dict['OPTIONS']['timeout'] * 1000)
+
+    def test_transactions_take_the_write_lock_when_they_start(self):
+        with CaptureQueriesContext(self.connection) as queries, transaction.atomic(using='sqlite-file'):
+            other = sqlite3.connect(self.path, timeout=0)
+            try:
+                with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+                    other.execute('BEGIN IMMEDIATE')
+            finally:
+                other.close()
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+@override_settings(DB_WRITE_RETRIES=3, DB_WRITE_RETRY_BACKOFF=0.1, DB_WRITE_RETRY_MAX_BACKOFF=0.3)
+class RetryWriteTransactionTestCase(TransactionTestCase):
+    """
+    Test case for the retries of write transactions that find the database locked.
+
+    Transactional, as transactions are only retried outside of an outer one.
+    """
+
+    def setUp(self):
+        # The longest backoff of each retry, instead of a random one
+        uniform = mock.patch('Shop.transactions.random.uniform', side_effect=lambda low, high: high)
+        uniform.start()
+        self.addCleanup(uniform.stop)
+        sleep = mock.patch('Shop.transactions.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+        self.calls = 0
+
+    def write(self, *outcomes):
+        """
+        Return a write transaction raising or returning the next of ``outcomes`` on each call, the last one after.
+        """
+        @retry_write_transaction(using='default')
+        def write():
+            outcome = outcomes[min(self.calls, len(outcomes) - 1)]
+            self.calls += 1
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return write
+
+    def test_lock_errors_are_recognized(self):
+        self.assertTrue(is_lock_error(OperationalError('database is locked')))
+        self.assertTrue(is_lock_error(OperationalError('database table is locked: Order_order')))
+        self.assertFalse(is_lock_error(OperationalError('no such table: Order_order')))
+        self.assertFalse(is_lock_error(ValueError('database is locked')))
+
+    def test_locked_writes_are_retried_with_backoff(self):
+        write = self.write(OperationalError('database is locked'), OperationalError('database is locked'), 'written')
+        self.assertEqual(write(), 'written')
+        self.assertEqual(self.calls, 3)
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [0.1, 0.2])
+
+    def test_retries_give_up_after_the_limit(self):
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            self.write(OperationalError('database is locked'))()
+        self.assertEqual(self.calls, 4)
+        # Capped at DB_WRITE_RETRY_MAX_BACKOFF
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [0.1, 0.2, 0.3])
+
+    def test_other_errors_are_not_retried(self):
+        with self.assertRaises(OperationalError):
+            self.write(OperationalError('no such table: Order_order'))()
+        self.assertEqual(self.calls, 1)
+        self.sleep.assert_not_called()
+
+    def test_inner_transactions_are_not_retried(self):
+        with self.assertRaises(OperationalError), transaction.atomic():
+            self.write(OperationalError('database is locked'))()
+        self.assertEqual(self.calls, 1)
@@ -1,7 +1,24 @@
 from django.urls import path
-from .views import OrderListView, OrderDetailView
+from .views import (
+    OrderListView,
+    OrderDetailView,
+    AsyncOrderListView,
+    AsyncOrderDetailView,
+    CheckoutJobDetailView,
+    SalesRevenueView,
+    TopProductsView,
+    CategorySalesView,
+    BulkStatusTransitionView
+)
 
 urlpatterns = [
     path('', OrderListView.as_view(), name='order-list'),
     path('<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
+    path('async/', AsyncOrderListView.as_view(), name='async-order-list'),
+    path('async/<int:pk>/', AsyncOrderDetailView.as_view(), name='async-order-detail'),
+    path('checkout-jobs/<int:pk>/', CheckoutJobDetailView.as_view(), name='checkout-job-detail'),
+    path('status-transitions/', BulkStatusTransitionView.as_view(), name='order-status-transitions'),
+    path('analytics/revenue/', SalesRevenueView.as_view(), name='sales-revenue'),
+    path('analytics/top-products/', TopProductsView.as_view(), name='sales-top-products'),
+    path('analytics/categories/', CategorySalesView.as_view(), name='sales-categories'),
 ]
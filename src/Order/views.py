@@ -1,26 +1,320 @@
-from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
-from .models import Order
-from .serializers import OrderSerializer
+from datetime import datetime, timedelta
 
+from django.db.models import Max, Sum
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import generics, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from Shop.authentication import TokenUserJWTAuthentication
+from Shop.views import AsyncAPIView
+from .models import Order, ArchivedOrder, CheckoutJob, DailySales, DailyProductSales, DailyCategorySales
+from .pagination import OrderCursorPagination
+from .serializers import (
+    OrderSerializer,
+    ArchivedOrderSerializer,
+    CheckoutJobSerializer,
+    DailySalesSerializer,
+    ProductSalesSerializer,
+    CategorySalesSerializer,
+    BulkStatusTransitionSerializer
+)
+from .services import transition_orders, TransitionError, ConcurrentTransitionError
 
-class OrderListView(generics.ListAPIView):
+
+class UserOrderQuerysetMixin:
     """
-    A view for listing all orders of the authenticated user.
+    Restricts orders to the authenticated user and loads everything the order serializer reads.
+
+    Totals and item titles are stored on the order tables, so the address is joined and
+    the items are prefetched without touching the catalog. Serializing any number of
+    orders takes a fixed number of queries.
+
+    Only the user id is needed, so the user is taken from the token without a query.
+    """
+    authentication_classes = [TokenUserJWTAuthentication]
+
+    def get_queryset(self):
+        return (
+            Order.objects.filter(user_id=self.request.user.id)
+            .select_related('address')
+            .prefetch_related('items')
+        )
+
+    def get_archived_queryset(self):
+        return (
+            ArchivedOrder.objects.filter(user_id=self.request.user.id)
+            # The address may be in the user's shard, away from the archive
+            .prefetch_related('address', 'items')
+        )
+
+    def include_archived(self):
+        return self.request.query_params.get('include_archived') in ('1', 'true')
+
+    @staticmethod
+    def serialize_orders(orders):
+        """
+        Serialize a mix of live and archived orders, each with its own serializer.
+
+        One serializer per class is reused for all the orders, as building one
+        copies all of its fields.
+        """
+        serializers = {Order: OrderSerializer(), ArchivedOrder: ArchivedOrderSerializer()}
+        return [serializers[type(order)].to_representation(order) for order in orders]
+
+
+class OrderFilterMixin:
+    """
+    Applies the order history's ``status`` and ``date_from``/``date_to`` query parameters.
+    """
+
+    def filter_orders(self, queryset):
+        """
+        Apply the status and date range query parameters to a live or archived order queryset.
+        """
+        params = self.request.query_params
+
+        order_status = params.get('status')
+        if order_status:
+            queryset = queryset.filter(status=order_status)
+
+        date_from = params.get('date_from')
+        if date_from:
+            queryset = queryset.filter(order_date__gte=self.parse_date_param('date_from', date_from))
+
+        date_to = params.get('date_to')
+        if date_to:
+            end = self.parse_date_param('date_to', date_to)
+            if self.is_bare_date(date_to):
+                queryset = queryset.filter(order_date__lt=end + timedelta(days=1))
+            else:
+                queryset = queryset.filter(order_date__lte=end)
+        return queryset
+
+    @staticmethod
+    def is_bare_date(value):
+        try:
+            return parse_date(value) is not None
+        except ValueError:
+            return False
+
+    @classmethod
+    def parse_date_param(cls, name, value):
+        """
+        Parse an ISO date or datetime query parameter into an aware datetime.
+
+        :raise ValidationError: If the value is not a valid date or datetime.
+        """
+        try:
+            if cls.is_bare_date(value):
+                day = parse_date(value)
+                parsed = datetime(day.year, day.month, day.day)
+            else:
+                parsed = parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Enter a valid ISO date or datetime.'})
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+
+class OrderListView(UserOrderQuerysetMixin, OrderFilterMixin, generics.ListAPIView):
+    """
+    A view for listing all orders of the authenticated user, newest first.
+
+    Supports ``?status=`` and ``?date_from=``/``?date_to=`` filters, given as ISO
+    dates or datetimes; a bare ``date_to`` includes the whole day. With
+    ``?include_archived=1`` archived orders are merged into the history.
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination
+    read_replica = True
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return self.filter_orders(super().get_queryset())
+
+    def list(self, request, *args, **kwargs):
+        if not self.include_archived():
+            return super().list(request, *args, **kwargs)
 
+        page = self.paginator.paginate_querysets(
+            [self.get_queryset(), self.filter_orders(self.get_archived_queryset())], request, view=self
+        )
+        return self.paginator.get_paginated_response(self.serialize_orders(page))
 
-class OrderDetailView(generics.RetrieveAPIView):
+
+class OrderDetailView(UserOrderQuerysetMixin, generics.RetrieveAPIView):
     """
     A view for retrieving details of a specific order.
+
+    With ``?include_archived=1`` an order missing from the live tables is looked up in the archive.
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    read_replica = True
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not self.include_archived():
+                raise
+        order = get_object_or_404(self.get_archived_queryset(), pk=kwargs['pk'])
+        return Response(ArchivedOrderSerializer(order).data)
+
+
+class AsyncOrderListView(UserOrderQuerysetMixin, OrderFilterMixin, AsyncAPIView):
+    """
+    An async variant of OrderListView, for ASGI deployments.
+
+    Orders are read with the async ORM and serialized in a worker thread. Takes
+    the same filters; pages have forward links only.
+    """
+    authentication_required = True
+    read_replica = True
+
+    async def get(self, request):
+        querysets = [self.filter_orders(self.get_queryset())]
+        if self.include_archived():
+            querysets.append(self.filter_orders(self.get_archived_queryset()))
+        paginator = OrderCursorPagination()
+        page = await paginator.apaginate_querysets(querysets, request)
+        return await self.render(lambda: paginator.get_paginated_data(self.serialize_orders(page)))
+
+
+class AsyncOrderDetailView(UserOrderQuerysetMixin, AsyncAPIView):
+    """
+    An async variant of OrderDetailView, for ASGI deployments.
+    """
+    authentication_required = True
+    read_replica = True
+
+    async def get(self, request, pk):
+        order = await self.get_queryset().filter(pk=pk).afirst()
+        if order is None and self.include_archived():
+            order = await self.get_archived_queryset().filter(pk=pk).afirst()
+        if order is None:
+            raise NotFound()
+        return await self.render(lambda: self.serialize_orders([order])[0])
+
+
+class CheckoutJobDetailView(generics.RetrieveAPIView):
+    """
+    A view for polling the state of an asynchronous checkout.
+    """
+    authentication_classes = [TokenUserJWTAuthentication]
+    serializer_class = CheckoutJobSerializer
+    permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return CheckoutJob.objects.filter(user_id=self.request.user.id)
+
+
+class BulkStatusTransitionView(APIView):
+    """
+    Staff-only endpoint for changing the status of many orders at once.
+
+    The request is applied all or nothing: if any order is missing or any transition is
+    not allowed by the order state machine, nothing changes and the offending orders are
+    reported.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = BulkStatusTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        targets = {
+            transition['order']: transition['status']
+            for transition in serializer.validated_data['transitions']
+        }
+
+        try:
+            groups = transition_orders(targets, changed_by=request.user)
+        except TransitionError as exc:
+            return Response({"error": str(exc), "orders": exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except ConcurrentTransitionError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            "updated": len(targets),
+            "groups": [
+                {"from": from_status, "to": to_status, "count": len(order_ids)}
+                for (from_status, to_status), order_ids in groups.items()
+            ],
+        }, status=status.HTTP_200_OK)
+
+
+class SalesRangeMixin:
+    """
+    Filters a rollup queryset by the ``?date_from=``/``?date_to=`` ISO dates, both inclusive.
+    """
+
+    def filter_dates(self, queryset):
+        for param, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                day = parse_date(value)
+            except ValueError:
+                day = None
+            if day is None:
+                raise ValidationError({param: 'Enter a valid ISO date.'})
+            queryset = queryset.filter(**{lookup: day})
+        return queryset
+
+    def get_limit(self, default=10, maximum=100):
+        try:
+            return max(1, min(int(self.request.query_params.get('limit', default)), maximum))
+        except ValueError:
+            raise ValidationError({'limit': 'Enter a whole number.'})
+
+
+class SalesRevenueView(SalesRangeMixin, APIView):
+    """
+    Staff-only daily revenue, order and unit counts, read from the daily rollups.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        queryset = self.filter_dates(DailySales.objects.order_by('date'))
+        return Response(DailySalesSerializer(queryset, many=True).data)
+
+
+class TopProductsView(SalesRangeMixin, APIView):
+    """
+    Staff-only best-selling products by revenue over a date range, read from the product rollups.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        queryset = (
+            self.filter_dates(DailyProductSales.objects.all())
+            .values('product_id')
+            .annotate(product_title=Max('product_title'), revenue=Sum('revenue'), units=Sum('units'))
+            .order_by('-revenue', 'product_id')[:self.get_limit()]
+        )
+        return Response(ProductSalesSerializer(queryset, many=True).data)
+
+
+class CategorySalesView(SalesRangeMixin, APIView):
+    """
+    Staff-only revenue per category subtree over a date range, read from the category rollups.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        queryset = (
+            self.filter_dates(DailyCategorySales.objects.all())
+            .values('category_id')
+            .annotate(category_name=Max('category_name'), revenue=Sum('revenue'), units=Sum('units'))
+            .order_by('-revenue', 'category_id')
+        )
+        return Response(CategorySalesSerializer(queryset, many=True).data)
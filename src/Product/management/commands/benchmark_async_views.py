@@ -0,0 +1,169 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Product.models import Product
+
+ENDPOINTS = {
+    # name: (sync view, async view, takes a product id)
+    'product-list': ('product-list', 'async-product-list', False),
+    'product-detail': ('product-detail', 'async-product-detail', True),
+    'order-list': ('order-list', 'async-order-list', False),
+}
+
+
+class ThreadCounter:
+    """
+    Samples the number of live threads from a background thread, keeping the peak.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='thread-counter', daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+
+class Command(BaseCommand):
+    help = ('Compare the sync catalog and order views, served with a thread per connection as by a '
+            'threaded WSGI server, with their async variants served concurrently on one event loop '
+            'through the ASGI handler. Reports throughput, latency percentiles and peak threads per '
+            'number of concurrent connections as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', default='1,8,32',
+                            help='Comma-separated numbers of concurrent connections to measure.')
+        parser.add_argument('--requests', type=int, default=10, help='Requests sent over each connection.')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                            help=f"Comma-separated endpoints, among {', '.join(ENDPOINTS)}.")
+        parser.add_argument('--prefix', default='gen', help='Username prefix of the generated shoppers.')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['connections'].split(',')]
+        except ValueError:
+            raise CommandError('--connections must be comma-separated integers.')
+        endpoints = options['endpoints'].split(',')
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}.")
+
+        user = (get_user_model().objects.filter(username__startswith=f"{options['prefix']}-")
+                .order_by('id').first())
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:200])
+        if user is None or not product_ids:
+            raise CommandError(f"Need a user named '{options['prefix']}-*' and a catalog; "
+                               f"run generate_shop_data first.")
+        authorization = f'Bearer {AccessToken.for_user(user)}'
+
+        report = {
+            'config': {'connections': levels, 'requests': options['requests'], 'page_size': options['page_size']},
+            'endpoints': {},
+        }
+        unthrottled = {scope: {'capacity': 10 ** 6, 'rate': '1000/s'} for scope in settings.THROTTLE_BUCKETS}
+        # Time the views rather than replays from the response cache
+        with override_settings(ALLOWED_HOSTS=['testserver'], THROTTLE_BUCKETS=unthrottled, RESPONSE_CACHE_TTL=0):
+            for name in endpoints:
+                sync_view, async_view, detail = ENDPOINTS[name]
+                results = report['endpoints'][name] = {'wsgi': {}, 'asgi': {}}
+                for level in levels:
+                    urls = self.urls(sync_view, detail, product_ids, level * options['requests'])
+                    results['wsgi'][level] = self.run_threads(urls, level, authorization, options)
+                    urls = self.urls(async_view, detail, product_ids, level * options['requests'])
+                    results['asgi'][level] = asyncio.run(self.run_tasks(urls, level, authorization, options))
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+        self.stdout.write(output)
+
+    @staticmethod
+    def urls(view_name, detail, product_ids, count):
+        if detail:
+            return [reverse(view_name, args=[product_ids[i % len(product_ids)]]) for i in range(count)]
+        return [reverse(view_name)] * count
+
+    def run_threads(self, urls, level, authorization, options):
+        """
+        Send the requests from ``level`` threads, each holding one connection to the sync views.
+        """
+        headers = {'Authorization': authorization}
+
+        def connection_worker(worker):
+            client = Client()
+            samples = []
+            try:
+                for url in urls[worker::level]:
+                    started = time.perf_counter()
+                    response = client.get(url, {'page_size': options['page_size']}, headers=headers)
+                    samples.append(((time.perf_counter() - started) * 1000, response.status_code == 200))
+            finally:
+                connections.close_all()
+            return samples
+
+        with ThreadCounter() as threads, ThreadPoolExecutor(max_workers=level) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(connection_worker, range(level)))
+            elapsed = time.perf_counter() - started
+        return self.stats([sample for result in results for sample in result], elapsed, threads.peak)
+
+    async def run_tasks(self, urls, level, authorization, options):
+        """
+        Send the requests from ``level`` tasks on one event loop, each holding one connection to the async views.
+        """
+        client = AsyncClient()
+        headers = {'Authorization': authorization}
+
+        async def connection_worker(worker):
+            samples = []
+            for url in urls[worker::level]:
+                started = time.perf_counter()
+                response = await client.get(url, {'page_size': options['page_size']}, headers=headers)
+                samples.append(((time.perf_counter() - started) * 1000, response.status_code == 200))
+            return samples
+
+        with ThreadCounter() as threads:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(connection_worker(worker) for worker in range(level)))
+            elapsed = time.perf_counter() - started
+        return self.stats([sample for result in results for sample in result], elapsed, threads.peak)
+
+    @staticmethod
+    def stats(samples, elapsed, peak_threads):
+        latencies = sorted(latency for latency, _ in samples)
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'requests': len(samples),
+            'errors': sum(not ok for _, ok in samples),
+            'throughput_rps': round(len(samples) / elapsed, 2),
+            'p50_ms': round(cuts[49], 2),
+            'p95_ms': round(cuts[94], 2),
+            'p99_ms': round(cuts[98], 2),
+            'peak_threads': peak_threads,
+        }
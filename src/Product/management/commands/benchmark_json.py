@@ -0,0 +1,89 @@
+import io
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from Order.models import Order
+from Order.serializers import OrderSerializer
+from Product.serializers import ProductSerializer
+from Product.views import get_product_queryset
+from Shop.parsers import ORJSONParser
+from Shop.renderers import ORJSONRenderer
+from Shop.sharding import user_data_aliases
+
+
+class Command(BaseCommand):
+    help = ("Compare DRF's JSON renderer and parser with the orjson ones on product and order list "
+            "payloads. Reports the median time per payload, the speedup and whether both renderers "
+            "produced the same bytes, as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500, help='Products in the product list payload.')
+        parser.add_argument('--orders', type=int, default=200, help='Orders in the order list payload.')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per renderer and parser.')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        payloads = {
+            'product-list': ProductSerializer(get_product_queryset().order_by('id')[:options['products']],
+                                              many=True).data,
+            'order-list': OrderSerializer(self.orders(options['orders']), many=True).data,
+        }
+        if not payloads['product-list'] or not payloads['order-list']:
+            raise CommandError('Need products and orders; run generate_shop_data first.')
+
+        report = {'config': {'repeat': options['repeat']}, 'payloads': {}}
+        for name, data in payloads.items():
+            expected = JSONRenderer().render(data)
+            render = {
+                'drf': self.time(lambda: JSONRenderer().render(data), options['repeat']),
+                'orjson': self.time(lambda: ORJSONRenderer().render(data), options['repeat']),
+            }
+            parse = {
+                'drf': self.time(lambda: JSONParser().parse(io.BytesIO(expected)), options['repeat']),
+                'orjson': self.time(lambda: ORJSONParser().parse(io.BytesIO(expected)), options['repeat']),
+            }
+            report['payloads'][name] = {
+                'items': len(data),
+                'bytes': len(expected),
+                'identical': ORJSONRenderer().render(data) == expected,
+                'render_ms': render,
+                'render_speedup': round(render['drf'] / render['orjson'], 2),
+                'parse_ms': parse,
+                'parse_speedup': round(parse['drf'] / parse['orjson'], 2),
+            }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+        self.stdout.write(output)
+
+    @staticmethod
+    def orders(count):
+        """
+        Return up to ``count`` orders with their addresses and items, gathered from every database holding orders.
+        """
+        orders = []
+        for alias in user_data_aliases():
+            orders += (Order.objects.using(alias).select_related('address').prefetch_related('items')
+                       .order_by('id')[:count - len(orders)])
+            if len(orders) >= count:
+                break
+        return orders
+
+    @staticmethod
+    def time(run, repeat):
+        """
+        Return the median duration of ``run`` over ``repeat`` runs, in milliseconds.
+        """
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            durations.append((time.perf_counter() - started) * 1000)
+        return round(statistics.median(durations), 3)
@@ -0,0 +1,217 @@
+import json
+import logging
+import multiprocessing
+import random
+import re
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.test import Client, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Product.models import Product
+
+SCENARIOS = ['browse', 'search', 'product', 'add_to_cart', 'checkout', 'orders']
+SEARCH_TERMS = ['Camera', 'Lamp', 'Desk', 'Smart', 'Brand 01', 'Wireless', 'Mug', 'Pro']
+QUERY_COUNT = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def run_session(worker, access_token, address_id, product_ids, iterations, warmup, seed):
+    """
+    Act as one shopper: browse, search, open products, fill the cart and check out, then view the orders.
+
+    :return: A list of ``(scenario, latency in ms, queries, ok)`` tuples for the measured iterations.
+    """
+    rng = random.Random(seed * 1000 + worker)
+    client = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Bearer {access_token}')
+    samples = []
+
+    def call(scenario, method, url, data=None, expected=200):
+        started = time.perf_counter()
+        if method == 'get':
+            response = client.get(url, data)
+        else:
+            response = client.post(url, data, content_type='application/json')
+        latency = (time.perf_counter() - started) * 1000
+        match = QUERY_COUNT.search(response.get('Server-Timing', ''))
+        samples.append((scenario, latency, int(match.group(1)) if match else None,
+                        response.status_code == expected))
+        return response
+
+    for iteration in range(warmup + iterations):
+        if iteration == warmup:
+            samples.clear()
+        page = call('browse', 'get', reverse('product-list'), {'page_size': 20})
+        next_url = page.json().get('next') if page.status_code == 200 else None
+        if next_url:
+            call('browse', 'get', next_url)
+        call('search', 'get', reverse('product-list'), {'search': rng.choice(SEARCH_TERMS), 'page_size': 20})
+        basket = rng.sample(product_ids, k=min(len(product_ids), rng.randint(1, 3)))
+        for product_id in basket:
+            call('product', 'get', reverse('product-detail', args=[product_id]))
+            call('add_to_cart', 'post', reverse('cartitem-list'), {'product': product_id, 'quantity': 1}, expected=201)
+        call('checkout', 'post', reverse('cart-checkout'), {'address_id': address_id}, expected=201)
+        call('orders', 'get', reverse('order-list'))
+    return samples
+
+
+def run_session_in_child(*args):
+    # Never share the parent's database connections with a child process
+    connections.close_all()
+    return run_session(*args)
+
+
+class Command(BaseCommand):
+    help = ('Drive shopping scenarios against the in-process Shop app from a thread or process pool, '
+            'report throughput, latency percentiles and queries per request as JSON, and compare them '
+            'with a baseline. Writes carts and orders for the benchmark users.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent shoppers.')
+        parser.add_argument('--pool', choices=['threads', 'processes'], default='threads')
+        parser.add_argument('--iterations', type=int, default=20, help='Measured sessions per shopper.')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured sessions per shopper.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='gen', help='Username prefix of the generated shoppers.')
+        parser.add_argument('--generate', action='store_true',
+                            help='Run generate_shop_data with its defaults first.')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--baseline', help='Compare with a JSON report written by an earlier run.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative increase of p95 latency or queries per request, '
+                                 'and drop of throughput.')
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            call_command('generate_shop_data', prefix=options['prefix'], seed=options['seed'], stdout=self.stdout)
+
+        shoppers = []
+        # Addresses are looked up per user, as they may be in the user's shard
+        users = get_user_model().objects.filter(username__startswith=f"{options['prefix']}-").order_by('id')
+        for user in users.iterator():
+            address_id = user.addresses.order_by('id').values_list('id', flat=True).first()
+            if address_id is not None:
+                shoppers.append((user, address_id))
+            if len(shoppers) == options['concurrency']:
+                break
+        if len(shoppers) < options['concurrency']:
+            raise CommandError(f"Need {options['concurrency']} users with addresses named "
+                               f"'{options['prefix']}-*'; run generate_shop_data first.")
+        product_ids = self.sample_products(options['seed'])
+        if not product_ids:
+            raise CommandError('The catalog is empty; run generate_shop_data first.')
+        for user, _ in shoppers:
+            user.cartitem_set.all().delete()
+
+        if options['verbosity'] < 2:
+            # Failures and N+1 patterns are in the report; don't log them per request
+            for name in ('django.request', 'Shop.querystats'):
+                logging.getLogger(name).setLevel(logging.CRITICAL)
+
+        unthrottled = {scope: {'capacity': 10 ** 6, 'rate': '1000/s'} for scope in settings.THROTTLE_BUCKETS}
+        with override_settings(ALLOWED_HOSTS=['testserver'], THROTTLE_BUCKETS=unthrottled,
+                               QUERY_STATS_ENABLED=True, QUERY_STATS_SAMPLE_RATE=1.0,
+                               QUERY_STATS_SERVER_TIMING=True):
+            samples, elapsed = self.run(options, shoppers, product_ids)
+
+        report = self.summarize(options, samples, elapsed)
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                report['regressions'] = self.compare(json.load(baseline_file), report, options['threshold'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+        self.stdout.write(output)
+
+        if report.get('regressions'):
+            raise CommandError(f"{len(report['regressions'])} regression(s) against the baseline.")
+
+    @staticmethod
+    def sample_products(seed, size=1000):
+        """
+        Pick the products the shoppers open, the same ones for the same seed and catalog.
+        """
+        bounds = Product.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            return []
+        candidates = random.Random(seed).sample(range(bounds['low'], bounds['high'] + 1),
+                                                k=min(2 * size, bounds['high'] - bounds['low'] + 1))
+        return list(Product.objects.filter(id__in=candidates).order_by('id').values_list('id', flat=True)[:size])
+
+    def run(self, options, shoppers, product_ids):
+        sessions = [
+            (worker, str(AccessToken.for_user(user)), address_id, product_ids, options['iterations'],
+             options['warmup'], options['seed'])
+            for worker, (user, address_id) in enumerate(shoppers)
+        ]
+        if options['pool'] == 'threads':
+            pool, target = ThreadPoolExecutor(max_workers=len(sessions)), run_session
+        else:
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=len(sessions), mp_context=multiprocessing.get_context('fork'))
+            target = run_session_in_child
+
+        started = time.perf_counter()
+        with pool:
+            results = list(pool.map(target, *zip(*sessions)))
+        return [sample for result in results for sample in result], time.perf_counter() - started
+
+    def summarize(self, options, samples, elapsed):
+        """
+        Build the report: per-scenario and overall throughput, latency percentiles and queries per request.
+        """
+        def stats(rows):
+            latencies = sorted(latency for _, latency, _, _ in rows)
+            cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            queries = [count for _, _, count, _ in rows if count is not None]
+            return {
+                'requests': len(rows),
+                'errors': sum(not ok for _, _, _, ok in rows),
+                'throughput_rps': round(len(rows) / elapsed, 2),
+                'p50_ms': round(cuts[49], 2),
+                'p95_ms': round(cuts[94], 2),
+                'p99_ms': round(cuts[98], 2),
+                'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+            }
+
+        return {
+            'config': {key: options[key] for key in ('concurrency', 'pool', 'iterations', 'warmup', 'seed')},
+            'elapsed_s': round(elapsed, 2),
+            'endpoints': {
+                scenario: stats([row for row in samples if row[0] == scenario])
+                for scenario in SCENARIOS if any(row[0] == scenario for row in samples)
+            },
+            'total': stats(samples),
+        }
+
+    @staticmethod
+    def compare(baseline, report, threshold):
+        """
+        List the endpoints whose p95 latency, throughput or queries per request got worse than the baseline allows.
+        """
+        regressions = []
+        for scenario, current in report['endpoints'].items():
+            previous = baseline.get('endpoints', {}).get(scenario)
+            if previous is None:
+                continue
+            if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+                regressions.append(f"{scenario}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+            if current['throughput_rps'] < previous['throughput_rps'] * (1 - threshold):
+                regressions.append(f"{scenario}: throughput {previous['throughput_rps']} -> "
+                                   f"{current['throughput_rps']} req/s")
+            if (current['queries_per_request'] or 0) > (previous['queries_per_request'] or 0) * (1 + threshold):
+                regressions.append(f"{scenario}: queries/request {previous['queries_per_request']} -> "
+                                   f"{current['queries_per_request']}")
+            if current['errors'] > previous['errors']:
+                regressions.append(f"{scenario}: errors {previous['errors']} -> {current['errors']}")
+        return regressions
@@ -0,0 +1,279 @@
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from Cart.models import CartItem
+from Order.models import Order, OrderItem
+from Product.models import Category, Product, AttributeType, ProductAttribute, ProductImage
+from Review.models import Review
+from Shop.sharding import sharding_enabled
+from Users.models import User, Address
+
+ADJECTIVES = ['Classic', 'Compact', 'Deluxe', 'Eco', 'Essential', 'Lightweight', 'Modern', 'Portable',
+              'Premium', 'Pro', 'Rugged', 'Smart', 'Ultra', 'Vintage', 'Wireless']
+NOUNS = ['Backpack', 'Blender', 'Camera', 'Chair', 'Desk', 'Headphones', 'Jacket', 'Kettle', 'Lamp',
+         'Monitor', 'Mug', 'Sneakers', 'Speaker', 'Tent', 'Watch']
+BRANDS = [f'Brand {i:03d}' for i in range(200)]
+CITIES = ['Amsterdam', 'Berlin', 'Lisbon', 'Madrid', 'Oslo', 'Paris', 'Prague', 'Rome', 'Vienna', 'Warsaw']
+STATUS_WEIGHTS = [
+    (Order.DELIVERED, 60), (Order.SHIPPED, 10), (Order.PAID, 10), (Order.PENDING, 8),
+    (Order.CANCELLED, 8), (Order.REFUNDED, 4),
+]
+PASSWORD = 'generated-password'
+
+
+def product_title(index):
+    return f'{ADJECTIVES[index % len(ADJECTIVES)]} {NOUNS[index // len(ADJECTIVES) % len(NOUNS)]} {index}'
+
+
+@contextmanager
+def explicit_order_dates():
+    """
+    Let ``bulk_create`` keep the given ``Order.order_date`` instead of stamping the current time.
+    """
+    field = Order._meta.get_field('order_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ('Generate a large, reproducible synthetic dataset (catalog, users, carts, orders, reviews) '
+            'for load testing.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; equal seeds give equal data.')
+        parser.add_argument('--prefix', default='gen', help='Prefix of generated usernames and emails.')
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--category-roots', type=int, default=10)
+        parser.add_argument('--category-depth', type=int, default=5, help='Levels below each root.')
+        parser.add_argument('--category-fanout', type=int, default=4, help='Children per category.')
+        parser.add_argument('--attribute-types', type=int, default=30)
+        parser.add_argument('--attributes-per-product', type=int, default=3, help='Average per product.')
+        parser.add_argument('--images-per-product', type=int, default=2, help='Average per product.')
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--orders-per-user', type=int, default=3, help='Average per user.')
+        parser.add_argument('--items-per-order', type=int, default=3, help='Average per order.')
+        parser.add_argument('--cart-fraction', type=float, default=0.3, help='Share of users with a cart.')
+        parser.add_argument('--review-fraction', type=float, default=0.2,
+                            help='Share of delivered order items that get a review.')
+        parser.add_argument('--days', type=int, default=730, help='Orders are spread over this many past days.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert.')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('The database must return primary keys from bulk inserts.')
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Users with the prefix '{options['prefix']}' already exist; pick another --prefix.")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
+        leaves = self.step('categories', self.generate_categories, options)
+        products = self.step('products', self.generate_products, options, leaves)
+        self.step('attributes and images', self.generate_product_details, options, products)
+        users = self.step('users and addresses', self.generate_users, options)
+        self.step('carts', self.generate_carts, options, users, products)
+        self.step('orders and reviews', self.generate_orders, options, users, products)
+        if sharding_enabled():
+            self.step('user shards', call_command, 'reshard_users', stdout=self.stdout)
+        self.step('sales rollups', call_command, 'rebuild_sales_rollups', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Done. Generated users log in with the password "{PASSWORD}".'))
+
+    def step(self, label, func, *args, **kwargs):
+        started = time.monotonic()
+        result = func(*args, **kwargs)
+        self.stdout.write(f'Generated {label} in {time.monotonic() - started:.1f}s.')
+        return result
+
+    def insert(self, model, objects):
+        """
+        Bulk insert ``objects`` in batches, one transaction each; their primary keys are set afterwards.
+        """
+        for start in range(0, len(objects), self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(objects[start:start + self.batch_size], batch_size=self.batch_size)
+
+    def generate_categories(self, options):
+        """
+        Insert a forest of full trees with their nested-set fields already computed.
+
+        The MPTT fields are numbered in memory by a depth-first walk, so the tree is
+        never rebuilt and no row is updated after its insert. Levels are inserted
+        top-down so that each level knows its parents' ids. Sibling names sort in
+        insertion order, matching ``order_insertion_by``.
+
+        :return: The ids of the leaf categories.
+        """
+        first_tree_id = (Category.objects.aggregate(top=Max('mptt_tree_id'))['top'] or 0) + 1
+        levels = [[] for _ in range(options['category_depth'] + 1)]
+
+        def build(node, level, counter):
+            node.lft = counter
+            counter += 1
+            if level < options['category_depth']:
+                for i in range(options['category_fanout']):
+                    child = Category(name=f'{node.name}.{i:02d}', mptt_tree_id=node.mptt_tree_id, mptt_level=level + 1)
+                    child.parent_node = node
+                    levels[level + 1].append(child)
+                    counter = build(child, level + 1, counter)
+            node.rght = counter
+            return counter + 1
+
+        for i in range(options['category_roots']):
+            root = Category(name=f'Category {i:02d}', mptt_tree_id=first_tree_id + i, mptt_level=0)
+            root.parent_node = None
+            levels[0].append(root)
+            build(root, 0, 1)
+
+        for nodes in levels:
+            for node in nodes:
+                node.parent_id = node.parent_node.pk if node.parent_node else None
+            self.insert(Category, nodes)
+        return array('q', (node.pk for node in levels[-1]))
+
+    def generate_products(self, options, leaves):
+        """
+        :return: ``(ids, prices in cents)`` of the generated products, as arrays.
+        """
+        ids, prices = array('q'), array('q')
+        for start in range(0, options['products'], self.batch_size):
+            batch = []
+            for index in range(start, min(start + self.batch_size, options['products'])):
+                cents = self.rng.randint(199, 99999)
+                prices.append(cents)
+                batch.append(Product(
+                    title=product_title(index),
+                    brand=self.rng.choice(BRANDS),
+                    description=f'Synthetic product {index} for load testing.',
+                    category_id=self.rng.choice(leaves),
+                    price=Decimal(cents).scaleb(-2),
+                ))
+            self.insert(Product, batch)
+            ids.extend(product.pk for product in batch)
+        return ids, prices
+
+    def generate_product_details(self, options, products):
+        types = [AttributeType(name=f'Attribute {i:02d}') for i in range(options['attribute_types'])]
+        self.insert(AttributeType, types)
+        # A few attribute types are on most products, the long tail on few
+        type_indexes = range(len(types))
+        cum_weights = list(accumulate(1 / (rank + 1) for rank in type_indexes))
+
+        product_ids, _ = products
+        for start in range(0, len(product_ids), self.batch_size):
+            attributes, images = [], []
+            for product_id in product_ids[start:start + self.batch_size]:
+                count = min(len(types), self.rng.randint(0, 2 * options['attributes_per_product']))
+                chosen = set(self.rng.choices(type_indexes, cum_weights=cum_weights, k=count))
+                attributes.extend(
+                    ProductAttribute(product_id=product_id, attribute_name_id=types[i].pk,
+                                     attribute_value=f'Value {self.rng.randint(1, 20)}')
+                    for i in chosen
+                )
+                images.extend(
+                    ProductImage(product_id=product_id, image_url=f'https://images.example.com/{product_id}/{n}.jpg')
+                    for n in range(self.rng.randint(0, 2 * options['images_per_product']))
+                )
+            self.insert(ProductAttribute, attributes)
+            self.insert(ProductImage, images)
+
+    def generate_users(self, options):
+        """
+        :return: A list of ``(user id, address ids)`` tuples.
+        """
+        # Hash once; hashing per user would dominate the run time
+        password = make_password(PASSWORD)
+        prefix = options['prefix']
+        users = []
+        for start in range(0, options['users'], self.batch_size):
+            batch = [
+                User(username=f'{prefix}-{n}', email=f'{prefix}-{n}@example.com', password=password)
+                for n in range(start, min(start + self.batch_size, options['users']))
+            ]
+            self.insert(User, batch)
+            addresses = [
+                Address(user_id=user.pk, address_line=f'{self.rng.randint(1, 999)} Main Street',
+                        city=self.rng.choice(CITIES), state='State', zip_code=f'{self.rng.randint(10000, 99999)}',
+                        country='Country')
+                for user in batch
+                for _ in range(self.rng.randint(1, 2))
+            ]
+            self.insert(Address, addresses)
+            by_user = {}
+            for address in addresses:
+                by_user.setdefault(address.user_id, []).append(address.pk)
+            users.extend((user.pk, by_user[user.pk]) for user in batch)
+        return users
+
+    def generate_carts(self, options, users, products):
+        product_ids, _ = products
+        items = []
+        for user_id, _ in users:
+            if self.rng.random() >= options['cart_fraction']:
+                continue
+            for product_id in set(self.rng.choices(product_ids, k=self.rng.randint(1, 5))):
+                items.append(CartItem(user_id=user_id, product_id=product_id, quantity=self.rng.randint(1, 3)))
+            if len(items) >= self.batch_size:
+                self.insert(CartItem, items)
+                items = []
+        self.insert(CartItem, items)
+
+    def generate_orders(self, options, users, products):
+        """
+        Insert orders with their totals, their items and reviews of delivered items.
+
+        Users are processed in chunks; each order's persisted totals are computed
+        from its items in memory, since ``bulk_create`` bypasses ``OrderItem.save``.
+        """
+        product_ids, prices = products
+        statuses, weights = zip(*STATUS_WEIGHTS)
+        chunk = max(1, self.batch_size // max(1, options['orders_per_user']))
+
+        with explicit_order_dates():
+            for start in range(0, len(users), chunk):
+                orders, order_lines = [], []
+                for user_id, address_ids in users[start:start + chunk]:
+                    for _ in range(self.rng.randint(0, 2 * options['orders_per_user'])):
+                        picks = set(self.rng.choices(range(len(product_ids)),
+                                                     k=self.rng.randint(1, 2 * options['items_per_order'])))
+                        lines = [(i, prices[i], self.rng.randint(1, 3)) for i in sorted(picks)]
+                        orders.append(Order(
+                            user_id=user_id,
+                            address_id=self.rng.choice(address_ids),
+                            status=self.rng.choices(statuses, weights=weights)[0],
+                            order_date=self.now - timedelta(seconds=self.rng.randint(0, options['days'] * 86400)),
+                            total_amount=Decimal(sum(cents * quantity for _, cents, quantity in lines)).scaleb(-2),
+                            item_count=sum(quantity for _, _, quantity in lines),
+                        ))
+                        order_lines.append(lines)
+                self.insert(Order, orders)
+
+                items, reviews, reviewed = [], [], set()
+                for order, lines in zip(orders, order_lines):
+                    for index, cents, quantity in lines:
+                        product_id = product_ids[index]
+                        items.append(OrderItem(order_id=order.pk, product_id=product_id, quantity=quantity,
+                                               price=Decimal(cents).scaleb(-2), product_title=product_title(index)))
+                        if (order.status == Order.DELIVERED and (order.user_id, product_id) not in reviewed
+                                and self.rng.random() < options['review_fraction']):
+                            reviewed.add((order.user_id, product_id))
+                            reviews.append(Review(user_id=order.user_id, product_id=product_id, order_id=order.pk,
+                                                  rating=Decimal(self.rng.randint(1, 5)),
+                                                  description='Synthetic review.'))
+                self.insert(OrderItem, items)
+                self.insert(Review, reviews)
@@ -0,0 +1,42 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+"""
+This module contains a stand-in for database replication, for running the read replica locally.
+"""
+
+
+def copy_database(source, target):
+    """
+    Copy a consistent snapshot of the SQLite database ``source`` over ``target`` with the online backup API.
+    """
+    with closing(sqlite3.connect(source)) as source_connection, closing(sqlite3.connect(target)) as target_connection:
+        source_connection.backup(target_connection)
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database over the read replica, once or every --interval seconds. '
+            'A stand-in for real replication; the interval is the replication lag.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep copying, pausing this many seconds in between.')
+
+    def handle(self, *args, **options):
+        alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+        if alias not in settings.DATABASES or any(connections[name].vendor != 'sqlite'
+                                                  for name in (DEFAULT_DB_ALIAS, alias)):
+            raise CommandError(f"The '{DEFAULT_DB_ALIAS}' and '{alias}' databases must both be SQLite.")
+        source, target = (str(connections[name].settings_dict['NAME']) for name in (DEFAULT_DB_ALIAS, alias))
+
+        while True:
+            started = time.monotonic()
+            copy_database(source, target)
+            self.stdout.write(f'Copied {source} to {target} in {time.monotonic() - started:.2f}s.')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
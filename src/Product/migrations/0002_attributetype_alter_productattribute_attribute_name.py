@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-19 10:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Product', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttributeType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='productattribute',
+            name='attribute_name',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Product.attributetype'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+"""
+This module contains the pagination classes for the Product API.
+"""
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Opt-in keyset pagination over the catalog, by id.
+
+    Only requests that pass ``page_size`` are paginated, so existing clients
+    keep receiving the full list. Each page is one ``id`` range scan on the
+    primary key, however deep into the catalog it is.
+    """
+    ordering = 'id'
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class AsyncProductCursorPagination(ProductCursorPagination):
+    """
+    The catalog's keyset pagination for async views, with pages read by async iteration.
+
+    Each page is read with an ``id`` greater-than comparison. Only forward links
+    are provided.
+    """
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Return the requested page of ``queryset``, or None when the request is not paginated.
+        """
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(id__gt=self.parse_position(cursor.position))
+
+        rows = [product async for product in queryset.order_by('id')[:self.page_size + 1]]
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def parse_position(self, position):
+        try:
+            return int(position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=str(self.page[-1].id)))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        }
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Shop.compression import invalidate_cached_responses
+from .models import AttributeType, Category, Product, ProductAttribute, ProductImage
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=AttributeType)
+@receiver(post_delete, sender=AttributeType)
+def invalidate_catalog_responses(sender, instance, **kwargs):
+    """
+    Expire the cached catalog responses whenever the catalog changes.
+    """
+    invalidate_cached_responses()
@@ -1,5 +1,6 @@
 from django.test import TestCase
 from .models import Product, ProductAttribute, ProductImage, Category, AttributeType
+from .views import ProductViewSet
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.urls import reverse
@@ -11,6 +12,43 @@ from .serializers import (
     ProductImageSerializer
 )
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F, Sum
+from io import BytesIO, StringIO
+from Order.models import Order, DailySales
+from Users.models import User, Address
+from django.core.cache import cache
+from Shop.authentication import local_users
+from rest_framework_simplejwt.tokens import AccessToken
+from Product.management.commands.benchmark_shop import Command as BenchmarkCommand, SCENARIOS, run_session
+from Product.management.commands.benchmark_async_views import Command as AsyncBenchmarkCommand
+from Shop.querystats import fingerprint, query_stats
+from Shop.profiling import StackSampler, make_profile_token
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import re
+import uuid
+from decimal import Decimal
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing, contextmanager
+from unittest import mock
+from django.test import override_settings
+from Shop.routers import PrimaryReplicaRouter
+from Shop.views import AsyncAPIView
+from Shop.parsers import ORJSONParser
+from Shop.renderers import ORJSONRenderer
+from Shop.throttling import IPTokenBucketThrottle
+from Shop.compression import invalidate_cached_responses, negotiate_encoding
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from Product.management.commands.replicate_db import copy_database
 
 """
 This module contains test cases for the Product, ProductAttribute, ProductImage, Category, and AttributeType models,
@@ -430,3 +468,649 @@ class ProductSerializerTestCase(TestCase):
         self.assertEqual(serializer.data['image_url'], 'http://example.com/image.jpg')
         # Since 'product' is not directly serialized, access it via the instance
         self.assertEqual(serializer.instance.product.id, self.product.id)
+
+
+@override_settings(QUERY_STATS_SAMPLE_RATE=1.0)
+class QueryStatsMiddlewareTest(TestCase):
+    """
+    Test case for the query instrumentation middleware, using the catalog endpoints.
+    """
+
+    def setUp(self):
+        query_stats.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Category')
+        for i in range(6):
+            Product.objects.create(title=f'Product {i}', brand='Brand', description='Description',
+                                   category=self.category, price=10)
+
+    def test_server_timing_and_view_totals(self):
+        # Without the prefetches, each product's attributes and images are read one product at a time
+        with (self.assertLogs('Shop.querystats', 'WARNING') as logs,
+              mock.patch.object(ProductViewSet, 'get_queryset', lambda view: Product.objects.all())):
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        server_timing = response['Server-Timing']
+        self.assertRegex(server_timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('db-n1;desc="6x ', server_timing)
+        self.assertIn('product-list', logs.output[0])
+
+        stats = query_stats.snapshot()['product-list']
+        self.assertEqual(stats['requests'], 1)
+        self.assertGreater(stats['queries'], 6)
+        self.assertEqual(stats['n_plus_one'], 1)
+        self.assertTrue(all(count == 5 for count in stats['duplicates'].values()))
+
+    def test_product_list_runs_no_n_plus_one(self):
+        with self.assertNoLogs('Shop.querystats', 'WARNING'):
+            response = self.client.get(reverse('product-list'))
+        self.assertRegex(response['Server-Timing'], r'desc="3 queries"')
+        self.assertNotIn('db-n1', response['Server-Timing'])
+
+    async def test_queries_run_in_other_threads_are_counted(self):
+        for url in (reverse('async-product-list'), reverse('product-list')):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            count = int(re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+            self.assertGreater(count, 0)
+
+    async def test_concurrent_requests_are_counted_separately(self):
+        url = reverse('product-detail', args=[await Product.objects.values_list('id', flat=True).afirst()])
+        responses = await asyncio.gather(*(self.async_client.get(url) for _ in range(4)))
+        self.assertEqual(len({response['Server-Timing'].split(';desc=')[1] for response in responses}), 1)
+
+    def test_unsampled_requests_are_not_instrumented(self):
+        with self.settings(QUERY_STATS_SAMPLE_RATE=0):
+            response = self.client.get(reverse('product-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(query_stats.snapshot(), {})
+
+    def test_fingerprint_ignores_parameters(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) LIMIT 21'),
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s) LIMIT 5'),
+        )
+        self.assertEqual(fingerprint("UPDATE t SET name = 'a' WHERE id = 1"),
+                         fingerprint("UPDATE t SET name = 'b' WHERE id = 2"))
+
+
+class ProfilingMiddlewareTest(TestCase):
+    """
+    Test case for the sampling profiler middleware and the staff profiling endpoints.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.profile_dir = directory.name
+        settings = self.settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0, PROFILING_DIR=self.profile_dir,
+                                 PROFILING_INTERVAL=0.001)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        Product.objects.create(title='Product', brand='Brand', description='Description',
+                               category=Category.objects.create(name='Category'), price=10)
+
+    def profiles(self):
+        return sorted(os.listdir(self.profile_dir))
+
+    def test_sampled_request_writes_tagged_profile(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1.0):
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile-Id', response)
+
+        [name] = self.profiles()
+        self.assertRegex(name, r'^\d+-product-list-\d+ms\.json$')
+        with open(os.path.join(self.profile_dir, name)) as profile_file:
+            profile = json.load(profile_file)
+        self.assertEqual(profile['view'], 'product-list')
+        self.assertEqual(profile['path'], reverse('product-list'))
+
+    def test_requests_are_not_profiled_unless_sampled_or_enabled(self):
+        self.client.get(reverse('product-list'), HTTP_X_PROFILE='forged')
+        with self.settings(PROFILING_ENABLED=False, PROFILING_SAMPLE_RATE=1.0):
+            self.client.get(reverse('product-list'))
+        self.assertEqual(self.profiles(), [])
+
+    def test_signed_header_forces_a_profile(self):
+        self.client.force_authenticate(self.staff)
+        token = self.client.post(reverse('profiling-token')).data['token']
+        self.client.force_authenticate(None)
+
+        response = self.client.get(reverse('product-list'), HTTP_X_PROFILE=token)
+        self.assertEqual(self.profiles(), [response['X-Profile-Id']])
+
+    def test_old_profiles_are_rotated_out(self):
+        token = make_profile_token(self.staff)
+        with self.settings(PROFILING_MAX_FILES=2):
+            names = [self.client.get(reverse('product-list'), HTTP_X_PROFILE=token)['X-Profile-Id']
+                     for _ in range(3)]
+        self.assertEqual(self.profiles(), names[1:])
+
+    def test_sampler_records_the_stack_of_its_thread(self):
+        stop = threading.Event()
+
+        def busy_loop():
+            while not stop.is_set():
+                sum(range(1000))
+
+        thread = threading.Thread(target=busy_loop)
+        thread.start()
+        sampler = StackSampler(thread.ident, 0.001)
+        sampler.start()
+        time.sleep(0.05)
+        sampler.stop()
+        stop.set()
+        thread.join()
+
+        self.assertGreater(sum(sampler.stacks.values()), 0)
+        self.assertTrue(all('(busy_loop)' in stack for stack in sampler.stacks))
+
+    def test_report_aggregates_hottest_frames_per_view(self):
+        for index, (view, stacks) in enumerate([
+            ('product-list', {'a;b;c': 6, 'a;b': 2}),
+            ('product-list', {'a;c': 2}),
+            ('order-list', {'x': 1}),
+        ]):
+            with open(os.path.join(self.profile_dir, f'{index}-{view}-10ms.json'), 'w') as profile_file:
+                json.dump({'view': view, 'method': 'GET', 'path': '/', 'latency_ms': 10.0 * (index + 1),
+                           'interval_ms': 5.0, 'stacks': stacks}, profile_file)
+
+        response = self.client.get(reverse('profiling-report'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('profiling-report'), {'view': 'product-list', 'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data), ['product-list'])
+        report = response.data['product-list']
+        self.assertEqual((report['profiles'], report['samples'], report['max_latency_ms']), (2, 10, 20.0))
+        self.assertEqual(report['self'][0], {'frame': 'c', 'samples': 8, 'percent': 80.0})
+        self.assertEqual(report['total'][0], {'frame': 'a', 'samples': 10, 'percent': 100.0})
+        self.assertEqual(len(report['total']), 2)
+
+
+class GenerateShopDataCommandTest(TestCase):
+    """
+    Test case for the generate_shop_data management command.
+    """
+
+    def generate(self, prefix):
+        call_command('generate_shop_data', prefix=prefix, seed=7, products=200, users=20, category_roots=2,
+                     category_depth=3, category_fanout=2, batch_size=50, stdout=StringIO())
+
+    def test_generates_consistent_data(self):
+        self.generate('a')
+
+        self.assertEqual(Product.objects.count(), 200)
+        self.assertEqual(Category.objects.count(), 2 * (1 + 2 + 4 + 8))
+        self.assertEqual(User.objects.count(), 20)
+        self.assertTrue(Order.objects.exists())
+        self.assertTrue(ProductAttribute.objects.exists())
+
+        tree = list(Category.objects.order_by('id').values_list('lft', 'rght', 'mptt_level', 'mptt_tree_id'))
+        Category.objects.rebuild()
+        self.assertEqual(tree, list(Category.objects.order_by('id').values_list(
+            'lft', 'rght', 'mptt_level', 'mptt_tree_id')))
+
+        totals = Order.objects.annotate(items_total=Sum(F('items__price') * F('items__quantity')))
+        self.assertTrue(all(order.total_amount == order.items_total for order in totals))
+        self.assertEqual(sum(DailySales.objects.values_list('order_count', flat=True)), Order.objects.count())
+
+    def test_same_seed_gives_same_data(self):
+        self.generate('a')
+        self.generate('b')
+        products = list(Product.objects.order_by('id').values_list('title', 'brand', 'price'))
+        self.assertEqual(products[:200], products[200:])
+
+
+class BenchmarkShopCommandTest(TestCase):
+    """
+    Test case for the benchmark_shop management command.
+    """
+
+    def report(self, p95_ms, throughput_rps, queries_per_request, errors=0):
+        return {'endpoints': {'browse': {'p95_ms': p95_ms, 'throughput_rps': throughput_rps,
+                                         'queries_per_request': queries_per_request, 'errors': errors}}}
+
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+
+    def test_session_runs_every_scenario(self):
+        call_command('generate_shop_data', prefix='bench', products=50, users=2, category_roots=1,
+                     category_depth=2, category_fanout=2, stdout=StringIO())
+        address = Address.objects.filter(user__username='bench-0').first()
+        token = str(AccessToken.for_user(address.user))
+        product_ids = list(Product.objects.values_list('id', flat=True))
+
+        with self.settings(ALLOWED_HOSTS=['testserver'], QUERY_STATS_SAMPLE_RATE=1.0):
+            samples = run_session(0, token, address.id, product_ids, iterations=2, warmup=1, seed=1)
+
+        self.assertEqual({scenario for scenario, _, _, _ in samples}, set(SCENARIOS))
+        self.assertTrue(all(ok for _, _, _, ok in samples))
+        # Catalog responses are served from the response cache after the warmup, without queries
+        self.assertTrue(all(queries for scenario, _, queries, _ in samples
+                            if scenario in ('add_to_cart', 'checkout', 'orders')))
+
+    def test_compare_flags_regressions(self):
+        baseline = self.report(p95_ms=10, throughput_rps=100, queries_per_request=5)
+        self.assertEqual(BenchmarkCommand.compare(baseline, self.report(11, 90, 5), threshold=0.2), [])
+
+        regressions = BenchmarkCommand.compare(baseline, self.report(13, 70, 7, errors=1), threshold=0.2)
+        self.assertEqual(len(regressions), 4)
+
+
+class BenchmarkAsyncViewsCommandTest(TestCase):
+    """
+    Test case for the benchmark_async_views management command.
+    """
+
+    def test_stats(self):
+        stats = AsyncBenchmarkCommand.stats([(10.0, True), (20.0, True), (30.0, False)], elapsed=0.5, peak_threads=4)
+        self.assertEqual((stats['requests'], stats['errors'], stats['throughput_rps']), (3, 1, 6.0))
+        self.assertEqual(stats['p50_ms'], 20.0)
+        self.assertEqual(stats['peak_threads'], 4)
+
+    def test_rejects_bad_arguments(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown endpoint(s): nope.'):
+            call_command('benchmark_async_views', endpoints='product-list,nope', stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, 'run generate_shop_data first'):
+            call_command('benchmark_async_views', stdout=StringIO())
+
+
+class ORJSONRendererTest(TestCase):
+    """
+    Test case for the orjson renderer and parser used by the API.
+    """
+
+    def test_same_bytes_as_drf(self):
+        data = {
+            'text': 'caf\u00e9 \u2028 \u2029 "quoted"',
+            'numbers': [1, -2, 0.1, 19.99, 2 ** 60, True, None],
+            'price': Decimal('1234.50'),
+            'created': datetime.datetime(2024, 5, 17, 8, 30, 1, 123456, tzinfo=datetime.timezone.utc),
+            'naive': datetime.datetime(2024, 5, 17, 8, 30),
+            'day': datetime.date(2024, 5, 17),
+            'time': datetime.time(8, 30, 1, 500),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'nested': {1: ('a', 'b'), 'empty': {}},
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_same_bytes_as_drf_for_product_list(self):
+        call_command('generate_shop_data', prefix='json', products=5, users=3, category_roots=1,
+                     category_depth=2, category_fanout=2, stdout=StringIO())
+        for url in (reverse('product-list'), reverse('category-list')):
+            response = self.client.get(url)
+            self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_indented_output_falls_back(self):
+        data = {'a': [1, 2]}
+        self.assertEqual(ORJSONRenderer().render(data, 'application/json; indent=4'),
+                         JSONRenderer().render(data, 'application/json; indent=4'))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_parser(self):
+        self.assertEqual(ORJSONParser().parse(BytesIO(b'{"quantity": 2, "note": "caf\xc3\xa9"}')),
+                         {'quantity': 2, 'note': 'caf\u00e9'})
+        with self.assertRaisesMessage(ParseError, 'JSON parse error'):
+            ORJSONParser().parse(BytesIO(b'{"quantity": NaN}'))
+
+    def test_api_parses_json_bodies(self):
+        user = get_user_model().objects.create_user(username='admin', password='pw', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        response = self.client.post(reverse('attributetype-list'), '{"name": "Colour"}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse('attributetype-list'), '{"name": ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BenchmarkJSONCommandTest(TestCase):
+    """
+    Test case for the benchmark_json management command.
+    """
+
+    def test_report(self):
+        call_command('generate_shop_data', prefix='json', products=20, users=3, category_roots=1,
+                     category_depth=2, category_fanout=2, stdout=StringIO())
+        out = StringIO()
+        call_command('benchmark_json', products=10, orders=5, repeat=2, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['payloads']), {'product-list', 'order-list'})
+        self.assertEqual(report['payloads']['product-list']['items'], 10)
+        self.assertTrue(all(payload['identical'] for payload in report['payloads'].values()))
+
+    def test_requires_data(self):
+        with self.assertRaisesMessage(CommandError, 'run generate_shop_data first'):
+            call_command('benchmark_json', stdout=StringIO())
+
+
+class CompressionMiddlewareTest(TestCase):
+    """
+    Test case for the compression of large responses and the cached catalog responses.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name='Category')
+        self.products = [
+            Product.objects.create(title=f'Product {i}', brand='Brand', description='A long description. ' * 10,
+                                   category=category, price=10)
+            for i in range(10)
+        ]
+
+    def get(self, url, encoding='gzip'):
+        return self.client.get(url, headers={'Accept-Encoding': encoding})
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'gzip')
+        self.assertEqual(negotiate_encoding('br;q=1.0, GZIP;q=0.5'), 'gzip')
+        self.assertEqual(negotiate_encoding('*'), 'gzip')
+        self.assertIsNone(negotiate_encoding('gzip;q=0'))
+        self.assertIsNone(negotiate_encoding('*;q=0, identity'))
+        self.assertIsNone(negotiate_encoding(''))
+
+    def test_large_responses_are_compressed(self):
+        plain = self.get(reverse('product-list'), encoding='identity')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.get(reverse('product-list'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.get(reverse('category-detail', args=[self.products[0].category_id]))
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotIn('Accept-Encoding', response.get('Vary', ''))
+
+    def test_catalog_responses_are_served_precompressed_from_the_cache(self):
+        url = reverse('product-list')
+        first = self.get(url)
+        with self.assertNumQueries(0), mock.patch('gzip.compress') as compress:
+            second = self.get(url)
+            plain = self.get(url, encoding='identity')
+        compress.assert_not_called()
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(second.content), plain.content)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(plain['Content-Type'], 'application/json')
+
+    @override_settings(QUERY_STATS_SAMPLE_RATE=1.0)
+    def test_cached_responses_carry_no_server_timing(self):
+        url = reverse('product-list')
+        self.assertIn('queries', self.get(url)['Server-Timing'])
+        self.assertNotIn('Server-Timing', self.get(url))
+
+    def test_catalog_changes_expire_cached_responses(self):
+        url = reverse('product-detail', args=[self.products[0].id])
+        self.get(url)
+        # Bulk updates send no signals
+        Product.objects.filter(id=self.products[0].id).update(title='Renamed')
+        self.assertEqual(json.loads(self.get(url, encoding='identity').content)['title'], 'Product 0')
+
+        invalidate_cached_responses()
+        self.assertEqual(json.loads(self.get(url, encoding='identity').content)['title'], 'Renamed')
+
+        self.products[0].title = 'Saved'
+        self.products[0].save()
+        self.assertEqual(json.loads(self.get(url, encoding='identity').content)['title'], 'Saved')
+
+    def test_responses_vary_by_query_string(self):
+        self.get(reverse('product-list'))
+        response = self.client.get(reverse('product-list'), {'search': 'Product 3'})
+        self.assertEqual([product['title'] for product in response.data], ['Product 3'])
+
+    def test_unsafe_and_failed_requests_are_not_cached(self):
+        missing = reverse('product-detail', args=[0])
+        self.assertEqual(self.get(missing).status_code, status.HTTP_404_NOT_FOUND)
+        Product.objects.filter(id=self.products[1].id).update(id=10 ** 6)
+        self.assertEqual(self.client.post(reverse('product-list'), {}).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get(reverse('product-detail', args=[10 ** 6])).status_code, status.HTTP_200_OK)
+
+    def test_catalog_is_public_and_unthrottled(self):
+        user = User.objects.create_user(username='shopper', password='password')
+        url = reverse('product-list')
+        self.get(url)
+        # Cached responses are shared by anonymous and signed-in callers
+        for credentials in ({}, {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}):
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url, **credentials).status_code, status.HTTP_200_OK)
+
+    def test_throttled_views_are_not_cached(self):
+        url = reverse('product-list')
+        with (self.settings(THROTTLE_BUCKETS={'login': {'capacity': 1, 'rate': '1/h'}}),
+              mock.patch.object(ProductViewSet, 'throttle_classes', [IPTokenBucketThrottle]),
+              mock.patch.object(ProductViewSet, 'throttle_scope', 'login', create=True)):
+            self.assertEqual(self.get(url).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.get(url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    async def test_async_catalog_responses_are_cached(self):
+        url = reverse('async-product-list')
+        first = await self.async_client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        await Product.objects.filter(title='Product 0').aupdate(title='Renamed')
+        second = await self.async_client.get(url)
+        self.assertEqual(json.loads(second.content)[0]['title'], 'Product 0')
+        self.assertEqual(gzip.decompress(first.content), second.content)
+
+
+class ProductListPaginationTest(TestCase):
+    """
+    Test case for the opt-in pagination and search of the product list.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(5):
+            Product.objects.create(title=f'Lamp {i}' if i % 2 else f'Desk {i}', brand='Brand',
+                                   description='Description', price=10)
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(len(response.data), 5)
+
+    def test_page_size_paginates(self):
+        response = self.client.get(reverse('product-list'), {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_search(self):
+        response = self.client.get(reverse('product-list'), {'search': 'lamp'})
+        self.assertEqual({product['title'] for product in response.data}, {'Lamp 1', 'Lamp 3'})
+
+
+
+class AsyncCatalogViewsTest(TestCase):
+    """
+    Test case for the async product and category views, against the output of the viewsets.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Lighting')
+        color = AttributeType.objects.create(name='Color')
+        for i in range(5):
+            product = Product.objects.create(title=f'Lamp {i}' if i % 2 else f'Desk {i}', brand='Brand',
+                                             description='Description', category=self.category, price=10)
+            ProductAttribute.objects.create(product=product, attribute_name=color, attribute_value='Red')
+            ProductImage.objects.create(product=product, image_url=f'https://example.com/{i}.png')
+
+    def test_product_list_matches_viewset(self):
+        # products, attributes with their types, images
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('async-product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), self.client.get(reverse('product-list')).json())
+
+    def test_page_size_paginates(self):
+        response = self.client.get(reverse('async-product-list'), {'page_size': 2})
+        first = response.json()
+        self.assertEqual(first['results'], self.client.get(reverse('product-list'), {'page_size': 2}).json()['results'])
+
+        ids = [product['id'] for product in first['results']]
+        response = self.client.get(first['next'])
+        ids += [product['id'] for product in response.json()['results']]
+        response = self.client.get(response.json()['next'])
+        ids += [product['id'] for product in response.json()['results']]
+        self.assertEqual(ids, list(Product.objects.order_by('id').values_list('id', flat=True)))
+        self.assertIsNone(response.json()['next'])
+
+        response = self.client.get(reverse('async-product-list'), {'page_size': 2, 'cursor': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search(self):
+        response = self.client.get(reverse('async-product-list'), {'search': 'lamp'})
+        self.assertEqual({product['title'] for product in response.json()}, {'Lamp 1', 'Lamp 3'})
+
+    def test_details(self):
+        product = Product.objects.first()
+        response = self.client.get(reverse('async-product-detail', args=[product.id]))
+        self.assertEqual(response.json(), self.client.get(reverse('product-detail', args=[product.id])).json())
+        response = self.client.get(reverse('async-category-detail', args=[self.category.id]))
+        self.assertEqual(response.json(),
+                         self.client.get(reverse('category-detail', args=[self.category.id])).json())
+
+        response = self.client.get(reverse('async-product-detail', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_category_list_matches_viewset(self):
+        response = self.client.get(reverse('async-category-list'))
+        self.assertEqual(response.json(), self.client.get(reverse('category-list')).json())
+
+    def test_serialization_runs_off_the_event_loop(self):
+        threads = []
+        encode = AsyncAPIView.encode
+
+        def record(build):
+            threads.append(threading.get_ident())
+            return encode(build)
+
+        with mock.patch.object(AsyncAPIView, 'encode', staticmethod(record)):
+            response = self.client.get(reverse('async-product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+
+@override_settings(DATABASE_REPLICA_ENABLED=True)
+class ReadReplicaRoutingTest(TestCase):
+    """
+    Test case for routing catalog reads to the read replica, and for the replication stand-in.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.product = Product.objects.create(title='Product', brand='Brand', description='Description', price=10)
+
+    @contextmanager
+    def routed_reads(self):
+        """
+        Record the router's choice for every read, while running the reads on the test database.
+        """
+        decisions = []
+        db_for_read = PrimaryReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            decisions.append(db_for_read(router, model, **hints))
+            return None
+
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', record):
+            yield decisions
+
+    def test_catalog_reads_use_the_replica(self):
+        with self.routed_reads() as decisions:
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(decisions), {'replica'})
+
+        # Outside of requests everything reads from the primary
+        self.assertEqual(Product.objects.all().db, 'default')
+
+    def test_other_views_and_writes_use_the_primary(self):
+        self.client.force_authenticate(self.user)
+        with self.routed_reads() as decisions:
+            self.client.get(reverse('cartitem-list'))
+            self.client.post(reverse('cartitem-list'), {'product': self.product.id, 'quantity': 1})
+        self.assertEqual(set(decisions), {None})
+
+    def test_callers_are_pinned_to_the_primary_after_a_write(self):
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('cartitem-list'), {'product': self.product.id, 'quantity': 1})
+        with self.routed_reads() as decisions:
+            self.client.get(reverse('product-list'))
+        self.assertEqual(set(decisions), {None})
+
+        cache.clear()
+        with self.routed_reads() as decisions:
+            self.client.get(reverse('product-list'))
+        self.assertEqual(set(decisions), {'replica'})
+
+    def test_callers_are_pinned_by_user(self):
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('cartitem-list'), {'product': self.product.id, 'quantity': 1})
+        self.client.force_authenticate(None)
+
+        # The next read carries a token the write did not
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        with self.routed_reads() as decisions:
+            self.client.get(reverse('product-list'))
+        self.assertEqual(set(decisions), {None})
+
+    def test_users_are_read_from_the_primary(self):
+        local_users.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        reads = []
+        db_for_read = PrimaryReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            reads.append((model._meta.label, db_for_read(router, model, **hints)))
+            return None
+
+        with mock.patch.object(PrimaryReplicaRouter, 'db_for_read', record):
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(('Users.User', None), reads)
+        self.assertIn(('Product.Product', 'replica'), reads)
+
+    def test_async_catalog_reads_use_the_replica(self):
+        with self.routed_reads() as decisions:
+            response = self.client.get(reverse('async-product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(decisions), {'replica'})
+
+    def test_disabled_replica_is_not_used(self):
+        with self.settings(DATABASE_REPLICA_ENABLED=False), self.routed_reads() as decisions:
+            self.client.get(reverse('product-list'))
+        self.assertEqual(set(decisions), {None})
+
+    def test_copy_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source, target = os.path.join(directory, 'primary.db'), os.path.join(directory, 'replica.db')
+            with closing(sqlite3.connect(source)) as connection, connection:
+                connection.execute('CREATE TABLE item (name TEXT)')
+                connection.execute("INSERT INTO item VALUES ('a')")
+            opened, connect = [], sqlite3.connect
+            with mock.patch('Product.management.commands.replicate_db.sqlite3.connect',
+                            side_effect=lambda path: opened.append(connect(path)) or opened[-1]):
+                copy_database(source, target)
+            with closing(sqlite3.connect(target)) as connection:
+                self.assertEqual(connection.execute('SELECT name FROM item').fetchall(), [('a',)])
+            # Both handles are closed
+            self.assertEqual(len(opened), 2)
+            for connection in opened:
+                with self.assertRaises(sqlite3.ProgrammingError):
+                    connection.execute('SELECT 1')
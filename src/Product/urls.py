@@ -7,8 +7,13 @@ from .views import (
     AttributeTypeViewSet,
     ProductAttributeViewSet,
     ProductImageViewSet,
+    AsyncProductListView,
+    AsyncProductDetailView,
+    AsyncCategoryListView,
+    AsyncCategoryDetailView,
     api_root
 )
+from Review.views import ProductReviewListCreateView
 
 """
 This module configures the URL routing for the API.
@@ -25,5 +30,10 @@ router.register(r'product-images', ProductImageViewSet)
 # Define URL patterns
 urlpatterns = [
     path('', api_root, name='api-root'),  # Root URL for API
+    path('async/products/', AsyncProductListView.as_view(), name='async-product-list'),
+    path('async/products/<int:pk>/', AsyncProductDetailView.as_view(), name='async-product-detail'),
+    path('async/categories/', AsyncCategoryListView.as_view(), name='async-category-list'),
+    path('async/categories/<int:pk>/', AsyncCategoryDetailView.as_view(), name='async-category-detail'),
+    path('products/<int:product_pk>/reviews/', ProductReviewListCreateView.as_view(), name='product-review-list'),
     path('', include(router.urls)),  # Include the router URLs
 ]
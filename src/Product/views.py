@@ -1,11 +1,15 @@
-from rest_framework import viewsets, status
+from django.db.models import Prefetch
+from rest_framework import viewsets, status, filters
 from rest_framework.decorators import api_view, action, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 
 from Shop.permissions import IsAdminUserOrReadOnly
+from Shop.views import AsyncAPIView
 from .models import Category, Product, ProductAttribute, ProductImage, AttributeType
+from .pagination import ProductCursorPagination, AsyncProductCursorPagination
 from .serializers import (
     CategorySerializer,
     ProductSerializer,
@@ -15,7 +19,7 @@ from .serializers import (
 )
 
 """
-This module contains viewsets for the API and the root API view.
+This module contains viewsets for the API, their async read-only variants and the root API view.
 """
 
 
@@ -46,10 +50,15 @@ class CategoryViewSet(viewsets.ModelViewSet):
     Attributes:
         queryset: The queryset used to retrieve objects.
         serializer_class: The serializer class used to validate and deserialize objects.
+        read_replica: Safe requests may read from the replica.
+        cache_response: GETs are public and unthrottled, and their responses are cached,
+            see :class:`Shop.compression.CompressionMiddleware`.
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminUserOrReadOnly]
+    read_replica = True
+    cache_response = True
 
 
 class AttributeTypeViewSet(viewsets.ModelViewSet):
@@ -86,9 +95,22 @@ class ProductViewSet(viewsets.ModelViewSet):
     Attributes:
         queryset: The queryset used to retrieve objects.
         serializer_class: The serializer class used to validate and deserialize objects.
+        pagination_class: Keyset pagination, used when ``page_size`` is passed.
+        search_fields: Fields matched by the ``search`` query parameter.
+        read_replica: Safe requests may read from the replica.
+        cache_response: GETs are public and unthrottled, and their responses are cached,
+            see :class:`Shop.compression.CompressionMiddleware`.
     """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
+    filter_backends = [filters.SearchFilter]
+    search_fields = ['title', 'brand']
+    read_replica = True
+    cache_response = True
+
+    def get_queryset(self):
+        return get_product_queryset()
 
     def get_permissions(self):
         """
@@ -170,3 +192,75 @@ def add_image(self, request, pk=None):
     serializer.is_valid(raise_exception=True)
     serializer.save(product=product)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+def get_product_queryset():
+    """
+    Return the products with everything ProductSerializer reads prefetched, so serializing them runs no queries.
+    """
+    return Product.objects.prefetch_related(
+        Prefetch('attributes', queryset=ProductAttribute.objects.select_related('attribute_name')),
+        'images',
+    )
+
+
+class AsyncProductListView(AsyncAPIView):
+    """
+    An async variant of the product list, for ASGI deployments.
+
+    Products are read with the async ORM and serialized in a worker thread.
+    Supports ``search`` and ``page_size`` like ProductViewSet; pages have
+    forward links only.
+    """
+    search_fields = ProductViewSet.search_fields
+    read_replica = True
+    cache_response = True
+
+    async def get(self, request):
+        queryset = filters.SearchFilter().filter_queryset(request, get_product_queryset(), self)
+        paginator = AsyncProductCursorPagination()
+        page = await paginator.apaginate_queryset(queryset, request)
+        if page is None:
+            products = [product async for product in queryset]
+            return await self.render(lambda: ProductSerializer(products, many=True).data)
+        return await self.render(lambda: paginator.get_paginated_data(ProductSerializer(page, many=True).data))
+
+
+class AsyncProductDetailView(AsyncAPIView):
+    """
+    An async variant of the product detail, for ASGI deployments.
+    """
+    read_replica = True
+    cache_response = True
+
+    async def get(self, request, pk):
+        product = await get_product_queryset().filter(pk=pk).afirst()
+        if product is None:
+            raise NotFound()
+        return await self.render(lambda: ProductSerializer(product).data)
+
+
+class AsyncCategoryListView(AsyncAPIView):
+    """
+    An async variant of the category list, for ASGI deployments.
+    """
+    read_replica = True
+    cache_response = True
+
+    async def get(self, request):
+        categories = [category async for category in Category.objects.all()]
+        return await self.render(lambda: CategorySerializer(categories, many=True).data)
+
+
+class AsyncCategoryDetailView(AsyncAPIView):
+    """
+    An async variant of the category detail, for ASGI deployments.
+    """
+    read_replica = True
+    cache_response = True
+
+    async def get(self, request, pk):
+        category = await Category.objects.filter(pk=pk).afirst()
+        if category is None:
+            raise NotFound()
+        return await self.render(lambda: CategorySerializer(category).data)
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-19 11:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Order', '0008_order_archive'),
+        ('Product', '0002_attributetype_alter_productattribute_attribute_name'),
+        ('Review', '0003_alter_review_order'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'id'], name='review_product_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='review_unique_user_product'),
+        ),
+    ]
@@ -11,7 +11,17 @@ class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     rating = models.DecimalField(decimal_places=2, max_digits=3)
     description = models.TextField()
-    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    # Unconstrained so reviews are kept when the order is moved to the archive
+    order = models.ForeignKey(Order, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='review_unique_user_product'),
+        ]
+        indexes = [
+            # Backs the per-product review listing, paginated by id
+            models.Index(fields=['product', 'id'], name='review_product_id_idx'),
+        ]
 
     def __str__(self):
         return f"Review by {self.user.email} for {self.product.title}"
@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+"""
+This module contains the pagination classes for the Review API.
+"""
+
+
+class ReviewCursorPagination(CursorPagination):
+    """
+    Keyset pagination over a product's reviews, newest first, backed by the ``(product, id)`` index.
+    """
+    ordering = '-id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,29 @@
+from decimal import Decimal
+
+from rest_framework import serializers
+from .models import Review
+
+"""
+This file creates the Serializers for the Review Models.
+"""
+
+
+class ReviewSerializer(serializers.ModelSerializer):
+    """
+    Serializer for Review model.
+
+    Attributes:
+        user: The author of the review (set from the request).
+        product: The reviewed product (set from the URL).
+        order: Id of the author's order that contains the product.
+        rating: Rating between 1 and 5.
+        description: The review text.
+    """
+    order = serializers.IntegerField(source='order_id')
+    rating = serializers.DecimalField(max_digits=3, decimal_places=2, min_value=Decimal('1'),
+                                      max_value=Decimal('5'))
+
+    class Meta:
+        model = Review
+        fields = ['id', 'user', 'product', 'order', 'rating', 'description']
+        read_only_fields = ['user', 'product']
@@ -1,7 +1,10 @@
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
 from Users.models import User
 from Product.models import Product
-from Order.models import Order
+from Order.models import Order, OrderItem
 from .models import Review
 
 
@@ -50,3 +53,75 @@ class ReviewModelTest(TestCase):
         # Check the __str__ method of Review
         expected_str = f"Review by {self.user.email} for {self.product.title}"
         self.assertEqual(str(self.review), expected_str)
+
+
+class ReviewAPITestCase(APITestCase):
+    """
+    Test case for the review endpoints.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+        self.other_user = User.objects.create_user(username='other', email='other@example.com', password='testpass')
+        self.product = Product.objects.create(title='Test Product', price=99.99)
+        self.other_product = Product.objects.create(title='Other Product', price=5.00)
+        self.order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=1, price=self.product.price)
+        self.url = reverse('product-review-list', kwargs={'product_pk': self.product.id})
+        self.data = {'order': self.order.id, 'rating': '4.50', 'description': 'Great product'}
+
+    def test_create_review(self):
+        self.client.force_authenticate(user=self.user)
+        # purchase check, savepoint, insert, release
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, self.data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        review = Review.objects.get()
+        self.assertEqual((review.user, review.product, review.order), (self.user, self.product, self.order))
+
+    def test_review_requires_purchase(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('product-review-list', kwargs={'product_pk': self.other_product.id})
+        response = self.client.post(url, self.data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.post(self.url, self.data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Review.objects.exists())
+
+    def test_duplicate_review_rejected(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(self.url, self.data, format='json')
+        response = self.client.post(self.url, self.data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('product', response.data)
+        self.assertEqual(Review.objects.count(), 1)
+
+    def test_list_reviews_is_paginated(self):
+        for index in range(3):
+            user = User.objects.create_user(username=f'user{index}', email=f'user{index}@example.com')
+            Review.objects.create(user=user, product=self.product, order=self.order, rating=5, description='Nice')
+        Review.objects.create(user=self.user, product=self.other_product, order=self.order, rating=1,
+                              description='Other')
+
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_only_author_can_delete(self):
+        review = Review.objects.create(user=self.user, product=self.product, order=self.order, rating=5,
+                                       description='Nice')
+        url = reverse('review-detail', kwargs={'pk': review.id})
+
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Review.objects.exists())
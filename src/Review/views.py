@@ -1,3 +1,55 @@
-from django.shortcuts import render
+from django.db import IntegrityError, transaction
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
 
-# Create your views here.
+from Order.models import OrderItem
+from Shop.permissions import IsOwnerOrReadOnly
+from .models import Review
+from .pagination import ReviewCursorPagination
+from .serializers import ReviewSerializer
+
+"""
+This file contains the views for the Review API.
+"""
+
+
+class ProductReviewListCreateView(generics.ListCreateAPIView):
+    """
+    A view for listing the reviews of a product and reviewing it.
+
+    Only users who ordered the product may review it, once per product.
+    """
+    serializer_class = ReviewSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ReviewCursorPagination
+
+    def get_queryset(self):
+        return Review.objects.filter(product_id=self.kwargs['product_pk'])
+
+    def perform_create(self, serializer):
+        product_id = self.kwargs['product_pk']
+        order_id = serializer.validated_data['order_id']
+
+        # One indexed EXISTS query: the order belongs to the user and contains the product
+        purchased = OrderItem.objects.filter(
+            order_id=order_id, order__user=self.request.user, product_id=product_id
+        ).exists()
+        if not purchased:
+            raise ValidationError({'order': 'This order does not belong to you or does not contain this product.'})
+
+        # The unique constraint on (user, product) rejects duplicates without a pre-check query
+        try:
+            with transaction.atomic():
+                serializer.save(user=self.request.user, product_id=product_id)
+        except IntegrityError:
+            raise ValidationError({'product': 'You have already reviewed this product.'})
+
+
+class ReviewDetailView(generics.RetrieveDestroyAPIView):
+    """
+    A view for retrieving a review and letting its author delete it.
+    """
+    queryset = Review.objects.all()
+    serializer_class = ReviewSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
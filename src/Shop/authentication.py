@@ -0,0 +1,188 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from Users.revocation import revoked_tokens
+from . import metrics
+
+"""
+This module contains the JWT authentication classes used by the API.
+"""
+
+USER_CACHE_KEY = 'jwt-auth-state:{}'
+# The user fields cached for authentication; request.user loads the others on first access
+AUTH_USER_FIELDS = ('id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser')
+
+
+class UserLRUCache:
+    """
+    A bounded, thread-safe, per-process LRU cache whose entries expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_users = UserLRUCache(
+    maxsize=getattr(settings, 'JWT_USER_LRU_SIZE', 1024),
+    ttl=getattr(settings, 'JWT_USER_LRU_TTL', 5),
+)
+
+
+def get_user_cache():
+    return caches[getattr(settings, 'JWT_USER_CACHE_ALIAS', 'default')]
+
+
+def invalidate_cached_user(user_id):
+    """
+    Drop a user from this process's LRU and from the shared cache.
+
+    Other processes keep their LRU copy for at most ``JWT_USER_LRU_TTL`` seconds.
+    """
+    local_users.delete(user_id)
+    get_user_cache().delete(USER_CACHE_KEY.format(user_id))
+
+
+class RevocationCheckMixin:
+    """
+    Rejects tokens that were revoked, e.g. by logging out.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if revoked_tokens.is_revoked(validated_token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken(_("Token has been revoked"))
+        return validated_token
+
+
+def load_auth_state(user_id):
+    """
+    Return what authenticating a user needs, from the caches or the database, or None if the user does not exist.
+
+    The state holds the :data:`AUTH_USER_FIELDS` and the password version that
+    tokens carry when ``CHECK_REVOKE_TOKEN`` is on, a hash of the password hash;
+    never the password hash itself. It is cached in a small per-process LRU
+    first, then in the shared cache (``JWT_USER_CACHE_TTL`` seconds), and
+    invalidated when the user is saved or deleted, which covers password changes
+    and deactivation.
+    """
+    state = local_users.get(user_id)
+    metrics.cache_requests.labels('jwt_user_local', 'miss' if state is None else 'hit').inc()
+    if state is not None:
+        return state
+
+    shared_cache = get_user_cache()
+    cache_key = USER_CACHE_KEY.format(user_id)
+    state = shared_cache.get(cache_key)
+    metrics.cache_requests.labels('jwt_user_shared', 'miss' if state is None else 'hit').inc()
+    if state is None:
+        row = (get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+               .values(*AUTH_USER_FIELDS, 'password').first())
+        if row is None:
+            return None
+        state = {**{name: row[name] for name in AUTH_USER_FIELDS},
+                 'password_version': get_md5_hash_password(row['password'])}
+        shared_cache.set(cache_key, state, timeout=getattr(settings, 'JWT_USER_CACHE_TTL', 60))
+
+    local_users.set(user_id, state)
+    return state
+
+
+def check_auth_state(state, validated_token):
+    """
+    Reject a token whose user no longer exists, was deactivated or, with ``CHECK_REVOKE_TOKEN``, changed password.
+
+    :raise AuthenticationFailed: If the token must be rejected.
+    """
+    if state is None:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    if not state['is_active']:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != state['password_version']:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+
+def get_token_user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+
+
+class CachedJWTAuthentication(RevocationCheckMixin, JWTAuthentication):
+    """
+    JWT authentication that resolves the token's user without a database query on most requests.
+
+    The user is checked against :func:`load_auth_state` and built from it; its
+    other fields, such as the password, are deferred and loaded on first access.
+    """
+
+    def get_user(self, validated_token):
+        state = load_auth_state(get_token_user_id(validated_token))
+        check_auth_state(state, validated_token)
+        return self.build_user(state)
+
+    def build_user(self, state):
+        """
+        Return a user instance holding the cached fields, with the others deferred. Each request gets its own.
+        """
+        names = [field.attname for field in self.user_model._meta.concrete_fields if field.attname in AUTH_USER_FIELDS]
+        return self.user_model.from_db(DEFAULT_DB_ALIAS, names, [state[name] for name in names])
+
+
+class TokenUserJWTAuthentication(RevocationCheckMixin, JWTStatelessUserAuthentication):
+    """
+    JWT authentication that never loads the user, for endpoints that only need ``request.user.id``.
+
+    ``request.user`` is a :class:`~rest_framework_simplejwt.models.TokenUser` built from the
+    token claims. The user is still checked against the cached :func:`load_auth_state`,
+    so tokens of deactivated users are rejected.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        check_auth_state(load_auth_state(get_token_user_id(validated_token)), validated_token)
+        return user
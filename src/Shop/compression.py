@@ -0,0 +1,223 @@
+import gzip
+import hashlib
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+from .profiling import PROFILE_HEADER
+
+"""
+This module compresses large API responses and caches the public catalog responses together with their compressed bytes.
+"""
+
+GENERATION_KEY = 'response-cache:generation'
+# Content codings the middleware can produce, by preference
+ENCODINGS = {
+    'gzip': lambda content, level: gzip.compress(content, compresslevel=level, mtime=0),
+}
+COMPRESSIBLE_TYPES = ('application/json',)
+# Headers recomputed when a cached response is served, or describing only the request that was cached
+UNCACHED_HEADERS = {'content-length', 'content-encoding', 'server-timing'}
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def invalidate_cached_responses():
+    """
+    Expire every cached response at once, by starting a new cache generation.
+    """
+    get_response_cache().set(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick the preferred content coding accepted by an ``Accept-Encoding`` header.
+
+    :param accept_encoding: The header value, e.g. ``'br;q=1.0, gzip;q=0.8'``.
+    :return: A key of :data:`ENCODINGS`, or None to send the response uncompressed.
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip()] = quality
+    for coding in ENCODINGS:
+        if accepted.get(coding, accepted.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+def is_compressible(response, min_size):
+    """
+    Whether a response is large enough, and of a type worth compressing.
+
+    Only JSON is compressed: HTML pages embed CSRF tokens, which compression
+    would expose to BREACH.
+    """
+    return (not response.streaming and not response.has_header('Content-Encoding')
+            and response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+            and len(response.content) >= min_size)
+
+
+class CompressionMiddleware:
+    """
+    Middleware compressing JSON responses of at least ``COMPRESSION_MIN_SIZE`` bytes
+    with the coding negotiated from ``Accept-Encoding``.
+
+    Successful GET responses of views with ``cache_response = True`` are also
+    stored in the ``RESPONSE_CACHE_ALIAS`` cache for ``RESPONSE_CACHE_TTL``
+    seconds, keyed by their URL and ``Accept`` header, together with their bytes
+    compressed at ``RESPONSE_CACHE_COMPRESSION_LEVEL``. Repeated requests are then
+    answered from the cache without running the view or compressing again,
+    except requests carrying an ``X-Profile`` token. These views serve the
+    public catalog, so the cached responses are shared by all callers.
+    :func:`invalidate_cached_responses` expires them all, e.g. when the catalog
+    changes.
+
+    Cache hits skip the view's authentication, permissions and throttles, so
+    ``cache_response`` is only for views whose GETs are public and unthrottled.
+    Views with throttle classes or a ``throttle_scope`` are never cached, so a
+    throttle added to one cannot be bypassed through the cache.
+
+    Works in both sync and async stacks, so it does not force async views onto
+    the sync thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = get_response_cache()
+        self.ttl = getattr(settings, 'RESPONSE_CACHE_TTL', 60)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.level = getattr(settings, 'COMPRESSION_LEVEL', 6)
+        self.cached_level = getattr(settings, 'RESPONSE_CACHE_COMPRESSION_LEVEL', 9)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        cache_key, generation, cached = self.lookup(request)
+        if cached is not None:
+            return self.replay(request, cached)
+        return self.finish(request, cache_key, generation, self.get_response(request))
+
+    async def __acall__(self, request):
+        cache_key, generation, cached = self.lookup(request)
+        if cached is not None:
+            return self.replay(request, cached)
+        return self.finish(request, cache_key, generation, await self.get_response(request))
+
+    def lookup(self, request):
+        """
+        Return the ``(cache_key, generation, cached)`` of a request.
+
+        ``cache_key`` is None when the request's response may not be cached, and
+        ``cached`` is None unless a current cached response was found.
+        """
+        # Requests asking for a profile must run the view
+        if request.method != 'GET' or PROFILE_HEADER in request.META or not self.caches_view(request.path_info):
+            return None, None, None
+        digest = hashlib.sha256(f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}".encode())
+        cache_key = f'response-cache:{digest.hexdigest()}'
+        found = self.cache.get_many([cache_key, GENERATION_KEY])
+        generation, cached = found.get(GENERATION_KEY), found.get(cache_key)
+        if cached is not None and (generation is None or cached['generation'] != generation):
+            cached = None
+        metrics.cache_requests.labels('response', 'miss' if cached is None else 'hit').inc()
+        return cache_key, generation, cached
+
+    @staticmethod
+    def caches_view(path):
+        try:
+            view = resolve(path).func
+        except Resolver404:
+            return False
+        # DRF views expose their class as ``cls``, plain Django views as ``view_class``
+        view_class = getattr(view, 'cls', None) or getattr(view, 'view_class', None)
+        throttled = getattr(view_class, 'throttle_classes', None) or getattr(view_class, 'throttle_scope', None)
+        return getattr(view_class, 'cache_response', False) and not throttled
+
+    def finish(self, request, cache_key, generation, response):
+        compressed = None if cache_key is None else self.store(cache_key, generation, response)
+        if compressed is None:
+            return self.compress(request, response)
+        # Sent with the bytes just cached rather than compressing twice
+        return self.send_compressed(request, response, compressed)
+
+    def store(self, cache_key, generation, response):
+        """
+        Cache a response of a cacheable request, with its compressed bytes if it is large enough.
+
+        :return: The compressed bytes by content coding, or None if the response was not cached.
+        """
+        if (response.status_code != 200 or response.streaming or response.cookies
+                or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)):
+            return None
+        if generation is None:
+            # Start a generation if there is none, e.g. after the cache was cleared
+            self.cache.add(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+            generation = self.cache.get(GENERATION_KEY)
+        compressed = {}
+        if len(response.content) >= self.min_size:
+            compressed = {coding: encode(response.content, self.cached_level) for coding, encode in ENCODINGS.items()}
+        self.cache.set(cache_key, {
+            'generation': generation,
+            'content': response.content,
+            'compressed': compressed,
+            'headers': [(name, value) for name, value in response.items() if name.lower() not in UNCACHED_HEADERS],
+        }, timeout=self.ttl)
+        return compressed
+
+    def replay(self, request, cached):
+        """
+        Rebuild a cached response, with the pre-compressed bytes when the client accepts them.
+        """
+        response = HttpResponse(cached['content'])
+        for name, value in cached['headers']:
+            response[name] = value
+        return self.send_compressed(request, response, cached['compressed'])
+
+    @classmethod
+    def send_compressed(cls, request, response, compressed):
+        if compressed:
+            patch_vary_headers(response, ('Accept-Encoding',))
+            coding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            if coding is not None:
+                cls.set_content(response, compressed[coding], coding)
+        return response
+
+    def compress(self, request, response):
+        if not is_compressible(response, self.min_size):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is not None:
+            self.set_content(response, ENCODINGS[coding](response.content, self.level), coding)
+        return response
+
+    @staticmethod
+    def set_content(response, content, coding):
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = coding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # The compressed bytes differ from the ones the strong ETag was computed for
+            response['ETag'] = 'W/' + etag
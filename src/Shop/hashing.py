@@ -0,0 +1,98 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+"""
+This module runs password hashing in a bounded thread pool, off the request workers.
+"""
+
+
+class HasherBusy(APIException):
+    """
+    Raised when the password hashing pool already has as much work queued as it accepts.
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The service is busy, please retry shortly.'
+    default_code = 'hasher_busy'
+
+
+class PasswordHasherPool:
+    """
+    A thread pool for password hashing with a cap on the work it accepts.
+
+    ``hashlib``'s PBKDF2 releases the GIL, so hashes run in parallel with request
+    handling. At most ``workers`` hashes run at once and at most ``queue_size`` more
+    wait; beyond that :class:`HasherBusy` is raised instead of queueing without bound.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    async def run(self, func, *args):
+        """
+        Run ``func(*args)`` in the pool and return its result.
+
+        :raise HasherBusy: If the pool is full.
+        """
+        if not self.slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.slots.release()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hasher_pool():
+    """
+    Return the process-wide hashing pool, sized by ``PASSWORD_HASHING_WORKERS`` and ``PASSWORD_HASHING_QUEUE``.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PasswordHasherPool(
+                    workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 2),
+                    queue_size=getattr(settings, 'PASSWORD_HASHING_QUEUE', 32),
+                )
+    return _pool
+
+
+async def hash_password(raw_password):
+    """
+    Return the encoded hash of ``raw_password``, computed in the hashing pool.
+    """
+    return await get_hasher_pool().run(make_password, raw_password)
+
+
+def _authenticate(request, credentials):
+    try:
+        return authenticate(request, **credentials)
+    finally:
+        # The pool's threads serve no requests, so nothing else closes their connections
+        close_old_connections()
+
+
+async def authenticate_user(request, **credentials):
+    """
+    Authenticate ``credentials`` against ``AUTHENTICATION_BACKENDS`` in the hashing pool.
+
+    Runs :func:`django.contrib.auth.authenticate`, so failures send
+    ``user_login_failed``, passwords are rehashed when the hasher is upgraded and
+    unknown or inactive users are rejected as slowly as wrong passwords.
+
+    :return: The authenticated user, or None.
+    :raise HasherBusy: If the pool is full.
+    """
+    return await get_hasher_pool().run(_authenticate, request, credentials)
@@ -0,0 +1,135 @@
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+from . import metrics
+
+"""
+This module provides Idempotency-Key support for unsafe API requests.
+"""
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+# Besides successes, only validation errors are replayed: they would be returned
+# again for the same payload, unlike authentication, conflict or throttling errors.
+REPLAYED_ERROR_STATUSES = {400, 422}
+
+
+class IdempotencyMiddleware:
+    """
+    Middleware that makes POST requests carrying an ``Idempotency-Key`` header safe to retry.
+
+    The first successful or invalid response for a key is stored in the
+    configured cache for ``IDEMPOTENCY_KEY_TTL`` seconds and replayed, headers
+    included, for every retry, so retried requests never reach the view. Other
+    errors, such as ``429 Too Many Requests``, are not stored, so the request can
+    be retried with the same key. While the first request is still running,
+    duplicates are rejected with ``409 Conflict`` so only one of them executes.
+    Keys are scoped by the caller's credentials and the request path.
+
+    Works in both sync and async stacks, so it does not force async views onto
+    the sync thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = caches[getattr(settings, 'IDEMPOTENCY_CACHE_ALIAS', 'default')]
+        self.ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24)
+        self.lock_ttl = getattr(settings, 'IDEMPOTENCY_LOCK_TTL', 60)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = self.get_request_key(request)
+        if key is None:
+            return self.get_response(request)
+        early_response = self.acquire(key)
+        if early_response is not None:
+            return early_response
+        try:
+            return self.store(key, self.get_response(request))
+        finally:
+            self.release(key)
+
+    async def __acall__(self, request):
+        key = self.get_request_key(request)
+        if key is None:
+            return await self.get_response(request)
+        early_response = self.acquire(key)
+        if early_response is not None:
+            return early_response
+        try:
+            return self.store(key, await self.get_response(request))
+        finally:
+            self.release(key)
+
+    def get_request_key(self, request):
+        """
+        Return the ``(cache_key, fingerprint)`` of an idempotent request, or None if the request is not one.
+        """
+        idempotency_key = request.META.get(IDEMPOTENCY_HEADER)
+        if request.method != 'POST' or not idempotency_key:
+            return None
+        return self.get_cache_key(request, idempotency_key), hashlib.sha256(request.body).hexdigest()
+
+    def acquire(self, key):
+        """
+        Take the in-flight lock for a key, or return the response to send instead of running the view.
+        """
+        cache_key, fingerprint = key
+        stored = self.cache.get(cache_key)
+        metrics.cache_requests.labels('idempotency', 'miss' if stored is None else 'hit').inc()
+        if stored is not None:
+            return self.replay(stored, fingerprint)
+        if not self.cache.add(f'{cache_key}:lock', 1, timeout=self.lock_ttl):
+            return JsonResponse({"error": "A request with this Idempotency-Key is already in progress."},
+                                status=409)
+        return None
+
+    def store(self, key, response):
+        cache_key, fingerprint = key
+        replayable = 200 <= response.status_code < 300 or response.status_code in REPLAYED_ERROR_STATUSES
+        if replayable and not response.streaming:
+            self.cache.set(cache_key, {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'content': response.content,
+                'headers': [(name, value) for name, value in response.items() if name.lower() != 'content-length'],
+            }, timeout=self.ttl)
+        return response
+
+    def release(self, key):
+        self.cache.delete(f'{key[0]}:lock')
+
+    def get_cache_key(self, request, idempotency_key):
+        """
+        Build the cache key for a request, scoped to the caller and the endpoint.
+        """
+        caller = request.META.get('HTTP_AUTHORIZATION')
+        if not caller and hasattr(request, 'session'):
+            caller = request.session.session_key
+        if not caller:
+            caller = request.META.get('REMOTE_ADDR', '')
+        digest = hashlib.sha256(f'{caller}|{request.path}|{idempotency_key}'.encode()).hexdigest()
+        return f'idempotency:{digest}'
+
+    def replay(self, stored, fingerprint):
+        """
+        Rebuild the stored response, refusing keys reused for a different payload.
+        """
+        if stored['fingerprint'] != fingerprint:
+            return JsonResponse({"error": "Idempotency-Key was already used with a different request."},
+                                status=422)
+        response = HttpResponse(stored['content'], status=stored['status'])
+        for name, value in stored['headers']:
+            response[name] = value
+        response[REPLAYED_HEADER] = 'true'
+        return response
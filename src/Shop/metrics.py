@@ -0,0 +1,442 @@
+import bisect
+import fcntl
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+"""
+This module keeps Prometheus metrics in per-process memory-mapped files and renders them across all processes.
+"""
+
+HEADER = struct.Struct('<Q')
+ENTRY_KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_FILE_SIZE = 64 * 1024
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# The counters and histograms of exited processes, merged by MetricsRegistry.compact()
+AGGREGATE_FILE = 'merged.db'
+LOCK_FILE = '.lock'
+
+
+def get_metrics_dir():
+    return str(getattr(settings, 'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'shop-metrics')))
+
+
+@contextmanager
+def directory_lock(directory, operation):
+    """
+    Hold a ``flock`` on the metrics directory: shared to read the files, exclusive to open or merge them.
+    """
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock_file:
+        fcntl.flock(lock_file, operation)
+        yield
+
+
+def process_file_pid(name):
+    """
+    Return the PID of the process a file in the metrics directory belongs to, or None for other files.
+    """
+    return int(name[:-3]) if name.endswith('.db') and name[:-3].isdigit() else None
+
+
+class ValuesFile:
+    """
+    The metric values written by one process, as a memory-mapped file of ``(key, float)`` entries.
+
+    The file starts with the number of bytes in use, followed by the entries:
+    the key length, the JSON key padded to 8 bytes, then the value. Entries are
+    only appended, and the used size is written after the entry, so readers
+    never need a lock. Only the owning process writes; its threads share a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.offsets = {}
+        with open(path, 'a+b') as values_file:
+            if os.fstat(values_file.fileno()).st_size < INITIAL_FILE_SIZE:
+                values_file.truncate(INITIAL_FILE_SIZE)
+            self.file = open(path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = HEADER.unpack_from(self.map, 0)[0] or HEADER.size
+        for key, value, offset in read_entries(self.map, self.used):
+            self.offsets[key] = offset
+
+    def offset(self, key):
+        """
+        Return the position of the value for a key, appending an entry for it if needed.
+        """
+        offset = self.offsets.get(key)
+        if offset is not None:
+            return offset
+        with self.lock:
+            if key in self.offsets:
+                return self.offsets[key]
+            encoded = key.encode()
+            padded = ENTRY_KEY_LENGTH.size + len(encoded) + (-(ENTRY_KEY_LENGTH.size + len(encoded)) % 8)
+            end = self.used + padded + VALUE.size
+            if end > len(self.map):
+                size = len(self.map)
+                while size < end:
+                    size *= 2
+                self.map.resize(size)
+            ENTRY_KEY_LENGTH.pack_into(self.map, self.used, len(encoded))
+            self.map[self.used + ENTRY_KEY_LENGTH.size:self.used + ENTRY_KEY_LENGTH.size + len(encoded)] = encoded
+            offset = self.used + padded
+            VALUE.pack_into(self.map, offset, 0.0)
+            self.used = end
+            HEADER.pack_into(self.map, 0, self.used)
+            self.offsets[key] = offset
+            return offset
+
+    def add(self, offset, amount):
+        with self.lock:
+            VALUE.pack_into(self.map, offset, VALUE.unpack_from(self.map, offset)[0] + amount)
+
+    def reset(self, keys):
+        with self.lock:
+            for key in keys:
+                VALUE.pack_into(self.map, self.offsets[key], 0.0)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def read_values(path):
+    """
+    Return the ``(key, value)`` entries of a values file, read without locking; none if it cannot be read.
+    """
+    try:
+        with open(path, 'rb') as values_file:
+            buffer = values_file.read()
+    except OSError:
+        return []
+    if len(buffer) < HEADER.size:
+        return []
+    return [(key, value) for key, value, _ in read_entries(buffer, HEADER.unpack_from(buffer, 0)[0])]
+
+
+def read_entries(buffer, used):
+    position = HEADER.size
+    while position < used:
+        length = ENTRY_KEY_LENGTH.unpack_from(buffer, position)[0]
+        start = position + ENTRY_KEY_LENGTH.size
+        key = bytes(buffer[start:start + length]).decode()
+        offset = start + length + (-(ENTRY_KEY_LENGTH.size + length) % 8)
+        yield key, VALUE.unpack_from(buffer, offset)[0], offset
+        position = offset + VALUE.size
+
+
+class MetricChild:
+    """
+    One labelled series of a metric; holds the positions of its values in the process's file.
+    """
+
+    def __init__(self, metric, labelvalues):
+        self.metric = metric
+        self.labelvalues = labelvalues
+        self.process = None
+
+    def bind(self):
+        """
+        Return the process's values file and this series' offsets in it, binding them after a fork.
+        """
+        values = self.metric.registry.values()
+        if self.process is not values:
+            self.offsets = [values.offset(key) for key in self.metric.keys(self.labelvalues)]
+            self.process = values
+        return values, self.offsets
+
+    def inc(self, amount=1):
+        values, offsets = self.bind()
+        values.add(offsets[0], amount)
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def observe(self, value):
+        values, offsets = self.bind()
+        values.add(offsets[bisect.bisect_left(self.metric.buckets, value)], 1)
+        values.add(offsets[-2], value)
+        values.add(offsets[-1], 1)
+
+
+class Metric:
+    def __init__(self, registry, kind, name, documentation, labelnames=(), buckets=None):
+        self.registry = registry
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets or ())
+        self.children = {}
+
+    def labels(self, *labelvalues):
+        child = self.children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(f'{self.name} takes the labels {self.labelnames}.')
+            child = self.children.setdefault(labelvalues, MetricChild(self, tuple(map(str, labelvalues))))
+        return child
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def keys(self, labelvalues):
+        """
+        Return the file keys of a series' values: the value itself, or the buckets, then the sum and count.
+        """
+        labels = list(labelvalues)
+        if self.kind != 'histogram':
+            return [json.dumps([self.name, '', labels])]
+        return ([json.dumps([self.name, '_bucket', labels, index]) for index in range(len(self.buckets) + 1)]
+                + [json.dumps([self.name, '_sum', labels]), json.dumps([self.name, '_count', labels])])
+
+
+class MetricsRegistry:
+    """
+    The metric definitions, and the values file of the current process.
+
+    Counters and histograms are summed over the files of all processes that
+    ever wrote to ``METRICS_DIR``, so they survive worker restarts; gauges only
+    count processes that are still running. When a process opens its file, the
+    files of exited processes are merged by :meth:`compact`, so they do not pile
+    up as workers are recycled.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.file = None
+        self.owner = None
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Metric(self, 'counter', name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Metric(self, 'gauge', name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self.register(Metric(self, 'histogram', name, documentation, labelnames, sorted(buckets)))
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def values(self):
+        """
+        Return the values file of this process, opening a new one after a fork or a change of ``METRICS_DIR``.
+
+        A file left by an exited process with the same PID is reused, with its gauges reset.
+        """
+        owner = (os.getpid(), get_metrics_dir())
+        if self.owner != owner:
+            with self.lock:
+                if self.owner != owner:
+                    os.makedirs(owner[1], exist_ok=True)
+                    with directory_lock(owner[1], fcntl.LOCK_EX):
+                        self.merge_exited(owner[1])
+                        values = ValuesFile(os.path.join(owner[1], f'{owner[0]}.db'))
+                    values.reset([key for key in values.offsets if self.kind(key) == 'gauge'])
+                    self.file = values
+                    self.owner = owner
+        return self.file
+
+    def kind(self, key):
+        metric = self.metrics.get(json.loads(key)[0])
+        return None if metric is None else metric.kind
+
+    def compact(self):
+        """
+        Merge the counters and histograms of exited processes into the aggregate file, and delete their files.
+
+        :return: The number of files merged.
+        """
+        directory = get_metrics_dir()
+        if not os.path.isdir(directory):
+            return 0
+        with directory_lock(directory, fcntl.LOCK_EX):
+            return self.merge_exited(directory)
+
+    def merge_exited(self, directory):
+        """
+        Do the work of :meth:`compact`; the caller holds the exclusive directory lock.
+
+        The aggregate is rewritten to a temporary file and moved into place
+        before the merged files are deleted; readers hold the shared lock, so
+        they never see a value counted twice or missing.
+        """
+        exited = [name for name in os.listdir(directory)
+                  if process_file_pid(name) is not None and not process_alive(process_file_pid(name))]
+        if not exited:
+            return 0
+        aggregate = os.path.join(directory, AGGREGATE_FILE)
+        merged = {}
+        for path in [aggregate] + [os.path.join(directory, name) for name in exited]:
+            for key, value in read_values(path):
+                if self.kind(key) not in (None, 'gauge'):
+                    merged[key] = merged.get(key, 0.0) + value
+
+        temporary = aggregate + '.tmp'
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        values = ValuesFile(temporary)
+        try:
+            for key, value in merged.items():
+                values.add(values.offset(key), value)
+        finally:
+            values.close()
+        os.replace(temporary, aggregate)
+        for name in exited:
+            os.remove(os.path.join(directory, name))
+        return len(exited)
+
+    def collect(self):
+        """
+        Read the values of all processes and the aggregate of the exited ones, and merge them per series.
+        """
+        directory = get_metrics_dir()
+        if not os.path.isdir(directory):
+            return {}
+        merged = {}
+        with directory_lock(directory, fcntl.LOCK_SH):
+            for name in os.listdir(directory):
+                pid = process_file_pid(name)
+                if pid is None and name != AGGREGATE_FILE:
+                    continue
+                live = pid is not None and process_alive(pid)
+                for key, value in read_values(os.path.join(directory, name)):
+                    kind = self.kind(key)
+                    if kind is None or (kind == 'gauge' and not live):
+                        continue
+                    merged[key] = merged.get(key, 0.0) + value
+        return merged
+
+    def render(self):
+        """
+        Return all metrics in the Prometheus text exposition format.
+        """
+        samples = {}
+        for key, value in self.collect().items():
+            name, suffix, labels, *bucket = json.loads(key)
+            samples.setdefault(name, {}).setdefault(tuple(labels), {})[(suffix, *bucket)] = value
+
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for labelvalues, values in sorted(samples.get(metric.name, {}).items()):
+                labels = list(zip(metric.labelnames, labelvalues))
+                if metric.kind != 'histogram':
+                    lines.append(f"{metric.name}{format_labels(labels)} {format_value(values[('',)])}")
+                    continue
+                cumulative = 0.0
+                for index, bound in enumerate([*metric.buckets, float('inf')]):
+                    cumulative += values.get(('_bucket', index), 0.0)
+                    lines.append(f'{metric.name}_bucket{format_labels(labels + [("le", format_value(bound))])} '
+                                 f'{format_value(cumulative)}')
+                lines.append(f"{metric.name}_sum{format_labels(labels)} {format_value(values.get(('_sum',), 0.0))}")
+                lines.append(f"{metric.name}_count{format_labels(labels)} "
+                             f"{format_value(values.get(('_count',), 0.0))}")
+        return '\n'.join(lines) + '\n'
+
+
+def process_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else f'{int(value)}'
+
+
+registry = MetricsRegistry()
+
+request_latency = registry.histogram(
+    'shop_http_request_duration_seconds', 'Time spent handling requests, per view.', ['view', 'method'],
+    buckets=getattr(settings, 'METRICS_LATENCY_BUCKETS', DEFAULT_LATENCY_BUCKETS))
+responses = registry.counter('shop_http_responses_total', 'Responses sent, per view and status.', ['view', 'status'])
+requests_in_progress = registry.gauge('shop_http_requests_in_progress', 'Requests being handled right now.')
+db_queries = registry.counter(
+    'shop_db_queries_total', 'Database queries run by the requests sampled by the query stats.', ['view'])
+db_time = registry.counter(
+    'shop_db_query_seconds_total', 'Database time of the requests sampled by the query stats.', ['view'])
+db_sampled_requests = registry.counter(
+    'shop_db_sampled_requests_total', 'Requests sampled by the query stats.', ['view'])
+db_write_retries = registry.counter(
+    'shop_db_write_retries_total', 'Write transactions retried because the database was locked.', ['function'])
+cache_requests = registry.counter('shop_cache_requests_total', 'Cache lookups, per cache and result.', ['cache', 'result'])
+checkouts = registry.counter('shop_checkouts_total', 'Checkout attempts, per mode and outcome.', ['mode', 'outcome'])
+
+
+class MetricsMiddleware:
+    """
+    Middleware recording the in-flight gauge, and the latency and response status of every request per view.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return self.get_response(request)
+        requests_in_progress.inc()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            requests_in_progress.dec()
+        return self.record(request, response, started)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return await self.get_response(request)
+        requests_in_progress.inc()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            requests_in_progress.dec()
+        return self.record(request, response, started)
+
+    def record(self, request, response, started):
+        match = getattr(request, 'resolver_match', None)
+        view_name = (match.view_name if match else None) or 'unresolved'
+        request_latency.labels(view_name, request.method).observe(time.perf_counter() - started)
+        responses.labels(view_name, response.status_code).inc()
+        return response
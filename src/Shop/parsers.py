@@ -0,0 +1,31 @@
+import codecs
+
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .renderers import ORJSONRenderer
+
+"""
+This module contains the API's JSON parser, which decodes request bodies with orjson.
+"""
+
+
+class ORJSONParser(JSONParser):
+    """
+    A JSON parser decoding request bodies with orjson.
+
+    Bodies in a charset other than UTF-8, and the ``NaN`` and ``Infinity``
+    constants allowed when ``STRICT_JSON`` is off, are left to ``JSONParser``.
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if not self.strict or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,244 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+
+"""
+This module provides opt-in sampling profiles of requests, written to disk and aggregated per view.
+"""
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+TOKEN_SALT = 'Shop.profiling'
+UNSAFE_CHARACTERS = re.compile(r'[^\w.-]+')
+
+
+def get_profile_dir():
+    return str(getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+def make_profile_token(user):
+    """
+    Return a signed value that makes requests carrying it in ``X-Profile`` be profiled.
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(str(user.pk))
+
+
+def valid_profile_token(token):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 60 * 60))
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def frame_label(code):
+    filename = code.co_filename
+    for prefix in sorted({str(settings.BASE_DIR), *sys.path}, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    return f'{filename}:{code.co_firstlineno}({code.co_name})'
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread at a fixed interval from a background thread.
+
+    Only the sampled thread's current frame is read, so the request runs at full
+    speed apart from the GIL switches needed to take the samples. Stacks are
+    counted root first, as ``"outer;inner;leaf"`` strings.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.labels = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = self.labels.get(code)
+                if label is None:
+                    label = self.labels[code] = frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+def write_profile(view_name, request, latency_ms, sampler):
+    """
+    Write a profile to the profile directory and delete the oldest ones beyond ``PROFILING_MAX_FILES``.
+
+    :return: The profile's file name.
+    """
+    directory = get_profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = f'{time.time_ns()}-{UNSAFE_CHARACTERS.sub("_", view_name)}-{round(latency_ms)}ms.json'
+    path = os.path.join(directory, name)
+    with open(path + '.tmp', 'w') as profile_file:
+        json.dump({
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'latency_ms': round(latency_ms, 2),
+            'interval_ms': sampler.interval * 1000,
+            'stacks': dict(sampler.stacks),
+        }, profile_file)
+    os.replace(path + '.tmp', path)
+
+    profiles = sorted(entry for entry in os.listdir(directory) if entry.endswith('.json'))
+    for old in profiles[:max(0, len(profiles) - getattr(settings, 'PROFILING_MAX_FILES', 500))]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except FileNotFoundError:
+            pass
+    return name
+
+
+def aggregate_profiles(view=None, limit=10):
+    """
+    Summarize the stored profiles per view, with the frames where most samples were taken.
+
+    ``self`` counts samples in which a frame was running itself; ``total`` counts
+    samples in which it was anywhere on the stack.
+
+    :param view: Only include this view name.
+    :param limit: Frames listed per view in each ranking.
+    :return: A dict of view name to its summary.
+    """
+    directory = get_profile_dir()
+    names = sorted(entry for entry in os.listdir(directory) if entry.endswith('.json')) \
+        if os.path.isdir(directory) else []
+    views = {}
+    for name in names:
+        try:
+            with open(os.path.join(directory, name)) as profile_file:
+                profile = json.load(profile_file)
+        except (OSError, ValueError):
+            continue
+        if view is not None and profile['view'] != view:
+            continue
+        summary = views.setdefault(profile['view'], {
+            'profiles': 0, 'latencies': [], 'samples': 0, 'self': Counter(), 'total': Counter(),
+        })
+        summary['profiles'] += 1
+        summary['latencies'].append(profile['latency_ms'])
+        for stack, count in profile['stacks'].items():
+            frames = stack.split(';')
+            summary['samples'] += count
+            summary['self'][frames[-1]] += count
+            for frame in set(frames):
+                summary['total'][frame] += count
+
+    def ranking(counter, samples):
+        return [{'frame': frame, 'samples': count, 'percent': round(100 * count / samples, 1)}
+                for frame, count in counter.most_common(limit)]
+
+    return {
+        name: {
+            'profiles': summary['profiles'],
+            'max_latency_ms': max(summary['latencies']),
+            'mean_latency_ms': round(sum(summary['latencies']) / summary['profiles'], 2),
+            'samples': summary['samples'],
+            'self': ranking(summary['self'], summary['samples'] or 1),
+            'total': ranking(summary['total'], summary['samples'] or 1),
+        }
+        for name, summary in views.items()
+    }
+
+
+class ProfilingMiddleware:
+    """
+    Middleware that profiles a sample of requests with a :class:`StackSampler`.
+
+    Does nothing unless ``PROFILING_ENABLED`` is set. Requests are profiled at
+    ``PROFILING_SAMPLE_RATE``, or always when they carry a valid ``X-Profile``
+    token from the staff profiling endpoint; the latter get the profile's file
+    name back in ``X-Profile-Id``. Profiles are tagged with the resolved view
+    name and the latency, and kept in ``PROFILING_DIR``.
+
+    In async stacks only the event loop thread is sampled, so work handed to
+    ``sync_to_async`` does not show up in the profile.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        requested = self.profile_requested(request)
+        if requested is None:
+            return self.get_response(request)
+        sampler, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        return self.finish(request, response, sampler, started, requested)
+
+    async def __acall__(self, request):
+        requested = self.profile_requested(request)
+        if requested is None:
+            return await self.get_response(request)
+        sampler, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            sampler.stop()
+        return self.finish(request, response, sampler, started, requested)
+
+    def profile_requested(self, request):
+        """
+        Return True if the request asked to be profiled, False if it was sampled, and None to skip it.
+        """
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            return None
+        token = request.META.get(PROFILE_HEADER)
+        if token and valid_profile_token(token):
+            return True
+        if random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0):
+            return False
+        return None
+
+    def start(self):
+        sampler = StackSampler(threading.get_ident(), getattr(settings, 'PROFILING_INTERVAL', 0.005))
+        sampler.start()
+        return sampler, time.perf_counter()
+
+    def finish(self, request, response, sampler, started, requested):
+        latency_ms = (time.perf_counter() - started) * 1000
+        match = getattr(request, 'resolver_match', None)
+        view_name = (match.view_name if match else None) or 'unresolved'
+        name = write_profile(view_name, request, latency_ms, sampler)
+        if requested:
+            response[PROFILE_ID_HEADER] = name
+        return response
@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import db_queries, db_sampled_requests, db_time
+
+"""
+This module records per-view query counts and database time, and flags N+1 query patterns.
+"""
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)', re.IGNORECASE)
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+# The queries of the sampled request being handled. Context variables follow the
+# request into the threads sync_to_async runs the ORM in.
+current_queries = ContextVar('current_queries', default=None)
+
+
+def fingerprint(sql):
+    """
+    Reduce a SQL statement to its shape, so that queries differing only in their parameters compare equal.
+    """
+    sql = IN_LIST.sub('IN (...)', sql)
+    sql = STRING_LITERAL.sub('?', sql)
+    return NUMBER_LITERAL.sub('?', sql)
+
+
+def short_id(shape):
+    return hashlib.sha1(shape.encode()).hexdigest()[:8]
+
+
+class RequestQueries:
+    """
+    The queries run while handling one request, recorded by :func:`record_query`.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        """
+        Return the shapes run more than once, with their counts, most repeated first.
+        """
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > 1]
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper adding a query to the :class:`RequestQueries` of the current request, if it is sampled.
+    """
+    queries = current_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    return queries(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Install :func:`record_query` on a new database connection; connected to ``connection_created``.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class QueryStatsRegistry:
+    """
+    Per-process totals of the sampled requests, keyed by resolved view name.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view_name, queries, n_plus_one):
+        max_fingerprints = getattr(settings, 'QUERY_STATS_MAX_FINGERPRINTS', 20)
+        with self.lock:
+            stats = self.views.setdefault(view_name, {
+                'requests': 0, 'queries': 0, 'db_time': 0.0, 'duplicate_queries': 0,
+                'n_plus_one': 0, 'duplicates': Counter(),
+            })
+            stats['requests'] += 1
+            stats['queries'] += queries.count
+            stats['db_time'] += queries.duration
+            stats['n_plus_one'] += bool(n_plus_one)
+            for shape, count in queries.duplicates():
+                stats['duplicate_queries'] += count - 1
+                if shape in stats['duplicates'] or len(stats['duplicates']) < max_fingerprints:
+                    stats['duplicates'][shape] += count - 1
+
+    def snapshot(self):
+        """
+        Return a copy of the totals, safe to read while requests keep being recorded.
+        """
+        with self.lock:
+            return {name: {**stats, 'duplicates': dict(stats['duplicates'])} for name, stats in self.views.items()}
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+
+query_stats = QueryStatsRegistry()
+
+
+class QueryStatsMiddleware:
+    """
+    Middleware that measures the queries of a sample of requests.
+
+    A ``QUERY_STATS_SAMPLE_RATE`` share of requests is instrumented: their
+    queries are recorded by the execute wrapper installed on every connection,
+    whichever thread runs them. The others only pay for a context variable lookup.
+    For sampled requests the query count and database time are sent in a
+    ``Server-Timing`` header and added to :data:`query_stats` under the resolved
+    view name. A statement shape repeated at least
+    ``QUERY_STATS_N_PLUS_ONE_THRESHOLD`` times is logged as a likely N+1 query.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        return self.report(request, response, queries)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        return self.report(request, response, queries)
+
+    def sampled(self):
+        return (getattr(settings, 'QUERY_STATS_ENABLED', True)
+                and random.random() < getattr(settings, 'QUERY_STATS_SAMPLE_RATE', 0.05))
+
+    def report(self, request, response, queries):
+        match = getattr(request, 'resolver_match', None)
+        view_name = (match.view_name if match else None) or 'unresolved'
+
+        threshold = getattr(settings, 'QUERY_STATS_N_PLUS_ONE_THRESHOLD', 5)
+        duplicates = queries.duplicates()
+        n_plus_one = [(shape, count) for shape, count in duplicates if count >= threshold]
+        for shape, count in n_plus_one:
+            logger.warning("Possible N+1 query in %s: %d x %s", view_name, count, shape[:300])
+        query_stats.record(view_name, queries, n_plus_one)
+        db_sampled_requests.labels(view_name).inc()
+        db_queries.labels(view_name).inc(queries.count)
+        db_time.labels(view_name).inc(queries.duration)
+
+        if getattr(settings, 'QUERY_STATS_SERVER_TIMING', True):
+            metrics = [f'db;dur={queries.duration * 1000:.1f};desc="{queries.count} queries"']
+            if duplicates:
+                metrics.append(f'db-dup;desc="{sum(count - 1 for _, count in duplicates)} duplicate queries"')
+            if n_plus_one:
+                shape, count = n_plus_one[0]
+                metrics.append(f'db-n1;desc="{count}x {short_id(shape)}"')
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = ', '.join(([existing] if existing else []) + metrics)
+        return response
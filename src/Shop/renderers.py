@@ -0,0 +1,33 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+"""
+This module contains the API's JSON renderer, which encodes responses with orjson.
+"""
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    A JSON renderer producing the same bytes as DRF's ``JSONRenderer``, encoded with orjson.
+
+    Strings, numbers, UUIDs and the serializers' dicts and lists are encoded by
+    orjson. Dates, times and Decimals are handed to DRF's encoder, so datetimes
+    keep DRF's millisecond precision and ``Z`` suffix and Decimals returned by
+    method fields still render as numbers. Floats that Python prints in exponent
+    notation (below 1e-4 or from 1e16) are written as e.g. ``1e-7`` instead of
+    ``1e-07``, which parses to the same value.
+
+    Indented output (as requested by the browsable API or an ``indent`` media type
+    parameter) and the ASCII-only or non-compact settings fall back to ``JSONRenderer``.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (self.get_indent(accepted_media_type, renderer_context or {}) or self.ensure_ascii
+                or not self.compact):
+            return super().render(data, accepted_media_type, renderer_context)
+        content = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        # Escaped by JSONRenderer, as they are not valid in JavaScript string literals
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,160 @@
+import hashlib
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+"""
+This module routes safe catalog and order history reads to the read replica, and everything else to the primary.
+"""
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_KEY = 'replica-pin:{}'
+# Read by authentication, which must see users and revocations as soon as they are written
+PRIMARY_MODELS = (settings.AUTH_USER_MODEL, 'Users.RevokedToken')
+
+current_request = ContextVar('current_request', default=None)
+
+
+def get_replica_alias():
+    """
+    Return the replica's database alias, or None when replica reads are disabled.
+    """
+    if not getattr(settings, 'DATABASE_REPLICA_ENABLED', False):
+        return None
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def get_pin_cache():
+    return caches[getattr(settings, 'DATABASE_REPLICA_PIN_CACHE_ALIAS', 'default')]
+
+
+def get_authenticated_user_id(request):
+    """
+    Return the id of the request's user once authenticated, without triggering a lazy session lookup.
+    """
+    user = vars(request).get('user')
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def get_caller_key(request):
+    """
+    Identify the caller of a request, by its authenticated user, session or address, as a pin cache key.
+    """
+    user_id = get_authenticated_user_id(request)
+    caller = f'user:{user_id}' if user_id is not None else None
+    if not caller and hasattr(request, 'session'):
+        caller = request.session.session_key
+    if not caller:
+        caller = request.META.get('REMOTE_ADDR', '')
+    return PIN_KEY.format(hashlib.sha256(caller.encode()).hexdigest())
+
+
+def reads_from_replica(request):
+    """
+    Whether the reads of a request may go to the replica.
+
+    Only safe requests to views with ``read_replica = True`` qualify, and not
+    while their caller is pinned to the primary after a write.
+    """
+    if request.method not in SAFE_METHODS:
+        return False
+    view = request.resolver_match.func
+    # DRF views expose their class as ``cls``, plain Django views as ``view_class``
+    view_class = getattr(view, 'cls', None) or getattr(view, 'view_class', None)
+    if not getattr(view_class, 'read_replica', False):
+        return False
+    return get_pin_cache().get(get_caller_key(request)) is None
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router sending the reads of eligible requests to the replica, and all writes to the primary.
+
+    The decision is taken at the first read of a request, once its view is
+    resolved, and kept for the rest of the request. Reads inside transactions
+    opened by the request stay on the primary, and the replica is never migrated.
+    Users and revoked tokens are always read from the primary, so that a user
+    can authenticate right after registering, and so that they are loaded before
+    the decision, which then knows the request's user.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label in PRIMARY_MODELS:
+            return None
+        alias = get_replica_alias()
+        request = current_request.get()
+        if (alias is None or request is None
+                or len(connections[DEFAULT_DB_ALIAS].atomic_blocks) > request._primary_atomic_depth):
+            return None
+        decision = getattr(request, '_reads_from_replica', None)
+        if decision is None:
+            if getattr(request, 'resolver_match', None) is None:
+                return None
+            decision = request._reads_from_replica = reads_from_replica(request)
+        return alias if decision else None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica'):
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Middleware exposing the current request to :class:`PrimaryReplicaRouter`.
+
+    After an unsafe request the caller is pinned to the primary for
+    ``DATABASE_REPLICA_PIN_SECONDS``, so that it reads its own writes while the
+    replica catches up. Authenticated callers are pinned by user, whichever
+    credentials their next requests carry.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.set(None)
+        self.pin_writer(request)
+        return response
+
+    async def __acall__(self, request):
+        self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.set(None)
+        self.pin_writer(request)
+        return response
+
+    def start(self, request):
+        # Transactions already open around the request, e.g. in tests, don't pin its reads
+        request._primary_atomic_depth = len(connections[DEFAULT_DB_ALIAS].atomic_blocks)
+        current_request.set(request)
+
+    def pin_writer(self, request):
+        if request.method not in SAFE_METHODS and get_replica_alias() is not None:
+            get_pin_cache().set(get_caller_key(request), 1,
+                                timeout=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5))
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 
@@ -47,35 +49,142 @@ INSTALLED_APPS = [
 ]
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'Shop.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # orjson encoders and decoders, producing the same bytes as DRF's JSON renderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'Shop.renderers.ORJSONRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'Shop.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
+if DEBUG:
+    # The browsable API is only served during development
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] += ('rest_framework.renderers.BrowsableAPIRenderer',)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=24),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
     'UPDATE_LAST_LOGIN': False,
+    'TOKEN_REFRESH_SERIALIZER': 'Users.serializers.RevocableTokenRefreshSerializer',
 }
 
+# Revoked tokens (see Users/revocation.py): each process picks up revocations
+# made elsewhere every JWT_REVOCATION_SYNC_INTERVAL seconds, and prunes expired
+# ones and rebuilds its Bloom filter every JWT_REVOCATION_REBUILD_INTERVAL seconds.
+JWT_REVOCATION_SYNC_INTERVAL = 5
+JWT_REVOCATION_REBUILD_INTERVAL = 60 * 60
+JWT_REVOCATION_CAPACITY = 100000
+JWT_REVOCATION_FALSE_POSITIVE_RATE = 0.001
+
 AUTH_USER_MODEL = "Users.User"
 
+# Users resolved by Shop.authentication.CachedJWTAuthentication are kept in a
+# per-process LRU for JWT_USER_LRU_TTL seconds and in the shared cache for
+# JWT_USER_CACHE_TTL seconds.
+JWT_USER_CACHE_ALIAS = 'default'
+JWT_USER_CACHE_TTL = 60
+JWT_USER_LRU_SIZE = 1024
+JWT_USER_LRU_TTL = 5
+
+# Token buckets used by Shop.throttling, keyed by the view's throttle_scope.
+# "capacity" is the largest burst and "rate" how fast tokens come back.
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLE_BUCKETS = {
+    'login': {'capacity': 10, 'rate': '10/min'},
+    'registration': {'capacity': 5, 'rate': '20/hour'},
+    'password-change': {'capacity': 5, 'rate': '5/min'},
+    'checkout': {'capacity': 10, 'rate': '30/min'},
+}
+
+# Pool used by the async auth views to hash passwords off the request workers
+# (see Shop/hashing.py). Requests beyond workers + queue get a 503.
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_QUEUE = 32
+
 MIDDLEWARE = [
+    'Shop.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'Shop.compression.CompressionMiddleware',
+    'Shop.querystats.QueryStatsMiddleware',
+    'Shop.profiling.ProfilingMiddleware',
+    'Shop.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'Shop.idempotency.IdempotencyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'Shop.urls'
 
+# Query instrumentation (see Shop/querystats.py), always on for a sample of the
+# requests; sampled responses carry a Server-Timing header.
+QUERY_STATS_ENABLED = True
+QUERY_STATS_SAMPLE_RATE = 0.05
+QUERY_STATS_N_PLUS_ONE_THRESHOLD = 5
+QUERY_STATS_MAX_FINGERPRINTS = 20
+QUERY_STATS_SERVER_TIMING = True
+
+# Prometheus metrics (see Shop/metrics.py), scraped from /metrics. Every worker
+# process writes its values to a file in METRICS_DIR; the files of exited workers
+# are merged into one when a worker starts. Empty the directory when the server
+# restarts. Set METRICS_TOKEN to require a bearer token.
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get('SHOP_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'shop-metrics'))
+METRICS_TOKEN = os.environ.get('SHOP_METRICS_TOKEN')
+
+# Sampling request profiler (see Shop/profiling.py), off unless enabled. Staff
+# can force a profile with the X-Profile token from /api/profiling/token/.
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_INTERVAL = 0.005  # seconds between stack samples
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_FILES = 500
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
+# Idempotency-Key support for retried POST requests (see Shop/idempotency.py).
+# Point IDEMPOTENCY_CACHE_ALIAS at a shared cache when running several workers.
+IDEMPOTENCY_CACHE_ALIAS = 'default'
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+IDEMPOTENCY_LOCK_TTL = 60
+
+# Compression of JSON responses of at least COMPRESSION_MIN_SIZE bytes, and
+# caching of the catalog responses with their compressed bytes (see
+# Shop/compression.py). Catalog changes expire the cache of the process making
+# them; point RESPONSE_CACHE_ALIAS at a shared cache when running several workers.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_LEVEL = 6
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TTL = 60
+RESPONSE_CACHE_COMPRESSION_LEVEL = 9
+
+# Asynchronous checkout (clients opt in with "Prefer: respond-async"); jobs are
+# processed by "manage.py run_workers".
+CHECKOUT_ASYNC_ENABLED = True
+CHECKOUT_WORKER_PROCESSES = 2
+CHECKOUT_WORKER_BATCH_SIZE = 10
+CHECKOUT_WORKER_POLL_INTERVAL = 1.0
+CHECKOUT_JOB_MAX_ATTEMPTS = 5
+# Jobs still running after this many seconds are assumed abandoned by their worker
+CHECKOUT_JOB_LEASE_SECONDS = 5 * 60
+
+# Orders older than this, in one of these statuses, are moved to the archive
+# tables by "manage.py archive_orders".
+ORDER_ARCHIVE_AFTER_DAYS = 365
+ORDER_ARCHIVE_STATUSES = ['delivered', 'cancelled', 'refunded']
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -97,13 +206,57 @@ WSGI_APPLICATION = 'Shop.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# The SQLite backend in Shop/sqlite adds Django 5.1's init_command and
+# transaction_mode options. WAL lets readers run alongside the writer, and
+# IMMEDIATE transactions take the write lock up front, so concurrent writers
+# wait up to `timeout` seconds instead of failing with "database is locked".
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'Shop.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode = WAL;'
+                'PRAGMA synchronous = NORMAL;'
+                'PRAGMA mmap_size = 268435456;'  # 256 MiB
+                'PRAGMA cache_size = -65536;'  # 64 MiB
+                'PRAGMA temp_store = MEMORY;'
+            ),
+        },
     }
 }
 
+# Read replica (see Shop/routers.py). Safe catalog and order history reads go to
+# it when enabled; `manage.py replicate_db` keeps the copy in sync locally.
+# Callers read from the primary for DATABASE_REPLICA_PIN_SECONDS after a write.
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': Path(os.environ.get('SHOP_REPLICA_DB', BASE_DIR / 'db-replica.sqlite3')),
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_ROUTERS = ['Shop.sharding.UserShardRouter', 'Shop.routers.PrimaryReplicaRouter']
+DATABASE_REPLICA_ENABLED = os.environ.get('SHOP_READ_REPLICA') == '1'
+DATABASE_REPLICA_ALIAS = 'replica'
+DATABASE_REPLICA_PIN_SECONDS = 5
+DATABASE_REPLICA_PIN_CACHE_ALIAS = 'default'
+
+# User shards (see Shop/sharding.py). With USER_SHARDING_ENABLED, addresses,
+# carts and orders live in the USER_SHARDS database chosen by a hash of their
+# user id. Run `manage.py reshard_users` after changing either setting.
+USER_SHARDS = [f'shard{index}' for index in range(int(os.environ.get('SHOP_USER_SHARDS', 2)))]
+for alias in USER_SHARDS:
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': BASE_DIR / f'db-{alias}.sqlite3'}
+USER_SHARDING_ENABLED = os.environ.get('SHOP_USER_SHARDING') == '1'
+
+# Retries of write transactions that still find the database locked (see Shop/transactions.py).
+DB_WRITE_RETRIES = 5
+DB_WRITE_RETRY_BACKOFF = 0.05  # seconds, doubled per retry
+DB_WRITE_RETRY_MAX_BACKOFF = 1.0
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -0,0 +1,209 @@
+import hashlib
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .routers import current_request
+
+"""
+This module places each user's addresses, cart and orders in one of several databases by a hash of the user id.
+"""
+
+# The per-user models; everything else, including users and the catalog, stays in the default database
+SHARDED_MODELS = ('Users.Address', 'Cart.CartItem', 'Order.Order', 'Order.OrderItem')
+# Ids of the rows created in shard N start at (N + 1) * SHARD_ID_SPACE, so they are unique across databases
+SHARD_ID_SPACE = 2 ** 40
+
+shard_user = ContextVar('shard_user', default=None)
+
+
+def get_user_shards():
+    return list(getattr(settings, 'USER_SHARDS', []))
+
+
+def sharding_enabled():
+    return getattr(settings, 'USER_SHARDING_ENABLED', False) and bool(get_user_shards())
+
+
+def is_sharded(model):
+    return model._meta.label in SHARDED_MODELS
+
+
+def sharded_models():
+    return [apps.get_model(label) for label in SHARDED_MODELS]
+
+
+def jump_hash(key, buckets):
+    """
+    Map a 64-bit key to one of ``buckets`` buckets with Lamping and Veach's jump consistent hash.
+
+    Going from N to N + 1 buckets only moves about 1 / (N + 1) of the keys, all into the new bucket.
+    """
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def get_user_shard(user_id):
+    """
+    Return the database alias holding a user's rows, or the default alias when sharding is off or the user unknown.
+    """
+    if user_id is None or not sharding_enabled():
+        return DEFAULT_DB_ALIAS
+    shards = get_user_shards()
+    key = int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=8).digest(), 'big')
+    return shards[jump_hash(key, len(shards))]
+
+
+def user_data_aliases():
+    """
+    Return every alias that may hold per-user rows: the default database, then the shards when sharding is on.
+    """
+    return [DEFAULT_DB_ALIAS] + (get_user_shards() if sharding_enabled() else [])
+
+
+@contextmanager
+def for_user(user_id):
+    """
+    Route the per-user queries run in this block to the shard of the given user.
+
+    Requests don't need this; the router takes the user from the current request.
+    """
+    token = shard_user.set(user_id)
+    try:
+        yield
+    finally:
+        shard_user.reset(token)
+
+
+def get_current_user_id():
+    user_id = shard_user.get()
+    if user_id is not None:
+        return user_id
+    request = current_request.get()
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.id
+    return None
+
+
+def user_atomic(user_id=None):
+    """
+    Return a context manager running a block in one transaction on the default database and one on the user's shard.
+
+    The two commit one after the other, so a failure between them can leave
+    the default database's part committed alone.
+
+    :param user_id: Defaults to the user of :func:`for_user` or of the current request.
+    """
+    stack = ExitStack()
+    shard = get_user_shard(user_id if user_id is not None else get_current_user_id())
+    for alias in dict.fromkeys([DEFAULT_DB_ALIAS, shard]):
+        stack.enter_context(transaction.atomic(using=alias))
+    return stack
+
+
+class UserShardRouter:
+    """
+    Database router sending the per-user models to the shard of their user when ``USER_SHARDING_ENABLED`` is set.
+
+    The user is taken from the instance hint, then from :func:`for_user`, then
+    from the authenticated user of the current request. Rows whose user is
+    unknown are left to the next router. Related global rows, such as a cart
+    item's product, are read from the default database.
+
+    Deletes do not cascade between databases: deleting a user or a product
+    leaves their rows in the shards.
+    """
+
+    def db_for_read(self, model, **hints):
+        return self.db_for_model(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_model(model, hints.get('instance'))
+
+    def db_for_model(self, model, instance):
+        if not sharding_enabled():
+            return None
+        if not is_sharded(model):
+            if instance is not None and instance._state.db in get_user_shards():
+                return DEFAULT_DB_ALIAS
+            return None
+
+        user_id = None
+        if instance is not None:
+            if is_sharded(type(instance)) and instance._state.db is not None:
+                return instance._state.db
+            if isinstance(instance, get_user_model()):
+                user_id = instance.pk
+            else:
+                user_id = getattr(instance, 'user_id', None)
+        if user_id is None:
+            user_id = get_current_user_id()
+        return get_user_shard(user_id) if user_id is not None else None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in get_user_shards():
+            return None
+        # Shards only hold the per-user tables, and skip data migrations
+        return model_name is not None and apps.get_model(app_label, model_name)._meta.label in SHARDED_MODELS
+
+
+def seed_shard_sequences(using, **kwargs):
+    """
+    Start the ids of each shard's tables in the shard's own range; connected to ``post_migrate``.
+
+    Only SQLite shards are seeded, through ``sqlite_sequence``.
+    """
+    shards = get_user_shards()
+    if using not in shards or connections[using].vendor != 'sqlite':
+        return
+    start = (shards.index(using) + 1) * SHARD_ID_SPACE
+    with connections[using].cursor() as cursor:
+        for model in sharded_models():
+            table = model._meta.db_table
+            cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s', [start, table, start])
+            cursor.execute('INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                           'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)', [table, start, table])
+
+
+def move_user_rows(user_id, source, target):
+    """
+    Move a user's addresses, cart and orders from one database to another, keeping their ids.
+
+    Runs in one transaction on each database. Rows already in the target are
+    kept, so an interrupted move can be run again. The user's writes should be
+    paused meanwhile.
+
+    :return: The number of rows moved per model label.
+    """
+    Address, CartItem, Order, OrderItem = sharded_models()
+    with transaction.atomic(using=target), transaction.atomic(using=source):
+        rows = {
+            Address: list(Address.objects.using(source).filter(user_id=user_id)),
+            Order: list(Order.objects.using(source).filter(user_id=user_id)),
+            OrderItem: list(OrderItem.objects.using(source).filter(order__user_id=user_id)),
+            CartItem: list(CartItem.objects.using(source).filter(user_id=user_id)),
+        }
+        order_dates = [(order, order.order_date) for order in rows[Order]]
+        for model, objects in rows.items():
+            model.objects.using(target).bulk_create(objects, ignore_conflicts=True)
+        # bulk_create stamps auto_now_add fields with the current time
+        for order, order_date in order_dates:
+            order.order_date = order_date
+        Order.objects.using(target).bulk_update(rows[Order], ['order_date'])
+
+        quote = connections[source].ops.quote_name
+        with connections[source].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {quote(OrderItem._meta.db_table)} WHERE order_id IN '
+                           f'(SELECT id FROM {quote(Order._meta.db_table)} WHERE user_id = %s)', [user_id])
+            for model in (CartItem, Order, Address):
+                cursor.execute(f'DELETE FROM {quote(model._meta.db_table)} WHERE user_id = %s', [user_id])
+    return {model._meta.label: len(objects) for model, objects in rows.items()}
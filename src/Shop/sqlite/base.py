@@ -0,0 +1,49 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+"""
+This module contains the SQLite backend of the shop, tuned for concurrent writers.
+"""
+
+TRANSACTION_MODES = {'DEFERRED', 'EXCLUSIVE', 'IMMEDIATE'}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Django's SQLite backend with the ``init_command`` and ``transaction_mode`` options of Django 5.1.
+
+    ``init_command`` holds ``;``-separated statements run on every new
+    connection, such as the journal mode and cache size pragmas.
+    ``transaction_mode`` is the ``BEGIN`` variant used by ``atomic``; with
+    ``IMMEDIATE`` a transaction takes the write lock when it starts, so a
+    concurrent writer waits for the busy timeout instead of failing with
+    "database is locked" when its read lock cannot be upgraded.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.transaction_mode = (options.get('transaction_mode') or '').upper() or None
+        if self.transaction_mode is not None and self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"settings.DATABASES['{self.alias}']['OPTIONS']['transaction_mode'] "
+                                       f"must be one of {', '.join(sorted(TRANSACTION_MODES))}, or None.")
+        self.init_commands = [command.strip() for command in options.get('init_command', '').split(';')
+                              if command.strip()]
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('transaction_mode', None)
+        params.pop('init_command', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for command in self.init_commands:
+            conn.execute(command)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,114 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+"""
+This module provides token-bucket throttling backed by the shared cache.
+"""
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+def parse_bucket(bucket):
+    """
+    Turn a ``THROTTLE_BUCKETS`` entry into its capacity and the milliseconds needed to refill one token.
+
+    :param bucket: A dict with ``capacity``, the largest allowed burst, and ``rate``,
+        the refill rate written as ``'<tokens>/<period>'``, e.g. ``'10/min'``.
+    :return: A ``(capacity, interval_ms)`` tuple.
+    """
+    tokens, period = bucket['rate'].split('/')
+    interval_ms = PERIODS[period[0]] * 1000 // int(tokens)
+    return int(bucket['capacity']), max(1, interval_ms)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    A token-bucket throttle whose state is a single integer in the shared cache.
+
+    The view's ``throttle_scope`` selects a bucket from ``THROTTLE_BUCKETS``; views
+    without a scope are not throttled. Each bucket stores its theoretical arrival
+    time (TAT): the moment, in milliseconds, at which it will be full again. A
+    request atomically adds one refill interval with ``cache.incr`` and is allowed
+    when the result is at most ``capacity`` intervals ahead of now, then extends
+    the key's expiry with ``cache.touch``. The common case therefore costs two
+    cache operations, and only the ``incr`` is atomic: a concurrent request may
+    run between the two, which at worst extends the expiry twice. A bucket
+    that has been idle long enough to be full is reset with a ``set``. A rejected
+    request gives its token back and extends the key's expiry too: the key always
+    outlives its TAT, so neither a client pacing itself at the refill rate nor one
+    that keeps hammering sees its bucket come back full early.
+
+    Subclasses define who shares a bucket by implementing :meth:`get_ident_key`.
+    """
+    cache_alias = None
+
+    def __init__(self):
+        self.cache = caches[self.cache_alias or getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+        self.wait_ms = 0
+
+    def get_ident_key(self, request, view):
+        raise NotImplementedError('.get_ident_key() must be overridden')
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return True
+        buckets = getattr(settings, 'THROTTLE_BUCKETS', {})
+        if scope not in buckets:
+            raise ImproperlyConfigured(f"No throttle bucket configured for scope '{scope}'.")
+        capacity, interval = parse_bucket(buckets[scope])
+        key = f'throttle:{scope}:{self.get_ident_key(request, view)}'
+        now = int(time.time() * 1000)
+        timeout = capacity * interval // 1000 + 1
+
+        try:
+            tat = self.cache.incr(key, interval)
+        except ValueError:
+            # No bucket yet; if a concurrent request created it first, count against it
+            if self.cache.add(key, now + interval, timeout):
+                return True
+            tat = self.cache.incr(key, interval)
+
+        if tat - interval < now:
+            # The bucket had refilled completely while idle
+            self.cache.set(key, now + interval, timeout)
+            return True
+        if tat - now <= capacity * interval:
+            # incr keeps the expiry set when the key was created, which the TAT may have passed
+            self.cache.touch(key, timeout)
+            return True
+
+        self.cache.decr(key, interval)
+        self.cache.touch(key, timeout)
+        self.wait_ms = tat - now - capacity * interval
+        return False
+
+    def wait(self):
+        return self.wait_ms / 1000
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Token-bucket throttle with one bucket per client IP address.
+    """
+
+    def get_ident_key(self, request, view):
+        return f'ip:{self.get_ident(request)}'
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Token-bucket throttle with one bucket per authenticated user, falling back to the client IP address.
+
+    Like every :class:`TokenBucketThrottle`, an allowed request updates the bucket
+    with ``incr`` and then ``touch``: two cache operations, not one atomic one.
+    """
+
+    def get_ident_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
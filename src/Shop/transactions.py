@@ -0,0 +1,71 @@
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+from .metrics import db_write_retries
+from .sharding import get_current_user_id, get_user_shard, user_atomic
+
+"""
+This module retries write transactions that lost a race for the database lock.
+"""
+
+logger = logging.getLogger(__name__)
+
+LOCK_ERRORS = ('database is locked', 'database table is locked')
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and any(message in str(exc) for message in LOCK_ERRORS)
+
+
+def retry_write_transaction(func=None, *, using=None, user_shard=False):
+    """
+    Run the decorated function in ``transaction.atomic`` and retry it when the database is locked.
+
+    Without ``using``, the transaction covers the default database and the
+    current user's shard, as :func:`~Shop.sharding.user_atomic` does. With
+    ``user_shard``, it only covers the current user's shard, for functions
+    writing nothing but per-user rows, which then never wait for the default
+    database's write lock.
+
+    Retries wait an exponential backoff with full jitter, starting at
+    ``DB_WRITE_RETRY_BACKOFF`` seconds and capped at ``DB_WRITE_RETRY_MAX_BACKOFF``,
+    for at most ``DB_WRITE_RETRIES`` retries. Inside an outer transaction the
+    function runs once, since only the outermost block can be retried.
+    """
+    if func is None:
+        return functools.partial(retry_write_transaction, using=using, user_shard=user_shard)
+
+    def atomic():
+        if using is not None:
+            return transaction.atomic(using=using)
+        if user_shard:
+            return transaction.atomic(using=get_user_shard(get_current_user_id()))
+        return user_atomic()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if any(connection.in_atomic_block for connection in connections.all(initialized_only=True)):
+            with atomic():
+                return func(*args, **kwargs)
+
+        retries = getattr(settings, 'DB_WRITE_RETRIES', 5)
+        backoff = getattr(settings, 'DB_WRITE_RETRY_BACKOFF', 0.05)
+        max_backoff = getattr(settings, 'DB_WRITE_RETRY_MAX_BACKOFF', 1.0)
+        for attempt in range(retries + 1):
+            try:
+                with atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as exc:
+                if attempt == retries or not is_lock_error(exc):
+                    raise
+                db_write_retries.labels(func.__qualname__).inc()
+                delay = random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+                logger.info("Retrying %s in %.3fs: %s", func.__qualname__, delay, exc)
+                time.sleep(delay)
+
+    return wrapper
@@ -17,10 +17,16 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .views import MetricsView, ProfileReportView, ProfileTokenView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('api/products/', include('Product.urls')),
     path('api/users/', include('Users.urls')),
     path('api/cart/', include('Cart.urls')),
     path('api/order/', include('Order.urls')),
+    path('api/reviews/', include('Review.urls')),
+    path('api/profiling/', ProfileReportView.as_view(), name='profiling-report'),
+    path('api/profiling/token/', ProfileTokenView.as_view(), name='profiling-token'),
 ]
@@ -0,0 +1,161 @@
+import hmac
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .authentication import CachedJWTAuthentication
+from .metrics import CONTENT_TYPE, registry
+from .profiling import aggregate_profiles, make_profile_token
+from .renderers import ORJSONRenderer
+
+"""
+This module contains the base class for the API's native async views, and the monitoring endpoints.
+"""
+
+
+class AsyncAPIView(View):
+    """
+    A minimal async counterpart of DRF's ``APIView`` for endpoints that must not block a worker.
+
+    Handlers are ``async def`` methods. Requests are authenticated with
+    ``authentication_classes``, required when ``authentication_required`` is set,
+    then throttled like DRF views, and DRF ``APIException``\\ s raised by a handler
+    are rendered the same way DRF renders them. The query string is also exposed
+    as ``request.query_params``, so DRF filters and paginators can be reused.
+    """
+    authentication_classes = [CachedJWTAuthentication]
+    authentication_required = False
+    throttle_classes = []
+    throttle_scope = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token authenticated, like the DRF views
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.query_params = request.GET
+        try:
+            request.user = await self.authenticate(request)
+            self.check_throttles(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    async def authenticate(self, request):
+        """
+        Return the user of the request's bearer token, or an anonymous user when authentication is optional.
+
+        :raise NotAuthenticated: If authentication is required and no token was sent.
+        """
+        for authentication_class in self.authentication_classes:
+            result = await sync_to_async(authentication_class().authenticate)(request)
+            if result is not None:
+                return result[0]
+        if self.authentication_required:
+            raise exceptions.NotAuthenticated()
+        return AnonymousUser()
+
+    def check_throttles(self, request):
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not throttle.allow_request(request, self):
+                raise exceptions.Throttled(throttle.wait())
+
+    def parse_json(self, request):
+        """
+        Return the request body decoded as a JSON object.
+
+        :raise ParseError: If the body is not a JSON object.
+        """
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError as exc:
+            raise exceptions.ParseError(f'JSON parse error - {exc}')
+        if not isinstance(data, dict):
+            raise exceptions.ParseError('Expected a JSON object.')
+        return data
+
+    async def render(self, build, status_code=status.HTTP_200_OK):
+        """
+        Call ``build`` and return its result as a JSON response, encoded like DRF's JSON renderer.
+
+        Serializing a page of objects is CPU-bound, so ``build`` and the encoding run
+        in a worker thread instead of holding up the other requests on the event loop.
+        ``build`` must not query the database; load what it reads beforehand.
+
+        :param build: A callable returning the response data, typically a serializer's ``data``.
+        """
+        content = await sync_to_async(self.encode, thread_sensitive=False)(build)
+        return HttpResponse(content, status=status_code, content_type='application/json')
+
+    @staticmethod
+    def encode(build):
+        return ORJSONRenderer().render(build())
+
+    def handle_exception(self, exc):
+        headers = {}
+        status_code = exc.status_code
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            status_code = status.HTTP_401_UNAUTHORIZED
+            headers['WWW-Authenticate'] = 'Bearer realm="api"'
+        if getattr(exc, 'wait', None):
+            headers['Retry-After'] = '%d' % exc.wait
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        return JsonResponse(data, status=status_code, headers=headers, safe=False)
+
+
+class ProfileReportView(APIView):
+    """
+    Staff-only hottest frames per view across the stored request profiles.
+
+    ``?view=`` restricts the report to one view name, ``?limit=`` sets the frames listed per view.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 100))
+        except ValueError:
+            raise exceptions.ValidationError({'limit': 'Enter a whole number.'})
+        return Response(aggregate_profiles(view=request.query_params.get('view'), limit=limit))
+
+
+class ProfileTokenView(APIView):
+    """
+    Staff-only endpoint issuing a signed ``X-Profile`` header value; requests carrying it are always profiled.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        return Response({
+            'header': 'X-Profile',
+            'token': make_profile_token(request.user),
+            'expires_in': getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 60 * 60),
+        }, status=status.HTTP_201_CREATED)
+
+
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint for the metrics of all worker processes.
+
+    Reading the metrics takes no lock the request workers use. When
+    ``METRICS_TOKEN`` is set, scrapers must send it as a bearer token.
+    """
+
+    def get(self, request):
+        token = getattr(settings, 'METRICS_TOKEN', None)
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            response = HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+            response['WWW-Authenticate'] = 'Bearer realm="metrics"'
+            return response
+        return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Users'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from Shop.querystats import install_query_recorder
+        from Shop.sharding import seed_shard_sequences
+        post_migrate.connect(seed_shard_sequences, dispatch_uid='seed_shard_sequences')
+        connection_created.connect(install_query_recorder, dispatch_uid='install_query_recorder')
@@ -0,0 +1,94 @@
+import asyncio
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+from Users.models import User
+
+USERNAME_PREFIX = 'loadtest-'
+PASSWORD = 'L0adTest!Passw0rd'
+
+
+class Command(BaseCommand):
+    help = ('Measure catalog latency while a burst of signups is running, '
+            'through the regular and the async registration views.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=16, help='Registrations in each burst.')
+        parser.add_argument('--catalog-clients', type=int, default=4, help='Concurrent catalog readers.')
+        parser.add_argument('--catalog-requests', type=int, default=50,
+                            help='Catalog requests sent by each reader.')
+
+    def handle(self, *args, **options):
+        # Requests are served in-process through the ASGI handler, where sync views
+        # share one thread, as on a single worker.
+        unthrottled = {scope: {'capacity': 10 ** 6, 'rate': '1000/s'} for scope in settings.THROTTLE_BUCKETS}
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        try:
+            with override_settings(THROTTLE_BUCKETS=unthrottled, ALLOWED_HOSTS=['testserver']):
+                results = asyncio.run(self.run_phases(options))
+        finally:
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        self.stdout.write(f"{'scenario':<24}{'p50 ms':>10}{'p99 ms':>10}{'signups s':>12}")
+        for name, latencies, signup_time in results:
+            p50, p99 = self.percentiles(latencies)
+            signups = f'{signup_time:.2f}' if signup_time is not None else '-'
+            self.stdout.write(f'{name:<24}{p50:>10.1f}{p99:>10.1f}{signups:>12}')
+
+    async def run_phases(self, options):
+        return [
+            ('catalog only', *await self.run_phase(None, 'idle', options)),
+            ('sync signup burst', *await self.run_phase(reverse('customer_registration'), 'sync', options)),
+            ('async signup burst', *await self.run_phase(reverse('async_customer_registration'), 'async', options)),
+        ]
+
+    async def run_phase(self, signup_url, phase, options):
+        """
+        Read the catalog from several clients while, if ``signup_url`` is set, a burst of registrations runs.
+
+        :return: The catalog latencies in milliseconds and the duration of the signup burst.
+        """
+        client = AsyncClient()
+        catalog_url = reverse('product-list')
+        latencies = []
+
+        async def read_catalog():
+            for _ in range(options['catalog_requests']):
+                started = time.perf_counter()
+                response = await client.get(catalog_url)
+                if response.status_code != 200:
+                    raise RuntimeError(f'Catalog request failed with {response.status_code}')
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        async def signup(i):
+            username = f'{USERNAME_PREFIX}{phase}-{i}'
+            response = await client.post(signup_url, {
+                'username': username,
+                'email': f'{username}@example.com',
+                'password': PASSWORD,
+                'password_confirmation': PASSWORD,
+            }, content_type='application/json')
+            if response.status_code != 201:
+                raise RuntimeError(f'Signup failed with {response.status_code}: {response.content[:200]}')
+
+        async def signup_burst():
+            started = time.perf_counter()
+            await asyncio.gather(*(signup(i) for i in range(options['signups'])))
+            return time.perf_counter() - started
+
+        readers = [read_catalog() for _ in range(options['catalog_clients'])]
+        if signup_url is None:
+            await asyncio.gather(*readers)
+            return latencies, None
+        signup_time, *_ = await asyncio.gather(signup_burst(), *readers)
+        return latencies, signup_time
+
+    @staticmethod
+    def percentiles(latencies):
+        cuts = statistics.quantiles(latencies, n=100)
+        return cuts[49], cuts[98]
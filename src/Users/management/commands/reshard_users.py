@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from Shop.sharding import get_user_shard, get_user_shards, move_user_rows, sharded_models, sharding_enabled
+
+
+class Command(BaseCommand):
+    help = ("Move each user's addresses, cart and orders into the shard their id hashes to. "
+            "Run after enabling sharding or changing USER_SHARDS; pause checkouts meanwhile.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='sources', action='append', default=[],
+                            help='Also move rows out of this database alias, e.g. a retired shard. Repeatable.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many users would be moved.')
+
+    def handle(self, *args, **options):
+        if not sharding_enabled():
+            raise CommandError('User sharding is disabled; set USER_SHARDING_ENABLED and USER_SHARDS.')
+        unknown = [alias for alias in options['sources'] if alias not in settings.DATABASES]
+        if unknown:
+            raise CommandError(f"Unknown database alias(es): {', '.join(unknown)}.")
+
+        moved_users = 0
+        moved_rows = 0
+        for source in dict.fromkeys([DEFAULT_DB_ALIAS, *get_user_shards(), *options['sources']]):
+            for user_id in sorted(self.user_ids(source)):
+                target = get_user_shard(user_id)
+                if target == source:
+                    continue
+                moved_users += 1
+                if not options['dry_run']:
+                    moved_rows += sum(move_user_rows(user_id, source, target).values())
+
+        if options['dry_run']:
+            self.stdout.write(f'{moved_users} users would be moved.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Moved {moved_rows} rows of {moved_users} users.'))
+
+    @staticmethod
+    def user_ids(alias):
+        """
+        Return the ids of the users with any rows in the given database.
+        """
+        user_ids = set()
+        # Order items follow their order, so only the models with a user are scanned
+        for model in sharded_models():
+            if any(field.name == 'user' for field in model._meta.fields):
+                user_ids.update(model.objects.using(alias).order_by().values_list('user_id', flat=True).distinct())
+        return user_ids
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-19 10:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='address',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='addresses', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
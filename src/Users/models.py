@@ -27,7 +27,22 @@ class Address(models.Model):
     state = models.CharField(max_length=100)
     zip_code = models.CharField(max_length=20)
     country = models.CharField(max_length=100)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='addresses')
+    # Unconstrained so addresses can live in a user shard (see Shop/sharding.py)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='addresses',
+                             db_constraint=False)
 
     def __str__(self):
         return f"{self.address_line}, {self.city}, {self.state}, {self.country}"
+
+
+class RevokedToken(models.Model):
+    """
+    A revoked JWT, kept only until the token would have expired anyway.
+
+    Read through the per-process Bloom filter in :mod:`Users.revocation`.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
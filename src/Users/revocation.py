@@ -0,0 +1,139 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import RevokedToken
+
+"""
+This module keeps track of revoked JWTs with a per-process Bloom filter over the RevokedToken table.
+"""
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter of strings.
+
+    Sized for ``capacity`` items at the given false positive rate; it never has
+    false negatives.
+    """
+
+    def __init__(self, capacity, false_positive_rate):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item):
+        # Double hashing: the i-th position is h1 + i * h2
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class RevokedTokenStore:
+    """
+    Answers "is this token revoked?" without a database query for tokens that are not.
+
+    Each process keeps a Bloom filter of the revoked JTIs. New rows are pulled
+    into it every ``JWT_REVOCATION_SYNC_INTERVAL`` seconds, so a token revoked
+    by another process is honoured here within that delay. Tokens revoked by
+    this process are honoured immediately. A JTI found in the filter is
+    confirmed in the table, so a false positive costs one indexed lookup and
+    never rejects a valid token.
+
+    Every ``JWT_REVOCATION_REBUILD_INTERVAL`` seconds, rows for expired tokens
+    are deleted and the filter is rebuilt from the rows that remain. This keeps
+    the filter from filling up.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.last_id = 0
+        self.synced_at = None
+        self.built_at = None
+
+    def is_revoked(self, jti):
+        """
+        Return whether the token with this JTI has been revoked.
+        """
+        if jti is None:
+            return False
+        self.refresh()
+        if jti not in self.filter:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, token):
+        """
+        Revoke a validated simplejwt token until it expires.
+        """
+        jti = token[api_settings.JTI_CLAIM]
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=jti, expires_at=datetime_from_epoch(token['exp']))],
+            ignore_conflicts=True,
+        )
+        self.refresh()
+        with self.lock:
+            self.filter.add(jti)
+
+    def refresh(self):
+        """
+        Rebuild the filter or pull new revocations into it when they are due.
+        """
+        now = time.monotonic()
+        if not self.sync_due(now):
+            return
+        with self.lock:
+            if not self.sync_due(now):
+                return
+            if self.filter is None or now - self.built_at >= getattr(settings, 'JWT_REVOCATION_REBUILD_INTERVAL', 3600):
+                self.rebuild()
+                self.built_at = now
+            else:
+                self.sync()
+            self.synced_at = now
+
+    def sync_due(self, now):
+        return self.filter is None or now - self.synced_at >= getattr(settings, 'JWT_REVOCATION_SYNC_INTERVAL', 5)
+
+    def rebuild(self):
+        RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        rows = list(RevokedToken.objects.order_by('id').values_list('id', 'jti'))
+        bloom = BloomFilter(
+            capacity=max(getattr(settings, 'JWT_REVOCATION_CAPACITY', 100000), 2 * len(rows)),
+            false_positive_rate=getattr(settings, 'JWT_REVOCATION_FALSE_POSITIVE_RATE', 0.001),
+        )
+        for _, jti in rows:
+            bloom.add(jti)
+        self.filter = bloom
+        self.last_id = rows[-1][0] if rows else 0
+
+    def sync(self):
+        for row_id, jti in RevokedToken.objects.filter(id__gt=self.last_id).order_by('id').values_list('id', 'jti'):
+            self.filter.add(jti)
+            self.last_id = row_id
+
+    def reset(self):
+        """
+        Forget the filter, so that the next check rebuilds it.
+        """
+        with self.lock:
+            self.filter = None
+
+
+revoked_tokens = RevokedTokenStore()
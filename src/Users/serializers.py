@@ -2,7 +2,12 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from .models import Address
+from .revocation import revoked_tokens
 
 """
 This file creates the Serializers for the Users Models.
@@ -54,11 +59,24 @@ class CustomerRegistrationSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """
             Create a new user.
+
+            Pass ``password_hash`` to ``save()`` to store an already computed hash
+            instead of hashing the password here.
             :param validated_data: Validated user data.
             :return: The created user instance.
         """
         validated_data.pop('password_confirmation')
-        user = User.objects.create_user(**validated_data)
+        password_hash = validated_data.pop('password_hash', None)
+        if password_hash is None:
+            return User.objects.create_user(**validated_data)
+        validated_data.pop('password')
+        user = User(
+            username=User.normalize_username(validated_data.pop('username')),
+            email=User.objects.normalize_email(validated_data.pop('email', '')),
+            password=password_hash,
+            **validated_data
+        )
+        user.save()
         return user
 
 
@@ -66,3 +84,47 @@ class AddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Address
         fields = ['id', 'address_line', 'city', 'state', 'zip_code', 'country']
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Token refresh serializer that refuses revoked refresh tokens.
+
+    With ``ROTATE_REFRESH_TOKENS`` and ``BLACKLIST_AFTER_ROTATION`` set, the
+    refresh token that was used is revoked once it has been rotated.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if revoked_tokens.is_revoked(refresh.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken("Token has been revoked")
+        data = super().validate(attrs)
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            revoked_tokens.revoke(refresh)
+        return data
+
+
+class LogoutSerializer(serializers.Serializer):
+    """
+    Serializer for logging out.
+
+    Attributes:
+        refresh: The refresh token to revoke.
+    """
+    refresh = serializers.CharField()
+
+    def validate_refresh(self, value):
+        """
+            Validate the refresh token.
+
+            :param value: The encoded refresh token.
+            :return: The decoded token.
+            :raise serializers.ValidationError: If the token is invalid or belongs to another user.
+        """
+        try:
+            token = RefreshToken(value)
+        except TokenError as e:
+            raise serializers.ValidationError(str(e))
+        if str(token.get(api_settings.USER_ID_CLAIM)) != str(self.context['request'].user.pk):
+            raise serializers.ValidationError("Token does not belong to the authenticated user.")
+        return token
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Shop.authentication import invalidate_cached_user
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_authenticated_user(sender, instance, **kwargs):
+    """
+    Drop the user from the JWT authentication caches whenever it changes, e.g. on a
+    password change or deactivation.
+    """
+    invalidate_cached_user(instance.pk)
@@ -1,12 +1,26 @@
-from django.test import TestCase
-from .models import User, Address
+import time
+from unittest import mock
+
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from .models import User, Address, RevokedToken
+from .revocation import BloomFilter, revoked_tokens
 from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
 from rest_framework.exceptions import ValidationError
 from .serializers import CustomerRegistrationSerializer
 from django.urls import reverse
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient, APIRequestFactory
 from rest_framework import status
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.cache import cache
+from Shop.authentication import local_users, USER_CACHE_KEY
+from Shop.hashing import PasswordHasherPool
+from Shop.throttling import IPTokenBucketThrottle
+from .views import ThrottledTokenObtainPairView
 
 
 class UserAddressModelTest(TestCase):
@@ -197,3 +211,405 @@ class TokenViewTest(APITestCase):
         response_refresh = self.client.post(url_refresh, data_refresh, format='json')
         self.assertEqual(response_refresh.status_code, status.HTTP_200_OK)
         self.assertIn('access', response_refresh.data)
+
+
+@override_settings(JWT_REVOCATION_SYNC_INTERVAL=3600)
+class CachedJWTAuthenticationTest(APITestCase):
+    """
+    Test case for the cached JWT user resolution.
+    """
+
+    def setUp(self):
+        local_users.clear()
+        cache.clear()
+        revoked_tokens.reset()
+        revoked_tokens.refresh()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com',
+                                             password='password123')
+        self.address_url = reverse('address-list-create')
+        self.authenticate(self.user)
+
+    def tearDown(self):
+        local_users.clear()
+        cache.clear()
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def test_user_is_loaded_once(self):
+        # user lookup, addresses
+        with self.assertNumQueries(2):
+            self.client.get(self.address_url)
+        # addresses only
+        with self.assertNumQueries(1):
+            response = self.client.get(self.address_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_shared_cache_is_used_when_local_entry_is_missing(self):
+        self.client.get(self.address_url)
+        local_users.clear()
+        with self.assertNumQueries(1):
+            self.client.get(self.address_url)
+
+    def test_deactivation_invalidates_cache(self):
+        self.client.get(self.address_url)
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(self.address_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_invalidates_cache(self):
+        self.client.get(self.address_url)
+        response = self.client.put(reverse('change_password'), {'new_password': 'N3wP@ssw0rd!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        cached = cache.get(USER_CACHE_KEY.format(self.user.id))
+        self.assertIsNone(cached)
+        self.assertIsNone(local_users.get(self.user.id))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('N3wP@ssw0rd!'))
+        self.assertEqual(self.user.username, 'testuser')
+
+    def test_cache_holds_no_password_hash(self):
+        self.client.get(self.address_url)
+
+        cached = cache.get(USER_CACHE_KEY.format(self.user.id))
+        self.assertEqual(cached['username'], 'testuser')
+        self.assertNotIn('password', cached)
+        self.assertNotIn(self.user.password, cached.values())
+
+    def test_token_user_mode_runs_no_user_query(self):
+        self.client.get(self.address_url)
+        # orders only; the order list resolves the user from the token and the cached state
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_token_user_mode_rejects_deactivated_users(self):
+        self.client.get(reverse('order-list'))
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TokenBucketThrottleTest(APITestCase):
+    """
+    Test case for the token-bucket throttling of the auth endpoints.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com',
+                                             password='password123')
+        self.url = reverse('token_obtain_pair')
+        self.credentials = {'username': 'testuser', 'password': 'wrong-password'}
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_burst_above_capacity_is_rejected(self):
+        for _ in range(10):
+            response = self.client.post(self.url, self.credentials, format='json')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(self.url, self.credentials, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    def test_bucket_refills_over_time(self):
+        now = time.time()
+        with mock.patch('Shop.throttling.time.time', return_value=now):
+            for _ in range(11):
+                response = self.client.post(self.url, self.credentials, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # '10/min' gives a token back every six seconds
+        with mock.patch('Shop.throttling.time.time', return_value=now + 6):
+            response = self.client.post(self.url, self.credentials, format='json')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self.client.post(self.url, self.credentials, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_paced_requests_do_not_let_the_bucket_expire(self):
+        throttle = IPTokenBucketThrottle()
+        view = ThrottledTokenObtainPairView()
+        request = APIRequestFactory().post(self.url)
+        now = time.time()
+
+        def allowed(at, count=1):
+            with mock.patch('Shop.throttling.time.time', return_value=now + at):
+                return sum(throttle.allow_request(request, view) for _ in range(count))
+
+        with self.settings(THROTTLE_BUCKETS={'login': {'capacity': 5, 'rate': '10/m'}}):
+            self.assertEqual(allowed(0, 5), 5)
+            # One request per refill interval, past the expiry the key was created with
+            for at in range(6, 31, 6):
+                self.assertEqual(allowed(at), 1)
+            self.assertLessEqual(allowed(32, 5), 1)
+
+    def test_buckets_are_per_ip(self):
+        for _ in range(11):
+            self.client.post(self.url, self.credentials, format='json', REMOTE_ADDR='10.0.0.1')
+
+        response = self.client.post(self.url, self.credentials, format='json', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_throttle_cache_round_trips(self):
+        """
+        A throttle check costs a fixed number of cache operations per request.
+        """
+        throttle = IPTokenBucketThrottle()
+        view = ThrottledTokenObtainPairView()
+        request = APIRequestFactory().post(self.url)
+        throttle.cache = RecordingCache(throttle.cache)
+
+        def check():
+            throttle.cache.operations.clear()
+            allowed = throttle.allow_request(request, view)
+            return allowed, list(throttle.cache.operations)
+
+        with self.settings(THROTTLE_BUCKETS={'login': {'capacity': 2, 'rate': '1/m'}}):
+            # A new bucket: the failed incr, then add
+            self.assertEqual(check(), (True, ['incr', 'add']))
+            self.assertEqual(check(), (True, ['incr', 'touch']))
+            # A rejected request gives its token back
+            self.assertEqual(check(), (False, ['incr', 'decr', 'touch']))
+
+
+class RecordingCache:
+    """
+    Wraps a cache, recording the names of the operations called on it.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.operations = []
+
+    def __getattr__(self, name):
+        method = getattr(self.cache, name)
+
+        def record(*args, **kwargs):
+            self.operations.append(name)
+            return method(*args, **kwargs)
+        return record
+
+
+class AsyncAuthViewsTest(APITestCase):
+    """
+    Test case for the async registration, token and password change views.
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com',
+                                             password='password123')
+
+    def tearDown(self):
+        cache.clear()
+        local_users.clear()
+
+    def test_register_user(self):
+        data = {
+            'username': 'newuser',
+            'email': 'newuser@example.com',
+            'password': 'Str0ngP@ssw0rd!',
+            'password_confirmation': 'Str0ngP@ssw0rd!',
+        }
+        response = self.client.post(reverse('async_customer_registration'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['user']['username'], 'newuser')
+        self.assertIn('access', response.json()['token'])
+        self.assertTrue(User.objects.get(username='newuser').check_password('Str0ngP@ssw0rd!'))
+
+    def test_register_user_invalid_data(self):
+        data = {
+            'username': 'testuser',
+            'email': 'other@example.com',
+            'password': 'Str0ngP@ssw0rd!',
+            'password_confirmation': 'Str0ngP@ssw0rd!',
+        }
+        response = self.client.post(reverse('async_customer_registration'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('username', response.json())
+
+    def test_change_password(self):
+        url = reverse('async_change_password')
+        response = self.client.put(url, {'new_password': 'N3wP@ssw0rd!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        response = self.client.put(url, {'new_password': 'N3wP@ssw0rd!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('N3wP@ssw0rd!'))
+
+
+class AsyncTokenObtainViewTest(APITransactionTestCase):
+    """
+    Test case for the async token view, which authenticates users in the hashing pool's threads.
+
+    Those threads use their own database connections, so the test data must be committed.
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com',
+                                             password='password123')
+
+    def tearDown(self):
+        cache.clear()
+        local_users.clear()
+
+    def test_token_obtain(self):
+        url = reverse('async_token_obtain_pair')
+        response = self.client.post(url, {'username': 'testuser', 'password': 'password123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('refresh', response.json())
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        self.assertEqual(self.client.get(reverse('address-list-create')).status_code, status.HTTP_200_OK)
+
+    def test_token_obtain_invalid_credentials(self):
+        url = reverse('async_token_obtain_pair')
+        for username in ('testuser', 'nobody'):
+            response = self.client.post(url, {'username': username, 'password': 'wrong'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(response.json()['detail'], 'No active account found with the given credentials')
+
+        response = self.client.post(url, {'username': 'testuser'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_failed_login_sends_signal(self):
+        failures = []
+        handler = lambda sender, credentials, **kwargs: failures.append(credentials)
+        user_login_failed.connect(handler)
+        self.addCleanup(user_login_failed.disconnect, handler)
+
+        response = self.client.post(reverse('async_token_obtain_pair'),
+                                    {'username': 'testuser', 'password': 'wrong'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0]['username'], 'testuser')
+
+    def test_inactive_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post(reverse('async_token_obtain_pair'),
+                                    {'username': 'testuser', 'password': 'password123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_is_rehashed_with_upgraded_hasher(self):
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']):
+            self.user.set_password('password123')
+            self.user.save()
+
+        response = self.client.post(reverse('async_token_obtain_pair'),
+                                    {'username': 'testuser', 'password': 'password123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+    def test_full_hashing_pool_is_rejected(self):
+        pool = PasswordHasherPool(workers=1, queue_size=0)
+        pool.slots.acquire()
+        with mock.patch('Shop.hashing.get_hasher_pool', return_value=pool):
+            response = self.client.post(reverse('async_token_obtain_pair'),
+                                        {'username': 'testuser', 'password': 'password123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class BloomFilterTest(TestCase):
+    """
+    Test case for the Bloom filter behind the revoked token store.
+    """
+
+    def test_added_items_are_found(self):
+        bloom = BloomFilter(capacity=1000, false_positive_rate=0.01)
+        items = [f'jti-{i}' for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, false_positive_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+@override_settings(JWT_REVOCATION_SYNC_INTERVAL=3600)
+class TokenRevocationTest(APITestCase):
+    """
+    Test case for logout and the revoked token store.
+    """
+
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        revoked_tokens.reset()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com',
+                                             password='password123')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def tearDown(self):
+        cache.clear()
+        revoked_tokens.reset()
+
+    def logout(self):
+        return self.client.post(reverse('logout'), {'refresh': str(self.refresh)}, format='json')
+
+    def test_logout_revokes_refresh_and_access_tokens(self):
+        response = self.logout()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+        response = self.client.get(reverse('address-list-create'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials()
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_with_another_users_token(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='password123')
+        response = self.client.post(reverse('logout'), {'refresh': str(RefreshToken.for_user(other))},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(RevokedToken.objects.exists())
+
+    def test_valid_tokens_are_checked_without_queries(self):
+        revoked_tokens.refresh()
+        with self.assertNumQueries(0):
+            self.assertFalse(revoked_tokens.is_revoked(self.refresh['jti']))
+
+    def test_revocations_from_other_processes_are_synced(self):
+        revoked_tokens.refresh()
+        RevokedToken.objects.create(jti=self.refresh['jti'], expires_at=timezone.now() + timedelta(days=1))
+        self.assertFalse(revoked_tokens.is_revoked(self.refresh['jti']))
+
+        with self.settings(JWT_REVOCATION_SYNC_INTERVAL=0):
+            self.assertTrue(revoked_tokens.is_revoked(self.refresh['jti']))
+
+    def test_expired_revocations_are_pruned(self):
+        RevokedToken.objects.create(jti='expired', expires_at=timezone.now() - timedelta(seconds=1))
+        RevokedToken.objects.create(jti='active', expires_at=timezone.now() + timedelta(days=1))
+        revoked_tokens.refresh()
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['active'])
+        self.assertTrue(revoked_tokens.is_revoked('active'))
+
+    def test_rotated_refresh_token_is_revoked(self):
+        self.client.credentials()
+        with mock.patch.object(jwt_settings, 'ROTATE_REFRESH_TOKENS', True):
+            response = self.client.post(reverse('token_refresh'), {'refresh': str(self.refresh)}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('refresh', response.json())
+
+            response = self.client.post(reverse('token_refresh'), {'refresh': str(self.refresh)}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
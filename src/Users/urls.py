@@ -1,9 +1,15 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import SimpleRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     CustomerRegistrationView,
+    ChangePasswordView,
+    ThrottledTokenObtainPairView,
+    LogoutView,
+    AsyncCustomerRegistrationView,
+    AsyncTokenObtainPairView,
+    AsyncChangePasswordView,
     api_root,
     AddressListCreateView,
     AddressDetailView
@@ -19,9 +25,14 @@ This module configures the URL routing for the API.
 # Define URL patterns
 urlpatterns = [
     path('', api_root, name='api_root'),
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('token/', ThrottledTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('logout/', LogoutView.as_view(), name='logout'),
     path('registration/', CustomerRegistrationView.as_view(), name='customer_registration'),
+    path('password/change/', ChangePasswordView.as_view(), name='change_password'),
+    path('async/token/', AsyncTokenObtainPairView.as_view(), name='async_token_obtain_pair'),
+    path('async/registration/', AsyncCustomerRegistrationView.as_view(), name='async_customer_registration'),
+    path('async/password/change/', AsyncChangePasswordView.as_view(), name='async_change_password'),
     path('addresses/', AddressListCreateView.as_view(), name='address-list-create'),
     path('addresses/<int:pk>/', AddressDetailView.as_view(), name='address-detail'),
 
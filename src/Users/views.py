@@ -1,10 +1,19 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 from rest_framework.response import Response
 from rest_framework import status, generics, permissions
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework_simplejwt.serializers import TokenObtainSerializer
+from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.decorators import api_view, action
 from .models import User, Address
 from Shop.permissions import IsOwnerOrReadOnly
-from .serializers import CustomerRegistrationSerializer, AddressSerializer
+from Shop.views import AsyncAPIView
+from Shop.hashing import authenticate_user, hash_password
+from Shop.throttling import IPTokenBucketThrottle, UserTokenBucketThrottle
+from .serializers import CustomerRegistrationSerializer, AddressSerializer, LogoutSerializer
+from .revocation import revoked_tokens
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
 """
@@ -34,6 +43,8 @@ class CustomerRegistrationView(generics.CreateAPIView):
 
     serializer_class = CustomerRegistrationSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scope = 'registration'
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -50,6 +61,30 @@ class CustomerRegistrationView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    """
+    A view for obtaining a token pair, throttled per client IP to slow down credential stuffing.
+    """
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scope = 'login'
+
+
+class LogoutView(generics.GenericAPIView):
+    """
+    A view for logging out: revokes the given refresh token and the access token used for the request.
+    """
+    serializer_class = LogoutSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        revoked_tokens.revoke(serializer.validated_data['refresh'])
+        if request.auth is not None:
+            revoked_tokens.revoke(request.auth)
+        return Response({"message": "Logged out successfully."}, status=status.HTTP_200_OK)
+
+
 class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     A view for retrieving, updating, and deleting the authenticated user.
@@ -67,6 +102,8 @@ class ChangePasswordView(generics.UpdateAPIView):
     A view for changing the user's password.
     """
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserTokenBucketThrottle]
+    throttle_scope = 'password-change'
 
     def update(self, request, *args, **kwargs):
         user = self.request.user
@@ -101,3 +138,67 @@ class AddressDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         return Address.objects.filter(user=self.request.user)
+
+
+class AsyncCustomerRegistrationView(AsyncAPIView):
+    """
+    An async variant of CustomerRegistrationView that hashes the password in the hashing pool.
+    """
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scope = 'registration'
+
+    async def post(self, request):
+        serializer = CustomerRegistrationSerializer(data=self.parse_json(request))
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        password_hash = await hash_password(serializer.validated_data['password'])
+        user = await sync_to_async(serializer.save)(password_hash=password_hash)
+        refresh = RefreshToken.for_user(user)
+        return JsonResponse({
+            "user": serializer.data,
+            "message": "User registered successfully.",
+            "token": {
+                "refresh": str(refresh),
+                "access": str(refresh.access_token),
+            }
+        }, status=status.HTTP_201_CREATED)
+
+
+class AsyncTokenObtainPairView(AsyncAPIView):
+    """
+    An async variant of the token obtain view that authenticates the user in the hashing pool.
+    """
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scope = 'login'
+
+    async def post(self, request):
+        data = self.parse_json(request)
+        missing = {field: ["This field is required."]
+                   for field in (User.USERNAME_FIELD, 'password') if not data.get(field)}
+        if missing:
+            raise ValidationError(missing)
+
+        user = await authenticate_user(request, **{User.USERNAME_FIELD: data[User.USERNAME_FIELD],
+                                                   'password': data['password']})
+        if user is None:
+            raise AuthenticationFailed(TokenObtainSerializer.default_error_messages['no_active_account'],
+                                       code='no_active_account')
+
+        refresh = RefreshToken.for_user(user)
+        return JsonResponse({'refresh': str(refresh), 'access': str(refresh.access_token)})
+
+
+class AsyncChangePasswordView(AsyncAPIView):
+    """
+    An async variant of ChangePasswordView that hashes the new password in the hashing pool.
+    """
+    authentication_required = True
+    throttle_classes = [UserTokenBucketThrottle]
+    throttle_scope = 'password-change'
+
+    async def put(self, request):
+        new_password = self.parse_json(request).get('new_password')
+        if not new_password:
+            return JsonResponse({"error": "New password is required."}, status=status.HTTP_400_BAD_REQUEST)
+        request.user.password = await hash_password(new_password)
+        await request.user.asave(update_fields=['password'])
+        return JsonResponse({"message": "Password updated successfully."}, status=status.HTTP_200_OK)